@@ -0,0 +1,170 @@
+"""
+Ban list index for the Discord bot
+Each guild's bans, fetched once and then kept current from ban and unban
+events, looked up by user ID, username or username prefix
+"""
+import asyncio
+import logging
+import re
+from bisect import bisect_left, insort
+
+log = logging.getLogger(__name__)
+
+MENTION = re.compile(r"<@!?(\d+)>")
+
+
+def user_tag(user):
+    """How a banned user is shown and found: the username, or name#1234 for legacy accounts"""
+    discriminator = getattr(user, "discriminator", "0")
+    return user.name if discriminator in ("0", "0000", None) else f"{user.name}#{discriminator}"
+
+
+class GuildBans:
+    """One guild's bans
+
+    `users` maps user ID -> tag for O(1) ID lookups; `names` is a sorted
+    list of (lowercased tag, user ID) so exact and prefix name lookups are
+    a binary search.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.names = []
+        self.seeded = False
+        self.unbanned = set()  # unbans seen while the ban list was still being fetched
+
+    def __len__(self):
+        return len(self.users)
+
+    def add(self, user_id, tag):
+        if user_id in self.users:
+            self._unlink(user_id)
+        self.users[user_id] = tag
+        self.unbanned.discard(user_id)
+        if self.seeded:
+            insort(self.names, (tag.lower(), user_id))
+
+    def remove(self, user_id):
+        if user_id not in self.users:
+            if not self.seeded:
+                self.unbanned.add(user_id)
+            return False
+        self._unlink(user_id)
+        del self.users[user_id]
+        if not self.seeded:
+            self.unbanned.add(user_id)
+        return True
+
+    def _unlink(self, user_id):
+        if not self.seeded:
+            return
+        entry = (self.users[user_id].lower(), user_id)
+        i = bisect_left(self.names, entry)
+        if i < len(self.names) and self.names[i] == entry:
+            del self.names[i]
+
+    def finish_seeding(self):
+        for user_id in self.unbanned:
+            self.users.pop(user_id, None)
+        self.unbanned.clear()
+        self.names = sorted((tag.lower(), user_id) for user_id, tag in self.users.items())
+        self.seeded = True
+
+    def prefix(self, text, limit=None):
+        """(user ID, tag) of bans whose tag starts with text, case-insensitively, in name order"""
+        text = text.lower()
+        found = []
+        for i in range(bisect_left(self.names, (text,)), len(self.names)):
+            name, user_id = self.names[i]
+            if not name.startswith(text) or (limit is not None and len(found) >= limit):
+                break
+            found.append((user_id, self.users[user_id]))
+        return found
+
+    def named(self, text):
+        """(user ID, tag) of bans whose tag is exactly text, case-insensitively"""
+        text = text.lower()
+        found = []
+        for i in range(bisect_left(self.names, (text,)), len(self.names)):
+            name, user_id = self.names[i]
+            if name != text:
+                break
+            found.append((user_id, self.users[user_id]))
+        return found
+
+
+class BanIndex:
+    """Ban lists across guilds, fetched on first use
+
+    The first lookup in a guild pages through guild.bans() once (concurrent
+    lookups share that fetch); after that on_member_ban / on_member_unban
+    keep it current and no lookup touches the API. Events for a guild that
+    was never looked up are ignored, since its first lookup fetches them.
+    """
+
+    def __init__(self):
+        self.guilds = {}  # guild_id -> GuildBans
+        self._seeding = {}  # guild_id -> task
+
+    async def ensure(self, guild):
+        """The guild's bans, fetching the ban list first if it hasn't been"""
+        bans = self.guilds.get(guild.id)
+        if bans is not None and bans.seeded:
+            return bans
+        task = self._seeding.get(guild.id)
+        if task is None:
+            task = self._seeding[guild.id] = asyncio.create_task(self._seed(guild))
+            task.add_done_callback(lambda _: self._seeding.pop(guild.id, None))
+        # shielded so a cancelled command doesn't abort a fetch others wait on
+        return await asyncio.shield(task)
+
+    async def _seed(self, guild):
+        bans = self.guilds[guild.id] = GuildBans()
+        try:
+            # pages of 1000; events arriving meanwhile are applied to the same object
+            async for entry in guild.bans(limit=None):
+                if entry.user.id not in bans.unbanned:
+                    bans.users.setdefault(entry.user.id, user_tag(entry.user))
+        except BaseException:
+            del self.guilds[guild.id]
+            raise
+        bans.finish_seeding()
+        log.info("Indexed %d bans in %s", len(bans), guild)
+        return bans
+
+    def drop(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+    # ---------------- EVENTS ---------------- #
+    def banned(self, guild_id, user):
+        bans = self.guilds.get(guild_id)
+        if bans is not None:
+            bans.add(user.id, user_tag(user))
+
+    def unbanned(self, guild_id, user_id):
+        bans = self.guilds.get(guild_id)
+        if bans is not None:
+            bans.remove(user_id)
+
+    # ---------------- LOOKUPS ---------------- #
+    async def find(self, guild, query, limit=25):
+        """Bans matching a user ID, mention, username or legacy name#1234
+
+        An exact match wins; otherwise every ban whose name starts with the
+        query is returned (up to limit) so the caller can ask which one.
+        Returns a list of (user ID, tag).
+        """
+        bans = await self.ensure(guild)
+        query = query.strip().lstrip("@")
+        mention = MENTION.fullmatch(query)
+        if mention or query.isdigit():
+            user_id = int(mention.group(1) if mention else query)
+            if user_id in bans.users:
+                return [(user_id, bans.users[user_id])]
+            if mention:
+                return []
+        return bans.named(query) or bans.prefix(query, limit)
+
+    async def match_prefix(self, guild, prefix, limit=None):
+        bans = await self.ensure(guild)
+        return bans.prefix(prefix, limit)
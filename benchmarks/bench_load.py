@@ -0,0 +1,480 @@
+"""
+Benchmark: the whole bot under synthetic gateway traffic, offline
+Builds main.Client with its extensions loaded (without logging in), puts a
+fake transport behind every channel, guild, member and interaction, and
+replays a configurable mix of messages, reactions, slash command
+interactions and button clicks. Reports throughput, p50/p99 handler latency per event kind,
+time to action, memory growth and the API calls the bot made.
+
+With any --max-*/--min-* threshold set, the exit status is 1 when a
+threshold is missed, so it can gate a change in CI.
+
+Usage: python benchmarks/bench_load.py [--events 20000] [--rate 0] [--mix message=90,reaction=6,interaction=2,component=2]
+                                       [--users 2000] [--api-latency 0.02] [--extensions moderation,reaction_roles,demo]
+                                       [--max-p99-ms 5] [--min-throughput 2000] [--max-memory-growth-mb 50] [--json out.json]
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GUILD_ID = 1000
+CHANNEL_IDS = (2001, 2002, 2003, 2004)
+PANEL_ID = 3000
+BOT_ID = 1
+PANEL_ROLES = {"🟥": 4001, "🟩": 4002, "🟦": 4003}
+
+WORDS = (
+    "anyone", "up", "for", "a", "game", "tonight", "did", "you", "see", "the", "patch", "notes", "gg",
+    "everyone", "that", "was", "close", "what", "time", "is", "stream", "I", "think", "second", "option",
+    "better", "honestly", "lol", "new", "map", "looks", "great", "who", "wants", "to", "queue", "later",
+)
+COPYPASTA = "FREE NITRO for everyone who clicks this link right now, only today!!"
+
+
+def rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is missing)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+# ---------------- FAKE TRANSPORT ---------------- #
+class FakeTransport:
+    """Stands in for Discord's HTTP API: counts calls and sleeps api_latency per call"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeUser:
+    bot = False
+
+    def __init__(self, user_id, created_at):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.created_at = created_at
+        self.joined_at = None
+        self.guild_permissions = SimpleNamespace(administrator=False)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeRole:
+    def __init__(self, role_id, name=None):
+        self.id = role_id
+        self.name = name or f"role{role_id}"
+        self.mention = f"<@&{role_id}>"
+
+    def is_default(self):
+        return False
+
+
+class FakeMember(FakeUser):
+    def __init__(self, user_id, created_at, transport):
+        super().__init__(user_id, created_at)
+        self.transport = transport
+        self.roles = []
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def edit(self, roles=None, reason=None):
+        await self.transport.call("member.edit")
+        self.roles = [FakeRole(role.id) for role in roles]
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, transport):
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"channel{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.transport = transport
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, **kwargs):
+        await self.transport.call("channel.send")
+
+    async def delete_messages(self, messages, reason=None):
+        await self.transport.call("channel.delete_messages")
+
+
+class FakeGuild:
+    def __init__(self, guild_id, transport):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.transport = transport
+        self.members = {}
+        self.roles = [FakeRole(role_id) for role_id in PANEL_ROLES.values()]
+
+    def __str__(self):
+        return self.name
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def ban(self, user, reason=None):
+        await self.transport.call("guild.ban")
+
+    async def bulk_ban(self, users, reason=None):
+        await self.transport.call("guild.bulk_ban")
+        return SimpleNamespace(banned=list(users), failed=[])
+
+
+class FakeMessage:
+    _state = None  # commands.Context keeps a reference; no prefix command reaches the API
+
+    def __init__(self, message_id, content, author, channel):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.transport = channel.transport
+
+    async def delete(self):
+        await self.transport.call("message.delete")
+
+
+class FakeResponse:
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def send_message(self, *args, **kwargs):
+        await self.transport.call("interaction.response")
+
+    async def defer(self, **kwargs):
+        await self.transport.call("interaction.response")
+
+    def is_done(self):
+        return False
+
+
+# ---------------- TRAFFIC ---------------- #
+class Traffic:
+    """Synthetic gateway events: (kind, event name, args) in the requested mix
+
+    Messages are mostly clean chatter from a pool of users; a few users
+    spam, some messages contain a banned word or say hey, and a copy-paste
+    flood is spread across users and channels. Reactions toggle roles on a
+    registered reaction role panel; component clicks hit routed buttons.
+    """
+
+    def __init__(self, mix, users, guild, channels, banned_word, rng, buttons=()):
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.users = users
+        self.guild = guild
+        self.channels = channels
+        self.banned_word = banned_word
+        self.rng = rng
+        self.spammers = users[:5]
+        self.buttons = list(buttons)  # (route, args) of the routed buttons to click
+        self.next_id = 10 ** 17
+
+    def __iter__(self):
+        while True:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            yield (kind, *getattr(self, kind)())
+
+    def message(self):
+        rng = self.rng
+        roll = rng.random()
+        author = rng.choice(self.spammers) if roll < 0.05 else rng.choice(self.users)
+        if roll < 0.05:
+            content = self.chatter()
+        elif roll < 0.07 and self.banned_word:
+            content = f"this is {self.banned_word} honestly"
+        elif roll < 0.09:
+            content = COPYPASTA
+        elif roll < 0.12:
+            content = "Hey all"
+        else:
+            content = self.chatter()
+        self.next_id += 1
+        return "message", (FakeMessage(self.next_id, content, author, rng.choice(self.channels)),)
+
+    def chatter(self):
+        # varied enough that ordinary chat never looks like a copy-paste flood
+        return " ".join(self.rng.choices(WORDS, k=self.rng.randint(1, 12)))
+
+    def reaction(self):
+        rng = self.rng
+        user = rng.choice(self.users)
+        emoji = rng.choice(list(PANEL_ROLES))
+        payload = SimpleNamespace(
+            guild_id=self.guild.id,
+            channel_id=self.channels[0].id,
+            message_id=PANEL_ID,
+            user_id=user.id,
+            emoji=SimpleNamespace(id=None, name=emoji),
+            member=None,
+        )
+        return ("raw_reaction_add" if rng.random() < 0.6 else "raw_reaction_remove"), (payload,)
+
+    def interaction(self):
+        user = self.rng.choice(self.users)
+        interaction = SimpleNamespace(
+            user=user,
+            guild=self.guild,
+            guild_id=self.guild.id,
+            channel=self.rng.choice(self.channels),
+            response=FakeResponse(self.guild.transport),
+        )
+        return "hello", (interaction,)
+
+    def component(self):
+        route, args = self.rng.choice(self.buttons)
+        interaction = SimpleNamespace(
+            user=self.rng.choice(self.users),
+            guild=self.guild,
+            guild_id=self.guild.id,
+            channel=self.rng.choice(self.channels),
+            data={"custom_id": ":".join(["c", route, *args])},
+            response=FakeResponse(self.guild.transport),
+        )
+        return route, (interaction, route, args)
+
+
+# ---------------- RUN ---------------- #
+async def deliver(client, event, args):
+    """Await every handler discord.py would schedule for this event, in order"""
+    handler = getattr(client, "on_" + event, None)
+    if handler is not None:
+        await handler(*args)
+    for listener in client.extra_events.get("on_" + event, ()):
+        await listener(*args)
+
+
+async def run(args):
+    from config import BotConfig
+    from main import Client
+
+    rng = random.Random(args.seed)
+    transport = FakeTransport(args.api_latency)
+    guild = FakeGuild(GUILD_ID, transport)
+    channels = [FakeChannel(channel_id, guild, transport) for channel_id in CHANNEL_IDS]
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=365)
+    users = []
+    for i in range(args.users):
+        member = FakeMember(10 ** 15 + i, old, transport)
+        guild.members[member.id] = member
+        users.append(member)
+
+    client = Client(args.extensions)
+    client._connection.user = SimpleNamespace(id=BOT_ID)
+    client.get_guild = lambda guild_id: guild if guild_id == GUILD_ID else None
+    client.get_channel = lambda channel_id: channels[0] if channel_id == channels[0].id else None
+
+    async with client:
+        await client.setup_hook()
+        roles = client.get_cog("ReactionRoles")
+        if roles is not None:
+            await roles.registry.add_panel(GUILD_ID, channels[0].id, PANEL_ID, PANEL_ROLES)
+
+        mix = dict(args.mix)
+        hello = None
+        if "interaction" in mix:
+            hello = client.tree.get_command("hello", guild=client.guild_object)
+            if hello is None:
+                print("(no /hello command without the demo extension; interactions skipped)")
+                del mix["interaction"]
+        if "reaction" in mix and roles is None:
+            print("(no reaction role panel without the reaction_roles extension; reactions skipped)")
+            del mix["reaction"]
+        # role panel buttons and the demo's buttons, as their custom_ids route them
+        buttons = [(route, [arg]) for route, arg in
+                   [*(("role", str(role_id)) for role_id in PANEL_ROLES.values()), *(("demo.button", n) for n in "123")]
+                   if route in client.components.routes]
+        if "component" in mix and not buttons:
+            print("(no routed buttons without the reaction_roles or demo extension; component clicks skipped)")
+            del mix["component"]
+
+        traffic = iter(Traffic(mix, users, guild, channels, next(iter(BotConfig.BANNED_WORDS), ""), rng, buttons))
+        latency = {}
+
+        async def one(kind, event, event_args):
+            start = time.perf_counter()
+            if kind == "interaction":
+                await hello.callback(hello.binding, *event_args)
+            elif kind == "component":
+                await client.components.dispatch(*event_args)
+            else:
+                await deliver(client, event, event_args)
+            latency.setdefault(kind, []).append(time.perf_counter() - start)
+
+        # warm up caches, lazy imports and the allocator before measuring
+        for _ in range(min(args.warmup, args.events)):
+            await one(*next(traffic))
+            await asyncio.sleep(0)
+        latency.clear()
+        transport.calls.clear()
+        gc.collect()
+        rss_before = rss_mb()
+
+        interval = 1.0 / args.rate if args.rate else 0
+        started = next_at = time.perf_counter()
+        for _ in range(args.events):
+            await one(*next(traffic))
+            if interval:
+                next_at += interval
+                await asyncio.sleep(max(next_at - time.perf_counter(), 0))
+            else:
+                # let the action workers and outbound scheduler run between events
+                await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+
+        gc.collect()
+        rss_after = rss_mb()
+        outbound = client.outbound.stats()
+        moderation = client.get_cog("Moderation")
+        actions = moderation.actions.latency.summary() if moderation is not None else None
+        # let pending bulk calls, debounced role edits and log posts go out
+        await client.close()
+
+    everything = [s for samples in latency.values() for s in samples]
+    return {
+        "events": args.events,
+        "seconds": elapsed,
+        "throughput": args.events / elapsed,
+        "latency_ms": {kind: summarize(samples) for kind, samples in [("all", everything), *sorted(latency.items())]},
+        "time_to_action_ms": {
+            "verdict": actions,
+            **{name: outbound["latency"][name] for name in outbound["latency"]},
+        },
+        "memory_mb": {"before": rss_before, "after": rss_after, "growth": rss_after - rss_before},
+        "api_calls": dict(sorted(transport.calls.items())),
+        "api_calls_per_1k_events": sum(transport.calls.values()) / args.events * 1000,
+        "outbound": {k: v for k, v in outbound.items() if k not in ("latency", "queued", "running")},
+    }
+
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50": statistics.median(ordered) * 1000,
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        "max": ordered[-1] * 1000,
+    }
+
+
+def report(result):
+    print(f"{result['events']} events in {result['seconds']:.2f}s: {result['throughput']:.0f} events/s")
+    print(f"\n{'handler':<12} {'count':>8} {'p50':>10} {'p99':>10} {'max':>10}")
+    for kind, s in result["latency_ms"].items():
+        print(f"{kind:<12} {s['count']:>8} {s['p50']:>8.3f}ms {s['p99']:>8.3f}ms {s['max']:>8.3f}ms")
+    print(f"\n{'time to action':<16} {'count':>8} {'p50':>10} {'p99':>10}")
+    for name, s in result["time_to_action_ms"].items():
+        if s:
+            print(f"{name:<16} {s['count']:>8} {s['p50_ms']:>8.1f}ms {s['p99_ms']:>8.1f}ms")
+    memory = result["memory_mb"]
+    print(f"\nmemory: {memory['before']:.1f} MB -> {memory['after']:.1f} MB ({memory['growth']:+.1f} MB)")
+    print(f"api calls ({result['api_calls_per_1k_events']:.1f} per 1k events):")
+    for name, count in result["api_calls"].items():
+        print(f"  {name:<26} {count:>8}")
+    print("outbound: " + ", ".join(f"{k}={v}" for k, v in result["outbound"].items()))
+
+
+def check(result, args):
+    """Threshold violations, as messages"""
+    failures = []
+    p99 = result["latency_ms"]["all"]["p99"]
+    if args.max_p99_ms is not None and p99 > args.max_p99_ms:
+        failures.append(f"p99 handler latency {p99:.3f}ms > {args.max_p99_ms}ms")
+    if args.min_throughput is not None and result["throughput"] < args.min_throughput:
+        failures.append(f"throughput {result['throughput']:.0f}/s < {args.min_throughput}/s")
+    growth = result["memory_mb"]["growth"]
+    if args.max_memory_growth_mb is not None and growth > args.max_memory_growth_mb:
+        failures.append(f"memory growth {growth:.1f} MB > {args.max_memory_growth_mb} MB")
+    per_1k = result["api_calls_per_1k_events"]
+    if args.max_api_calls_per_1k is not None and per_1k > args.max_api_calls_per_1k:
+        failures.append(f"{per_1k:.1f} API calls per 1k events > {args.max_api_calls_per_1k}")
+    return failures
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in ("message", "reaction", "interaction", "component"):
+            raise argparse.ArgumentTypeError(f"unknown event kind {kind!r}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=0, help="events per second (0 = as fast as possible)")
+    parser.add_argument("--mix", type=parse_mix, default="message=90,reaction=6,interaction=2,component=2",
+                        help="relative weights of message, reaction, interaction and component (button click) events")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--api-latency", type=float, default=0.02, help="seconds each fake API call takes")
+    parser.add_argument("--extensions", type=lambda s: [n for n in s.split(",") if n],
+                        default=["moderation", "reaction_roles", "demo"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--min-throughput", type=float)
+    parser.add_argument("--max-memory-growth-mb", type=float)
+    parser.add_argument("--max-api-calls-per-1k", type=float)
+    args = parser.parse_args()
+
+    # config is read at import time; keep the bot's files out of the checkout
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+    os.environ.setdefault("DISCORD_GUILD_ID", str(GUILD_ID))
+    os.environ.setdefault("BANNED_WORDS", "badword")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    os.chdir(tempfile.mkdtemp(prefix="bench_load_"))
+
+    from logs import setup_logging
+    setup_logging(os.environ["LOG_LEVEL"])
+
+    result = asyncio.run(run(args))
+    report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = check(result, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
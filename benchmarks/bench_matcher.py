@@ -0,0 +1,85 @@
+"""
+Benchmark: banned word matching throughput as the word list grows
+Compares the old per-word substring scan with the Aho-Corasick matcher,
+with and without obfuscation folding (normalize=True)
+
+Usage: python benchmarks/bench_matcher.py [--messages N] [--sizes 10,100,1000,5000]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcher import BannedWordMatcher, MODE_SUBSTRING, MODE_WORD
+
+
+def random_word(rng, min_len=4, max_len=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_messages(rng, count, words):
+    messages = []
+    for _ in range(count):
+        parts = [random_word(rng, 2, 8) for _ in range(rng.randint(3, 30))]
+        if words and rng.random() < 0.05:
+            parts.insert(rng.randrange(len(parts) + 1), rng.choice(words))
+        messages.append(" ".join(parts))
+    return messages
+
+
+def bench_naive(words, messages):
+    start = time.perf_counter()
+    hits = 0
+    for msg in messages:
+        lower = msg.lower()
+        if any(bw in lower for bw in words if bw):
+            hits += 1
+    return time.perf_counter() - start, hits
+
+
+def bench_matcher(matcher, messages):
+    start = time.perf_counter()
+    hits = 0
+    for msg in messages:
+        if matcher.search(msg):
+            hits += 1
+    return time.perf_counter() - start, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    print(f"{'words':>7} {'build ms':>9} {'naive msg/s':>12} {'substr msg/s':>13} {'word msg/s':>11} {'norm msg/s':>11} {'speedup':>8}")
+    for size in sizes:
+        words = sorted({random_word(rng) for _ in range(size)})
+        messages = make_messages(rng, args.messages, words)
+
+        start = time.perf_counter()
+        substring = BannedWordMatcher(words, mode=MODE_SUBSTRING)
+        build_ms = (time.perf_counter() - start) * 1000
+        whole_word = BannedWordMatcher(words, mode=MODE_WORD)
+        normalized = BannedWordMatcher(words, mode=MODE_SUBSTRING, normalize=True)
+
+        naive_s, naive_hits = bench_naive(words, messages)
+        sub_s, sub_hits = bench_matcher(substring, messages)
+        word_s, _ = bench_matcher(whole_word, messages)
+        norm_s, _ = bench_matcher(normalized, messages)
+        assert naive_hits == sub_hits, "matcher disagrees with the naive scan"
+
+        n = len(messages)
+        print(f"{size:>7} {build_ms:>9.1f} {n / naive_s:>12.0f} {n / sub_s:>13.0f} {n / word_s:>11.0f} {n / norm_s:>11.0f} {naive_s / sub_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: spam detector memory and per-message cost across many users
+Replays synthetic traffic from a large population of users (each active for
+a short burst, as in a big guild) against the old defaultdict(deque)
+history and the SpamDetector
+
+Usage: python benchmarks/bench_spam_detector.py [--users 1000000] [--rate 5000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spam_detector import SpamDetector
+
+
+class LegacyHistory:
+    """The module-level message_history logic from the original on_message"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.history = defaultdict(lambda: deque())
+
+    def record(self, user_id, now):
+        history = self.history[user_id]
+        history.append(now)
+        while history and now - history[0] > self.window:
+            history.popleft()
+        return len(history) >= self.limit
+
+    def __len__(self):
+        return len(self.history)
+
+
+def traffic(users, rate, messages_per_user, concurrency, seed):
+    """Yield (user_id, timestamp): `concurrency` users are active at a time, each
+    sends a short burst and is then replaced by a user who has never spoken"""
+    rng = random.Random(seed)
+    now = 0.0
+    step = 1.0 / rate
+    active = []
+    next_user = 0
+    while next_user < users or active:
+        while next_user < users and len(active) < concurrency:
+            active.append([next_user, messages_per_user])
+            next_user += 1
+        i = rng.randrange(len(active))
+        entry = active[i]
+        now += step
+        yield entry[0], now
+        entry[1] -= 1
+        if entry[1] == 0:
+            active[i] = active[-1]
+            active.pop()
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def run(name, args):
+    # each implementation runs in its own process so RSS readings don't mix
+    if name == "legacy deque":
+        detector = LegacyHistory(args.limit, args.window)
+    else:
+        detector = SpamDetector(args.limit, args.window)
+    checkpoints = max(1, args.users // 5)
+    seen = 0
+    flagged = 0
+    count = 0
+    busy = 0.0
+    baseline = rss_mb()
+    for user_id, now in traffic(args.users, args.rate, args.messages, args.concurrency, args.seed):
+        start = time.perf_counter()
+        if detector.record(user_id, now):
+            flagged += 1
+        busy += time.perf_counter() - start
+        count += 1
+        if user_id >= seen + checkpoints:
+            seen = user_id
+            print(f"  {name:>12} users={user_id:>8} tracked={len(detector):>8} rss=+{rss_mb() - baseline:7.1f} MB "
+                  f"cost={busy / count * 1e9:6.0f} ns/msg", flush=True)
+    print(f"  {name:>12} done: {count} msgs, {busy / count * 1e9:.0f} ns/msg, "
+          f"tracked={len(detector)}, rss=+{rss_mb() - baseline:.1f} MB, flagged={flagged}", flush=True)
+    if isinstance(detector, SpamDetector):
+        print(f"  footprint: {detector.memory_footprint()}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--messages", type=int, default=3, help="messages per user")
+    parser.add_argument("--rate", type=float, default=5000, help="guild-wide messages per second")
+    parser.add_argument("--concurrency", type=int, default=2000, help="users chatting at the same time")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--window", type=float, default=7)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    names = ["SpamDetector"] if args.skip_legacy else ["legacy deque", "SpamDetector"]
+    for name in names:
+        proc = multiprocessing.Process(target=run, args=(name, args))
+        proc.start()
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: bot startup cost per set of enabled extensions and cache profile
+Each set runs in a fresh interpreter that imports main, builds the Client
+and loads the extensions (without logging in), then reports wall time, the
+number of imported modules and resident memory. Member chunking only
+happens once logged in; the bot logs its real time-to-ready and RSS on
+startup.
+
+Usage: python benchmarks/bench_startup.py [--sets ",moderation,reaction_roles,demo,moderation+reaction_roles+demo"]
+                                          [--profiles full,balanced,minimal] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import time
+start = time.perf_counter()
+import asyncio, json, sys
+sys.path.insert(0, {root!r})
+from main import Client
+from metrics import rss_bytes
+
+async def boot():
+    client = Client({extensions!r})
+    async with client:
+        await client.setup_hook()
+        ready = time.perf_counter()
+        modules = len(sys.modules)
+        rss = rss_bytes() / 2 ** 20
+    return ready, modules, rss
+
+ready, modules, rss = asyncio.run(boot())
+print(json.dumps({{"ms": (ready - start) * 1000, "modules": modules, "rss_mb": rss}}))
+"""
+
+
+def measure(extensions, profile, repeat):
+    env = dict(os.environ, CACHE_PROFILE=profile)
+    env.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+    env.setdefault("DISCORD_GUILD_ID", "1")
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(root=ROOT, extensions=extensions)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r["ms"])
+    return best["ms"], best["modules"], best["rss_mb"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", default=",moderation,reaction_roles,demo,moderation+reaction_roles+demo",
+                        help="comma separated extension sets; join names with + and leave one empty for core only")
+    parser.add_argument("--profiles", default="full", help="comma separated CACHE_PROFILE values to compare")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per set, best is reported")
+    args = parser.parse_args()
+
+    print(f"{'extensions':<34} {'profile':<9} {'startup':>10} {'modules':>8} {'rss':>9}")
+    for spec in args.sets.split(","):
+        extensions = [name for name in spec.split("+") if name]
+        for profile in args.profiles.split(","):
+            ms, modules, rss = measure(extensions, profile, args.repeat)
+            print(f"{'+'.join(extensions) or '(core only)':<34} {profile:<9} {ms:>8.0f}ms {modules:>8} {rss:>7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: per-user strike lookups in the SQLite backend at millions of rows
+
+Usage: python benchmarks/bench_strike_db.py [--rows 1000000] [--users 200000] [--lookups 2000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strike_store import DAY, SQLiteStrikeBackend
+
+
+def populate(path, rows, users, guilds, rng):
+    backend = SQLiteStrikeBackend(path)
+    backend._open()
+    now = time.time()
+    batch = []
+    with backend._conn:
+        for _ in range(rows):
+            batch.append((rng.randrange(guilds), rng.randrange(users), now - rng.random() * 90 * DAY, "bench"))
+            if len(batch) == 50000:
+                backend._conn.executemany(
+                    "INSERT INTO strikes (guild_id, user_id, created_at, reason) VALUES (?, ?, ?, ?)", batch
+                )
+                batch = []
+        if batch:
+            backend._conn.executemany(
+                "INSERT INTO strikes (guild_id, user_id, created_at, reason) VALUES (?, ?, ?, ?)", batch
+            )
+    backend._conn.close()
+
+
+async def lookups(path, args, cache_size, rng):
+    backend = SQLiteStrikeBackend(path, expiry_seconds=30 * DAY, cache_size=cache_size)
+    await backend.start()
+    timings = []
+    try:
+        for _ in range(args.lookups):
+            start = time.perf_counter()
+            await backend.get(rng.randrange(args.guilds), rng.randrange(args.users))
+            timings.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        for _ in range(args.lookups):
+            await backend.add(rng.randrange(args.guilds), rng.randrange(args.users), reason="bench")
+        add_ms = (time.perf_counter() - start) * 1000 / args.lookups
+    finally:
+        await backend.close()
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1], add_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "strikes.db")
+        start = time.perf_counter()
+        populate(path, args.rows, args.users, args.guilds, rng)
+        print(f"populated {args.rows} rows in {time.perf_counter() - start:.1f}s")
+        for label, cache_size in (("cold (no cache)", 0), ("LRU 10k", 10000)):
+            p50, p99, add_ms = asyncio.run(lookups(path, args, cache_size, rng))
+            print(f"{label:>16}: get p50 {p50:.3f} ms, p99 {p99:.3f} ms, add avg {add_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: event-loop latency while recording strikes
+Compares the old save_strikes() full JSON rewrite with the journaled StrikeStore
+and the SQLite backend
+
+Usage: python benchmarks/bench_strike_store.py [--rate 1000] [--seconds 5] [--users 50000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strike_store import SQLiteStrikeBackend, StrikeStore
+
+
+async def monitor_lag(samples, stop, interval=0.001):
+    """Record how late the loop wakes us up compared to the requested sleep"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def drive(record, rate, seconds, users, rng):
+    interval = 1.0 / rate
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    sent = 0
+    while time.perf_counter() < deadline:
+        result = record(str(rng.randrange(users)))
+        if asyncio.iscoroutine(result):
+            await result
+        sent += 1
+        next_at += interval
+        delay = next_at - time.perf_counter()
+        # always yield so the lag monitor gets to observe the loop
+        await asyncio.sleep(max(delay, 0))
+    return sent
+
+
+async def run_legacy(path, args, rng):
+    data = {str(i): 1 for i in range(args.users)}
+
+    def record(user_id):
+        data[user_id] = data.get(user_id, 0) + 1
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    return await measure(record, args, rng)
+
+
+async def run_store(path, args, rng):
+    store = StrikeStore(path)
+    await store.start()
+    store.counts = {str(i): 1 for i in range(args.users)}
+    try:
+        return await measure(lambda user_id: store.add(0, user_id), args, rng)
+    finally:
+        await store.close()
+
+
+async def run_sqlite(path, args, rng):
+    store = SQLiteStrikeBackend(path.replace(".json", ".db"))
+    await store.start()
+    try:
+        return await measure(lambda user_id: store.add(0, user_id), args, rng)
+    finally:
+        await store.close()
+
+
+async def measure(record, args, rng):
+    samples, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(samples, stop))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    sent = await drive(record, args.rate, args.seconds, args.users, rng)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    samples.sort()
+    return {
+        "strikes/s": sent / elapsed,
+        "lag p50 ms": statistics.median(samples),
+        "lag p99 ms": samples[int(len(samples) * 0.99) - 1],
+        "lag max ms": samples[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=int, default=1000, help="target strikes per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--users", type=int, default=50000, help="users already holding strikes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, runner in (("save_strikes", run_legacy), ("StrikeStore", run_store), ("SQLite", run_sqlite)):
+            result = asyncio.run(runner(os.path.join(tmp, f"{name}.json"), args, random.Random(1)))
+            print(f"{name:>13}: " + ", ".join(f"{k} {v:.2f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Remote profanity classifier for the Discord bot
+Non-blocking API Ninjas profanity filter client with a shared connection
+pool, request batching, a TTL+LRU cache and a circuit breaker that falls
+back to the local banned word matcher
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from normalize import fold
+
+DEFAULT_API_URL = "https://api.api-ninjas.com/v1/profanityfilter"
+
+
+class TTLCache:
+    """LRU cache whose entries also expire `ttl` seconds after being stored"""
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        if item[0] < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class CircuitBreaker:
+    """Stops calling a failing service for a while instead of waiting on it
+
+    closed: calls go through; after failure_threshold consecutive failures
+    it opens. open: calls are refused until reset_timeout has passed, then
+    one trial call is let through (half-open); success closes the breaker,
+    failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            return True
+        # while half-open only the single trial call is in flight
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ProfanityClassifier:
+    """Asynchronous client for the remote profanity filter
+
+    classify() never blocks the event loop. Lookups are keyed by the
+    normalized message text: cached verdicts are returned immediately, and
+    concurrent lookups for the same text share one request. Lookups that
+    arrive within batch_window seconds are dispatched together over a
+    single pooled session, at most max_concurrency requests at a time.
+
+    When the API is failing, slow or unconfigured, the circuit breaker
+    opens and `fallback(text)` (the local matcher) answers instead.
+    """
+
+    def __init__(self, api_key, fallback, api_url=DEFAULT_API_URL, max_concurrency=8, timeout=3.0,
+                 cache_size=10000, cache_ttl=3600, batch_window=0.02, max_batch=32, breaker=None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.fallback = fallback
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "fallbacks": 0, "errors": 0}
+        self._session = None
+        self._semaphore = None
+        self._pending = {}  # key -> (text, future) waiting for the next batch
+        self._inflight = {}  # key -> future of a request already sent
+        self._tasks = set()
+        self._batch_task = None
+
+    async def start(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"X-Api-Key": self.api_key or ""},
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._batch_task is not None:
+            await self._batch_task
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def classify(self, text, folded=None):
+        """Return True if the text is profane; folded may pass fold(text) if the caller has it"""
+        if not text or not text.strip():
+            return False
+        key = fold(text) if folded is None else folded
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        if self._session is None or not self.breaker.allow():
+            self.stats["fallbacks"] += 1
+            return self.fallback(text)
+
+        shared = self._inflight.get(key) or self._pending.get(key, (None, None))[1]
+        if shared is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(shared)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = (text, future)
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._batch_task is None:
+            self._batch_task = asyncio.create_task(self._batch_timer())
+        return await asyncio.shield(future)
+
+    async def _batch_timer(self):
+        await asyncio.sleep(self.batch_window)
+        self._batch_task = None
+        self._dispatch()
+
+    def _dispatch(self):
+        batch, self._pending = self._pending, {}
+        for key, (text, future) in batch.items():
+            self._inflight[key] = future
+            task = asyncio.create_task(self._lookup(key, text, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _lookup(self, key, text, future):
+        try:
+            verdict = await self._request(text)
+            self.breaker.record_success()
+            self.cache.set(key, verdict)
+        except Exception:
+            self.stats["errors"] += 1
+            self.stats["fallbacks"] += 1
+            self.breaker.record_failure()
+            verdict = self.fallback(text)
+        finally:
+            self._inflight.pop(key, None)
+        if not future.done():
+            future.set_result(verdict)
+
+    async def _request(self, text):
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            async with self._session.get(self.api_url, params={"text": text}) as resp:
+                resp.raise_for_status()
+                data = await resp.json(content_type=None)
+        return bool(data.get("has_profanity"))
@@ -0,0 +1,66 @@
+"""
+Local stand-in for the API Ninjas profanity filter
+Lets the remote classifier be exercised offline, including slow and failing responses
+
+Usage: python classifier_stub.py [--port 8085] [--words a,b,c] [--latency 0.05] [--fail-rate 0.0]
+Then set PROFANITY_API_URL=http://127.0.0.1:8085/v1/profanityfilter
+"""
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+from matcher import BannedWordMatcher
+
+
+def make_app(words, latency=0.0, fail_rate=0.0, seed=None):
+    matcher = BannedWordMatcher(words, normalize=True)
+    rng = random.Random(seed)
+    stats = {"requests": 0}
+
+    async def profanity_filter(request):
+        stats["requests"] += 1
+        text = request.query.get("text", "")
+        if latency:
+            await asyncio.sleep(latency)
+        if fail_rate and rng.random() < fail_rate:
+            return web.json_response({"error": "stub failure"}, status=503)
+        censored = list(text)
+        for match in matcher.finditer(text):
+            censored[match.start:match.end] = "*" * (match.end - match.start)
+        return web.json_response({
+            "original": text,
+            "censored": "".join(censored),
+            "has_profanity": matcher.contains(text),
+        })
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/v1/profanityfilter", profanity_filter)
+    app.router.add_get("/stats", get_stats)
+    app["stats"] = stats
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--words", default=None, help="comma-separated list, defaults to BANNED_WORDS")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    if args.words is None:
+        from config import BotConfig
+        words = BotConfig.BANNED_WORDS
+    else:
+        words = [w for w in args.words.split(",") if w.strip()]
+    web.run_app(make_app(words, args.latency, args.fail_rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Feature extensions for the Discord bot
+Each module is a discord.py extension loaded by main.py when enabled in ENABLED_EXTENSIONS
+"""
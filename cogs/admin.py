@@ -0,0 +1,104 @@
+"""
+Admin extension
+Owner-only commands to load, unload and hot-reload feature extensions and
+the configuration without reconnecting to Discord, and the .env watcher
+"""
+import logging
+import os
+
+from discord.ext import commands, tasks
+
+from config import ENV_FILE, BotConfig
+
+log = logging.getLogger(__name__)
+
+
+def env_mtime():
+    try:
+        return os.stat(ENV_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+class Admin(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.env_mtime = env_mtime()
+
+    async def cog_load(self):
+        if BotConfig.CONFIG_WATCH_INTERVAL > 0:
+            self.watch_config.change_interval(seconds=BotConfig.CONFIG_WATCH_INTERVAL)
+            self.watch_config.start()
+
+    async def cog_unload(self):
+        self.watch_config.cancel()
+
+    async def cog_check(self, ctx):
+        return await self.bot.is_owner(ctx.author)
+
+    def _resolve(self, name):
+        # accept either the feature name from ENABLED_EXTENSIONS or the module path
+        from main import EXTENSIONS
+        return EXTENSIONS.get(name, name)
+
+    @commands.command(name="extensions")
+    async def list_extensions(self, ctx):
+        loaded = ", ".join(sorted(self.bot.extensions)) or "none"
+        await ctx.send(f"Loaded extensions: {loaded}")
+
+    @commands.command(name="load")
+    async def load(self, ctx, name: str):
+        await self.bot.load_extension(self._resolve(name))
+        await ctx.send(f"Loaded `{name}`.")
+
+    @commands.command(name="unload")
+    async def unload(self, ctx, name: str):
+        await self.bot.unload_extension(self._resolve(name))
+        await ctx.send(f"Unloaded `{name}`.")
+
+    @commands.command(name="reload")
+    async def reload(self, ctx, name: str):
+        # reload_extension swaps the module in place and rolls back if the new
+        # version fails to load; the gateway connection is untouched
+        await self.bot.reload_extension(self._resolve(name))
+        await ctx.send(f"Reloaded `{name}`.")
+
+    @commands.command(name="reloadconfig")
+    async def reload_config(self, ctx):
+        self.env_mtime = env_mtime()
+        try:
+            applied, pending = self.bot.reload_config()
+        except ValueError as e:
+            await ctx.send(f"Configuration not reloaded: {e}")
+            return
+        lines = [f"Applied: {', '.join(applied)}" if applied else "No changes to apply."]
+        if pending:
+            lines.append(f"Needs a restart: {', '.join(pending)}")
+        await ctx.send("\n".join(lines))
+
+    @tasks.loop(seconds=5)
+    async def watch_config(self):
+        # a stat() per interval; the file is only read when it changed
+        mtime = env_mtime()
+        if mtime == self.env_mtime:
+            return
+        self.env_mtime = mtime
+        try:
+            applied, pending = self.bot.reload_config()
+        except ValueError as e:
+            log.error("%s changed but was not applied: %s", ENV_FILE, e)
+            return
+        if applied:
+            log.info("Configuration reloaded: %s", ", ".join(applied))
+        if pending:
+            log.warning("Changed settings that need a restart: %s", ", ".join(pending))
+
+    @commands.command(name="sync")
+    async def sync(self, ctx):
+        # only needed when slash command names or parameters changed; startup syncs changes by itself
+        synced = await self.bot.sync_commands(force=True)
+        await ctx.send(f"Synced {synced} slash commands.")
+
+
+async def setup(bot):
+    await bot.add_cog(Admin(bot))
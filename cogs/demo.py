@@ -0,0 +1,113 @@
+"""
+Demo UI extension
+Greeting, echo, embed, dropdown and button examples plus the ping and mention commands
+"""
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import components
+
+
+# ---------------- DROPDOWN MENU ---------------- #
+MENU_OPTIONS = [
+    discord.SelectOption(label="Option 1", description="This is option 1", emoji="🍎"),
+    discord.SelectOption(label="Option 2", description="This is option 2", emoji="🍌"),
+    discord.SelectOption(label="Option 3", description="This is option 3", emoji="🍇"),
+]
+
+
+# ---------------- BUTTON UI ---------------- #
+# button number -> (label, style, emoji, reply)
+BUTTONS = {
+    "1": ("Click Me!", discord.ButtonStyle.blurple, "😊", "You clicked a button!"),
+    "2": ("2nd Button", discord.ButtonStyle.red, "🔥", "You are a good boy"),
+    "3": ("3rd Button", discord.ButtonStyle.green, "😘", "You are a QT Pie"),
+}
+
+
+class Demo(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        # the panels' components are routed here by custom_id, so panels
+        # posted before a restart keep working and none are held in memory
+        self.bot.components.register("demo.menu", self.menu_selected)
+        self.bot.components.register("demo.button", self.button_clicked)
+
+    async def cog_unload(self):
+        self.bot.components.unregister("demo.menu", "demo.button")
+
+    async def menu_selected(self, interaction: discord.Interaction):
+        await interaction.response.send_message(f"You selected: **{interaction.data['values'][0]}**", ephemeral=True)
+
+    async def button_clicked(self, interaction: discord.Interaction, number: str):
+        await interaction.response.send_message(BUTTONS[number][3], ephemeral=True)
+
+    # ---------------- SLASH COMMANDS ---------------- #
+    @app_commands.command(name="hello", description="Say Hello!")
+    async def say_hello(self, interaction: discord.Interaction):
+        await interaction.response.send_message(f'Hello {interaction.user.mention}!')
+
+    @app_commands.command(name="print", description="Print whatever you say")
+    async def printer(self, interaction: discord.Interaction, printer: str):
+        await interaction.response.send_message(printer)
+
+    @app_commands.command(name="embed", description="Embed Demo!")
+    async def embed(self, interaction: discord.Interaction):
+        embed = discord.Embed(
+            title="I am a Title",
+            url="https://www.reddit.com/r/mushokutensei/",
+            description="I am the description",
+            color=discord.Color.red()
+        )
+        embed.set_thumbnail(url="https://static.wikia.nocookie.net/mushoku-tensei/images/5/54/Rudeus_Greyrat_Anime.png")
+        embed.add_field(name="Field 1", value="This is field 1", inline=False)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="menu", description="Display a dropdown menu")
+    async def my_menu(self, interaction: discord.Interaction):
+        menu = components.select("demo.menu", placeholder="Please choose an option", min_values=1, max_values=1,
+                                 options=MENU_OPTIONS)
+        await interaction.response.send_message("Here is a menu:", view=components.view(menu))
+
+    @app_commands.command(name="button", description="Display a button")
+    async def button(self, interaction: discord.Interaction):
+        buttons = [
+            components.button("demo.button", number, label=label, style=style, emoji=emoji)
+            for number, (label, style, emoji, _) in BUTTONS.items()
+        ]
+        await interaction.response.send_message("Here is a button!", view=components.view(*buttons))
+
+    # ---------------- GREETING ---------------- #
+    @commands.Cog.listener()
+    async def on_clean_message(self, message):
+        # dispatched by the bot for messages moderation let through
+        if not (message.content or "").startswith('Hey'):
+            return
+        # one greeting per user and channel, however many times they say hey before it goes out
+        self.bot.outbound.send(message.channel, f'Hello There {message.author.mention}!',
+                               key=("greeting", message.channel.id, message.author.id))
+
+    # ---------------- PREFIX COMMANDS ---------------- #
+    @commands.command(name="ping")
+    async def ping(self, ctx):
+        latency = round(self.bot.latency * 1000)
+        try:
+            await ctx.send(f'Pong! Latency: {latency}ms')
+        except Exception:
+            pass
+
+    @commands.command(name="mention")
+    @commands.has_permissions(administrator=True)
+    async def mention(self, ctx, *, target: str):
+        # target can be @role or @user mention or plain text
+        try:
+            await ctx.send(target)
+        except Exception:
+            pass
+
+
+async def setup(bot):
+    await bot.add_cog(Demo(bot), guild=bot.guild_object)
@@ -0,0 +1,836 @@
+"""
+Moderation extension
+Runs every message through the moderation pipeline (raid, banned words,
+spam, duplicate floods, remote classifier) and provides the moderator
+commands. All detector state lives on the cog, so a reload starts fresh.
+"""
+import asyncio
+import datetime
+import logging
+from functools import partial
+
+import discord
+from discord.ext import commands, tasks
+
+from ban_index import BanIndex
+from config import BotConfig
+from fingerprint import DuplicateIndex, simhash
+from guild_settings import NO_OVERRIDES, SETTINGS, format_setting, parse_setting
+from history_scan import META_KEY, HistoryScan, ScanState
+from matcher import BannedWordMatcher
+from metrics import REGISTRY
+from outbound import PRIORITY_MODERATION, PRIORITY_NAMES, PRIORITY_REPLY
+from pipeline import ActionQueue, MessageContext, Pipeline, Verdict
+from raid_detector import RaidMonitor, RAID_START, RAID_END
+from spam_detector import SpamDetector
+from strike_store import create_strike_store
+
+log = logging.getLogger(__name__)
+
+METRIC_NAMES = ("pipeline_stage_seconds", "moderation_action_seconds", "moderation_actions_queued",
+                "moderation_actions_total", "spam_tracked_users", "profanity_classifier_total")
+SCAN_OPTIONS = ("strikes", "spam", "dryrun")
+SCAN_PROGRESS_INTERVAL = 5.0  # seconds between edits of a scan's progress message
+SCAN_STOP_TIMEOUT = 10.0  # seconds an unload waits for scans to checkpoint their current pages
+
+
+def build_matcher(config):
+    """Compile the banned word matcher from a settings snapshot"""
+    return BannedWordMatcher(
+        config.BANNED_WORDS,
+        mode=config.BANNED_WORD_MODE,
+        normalize=config.BANNED_WORD_NORMALIZE,
+    )
+
+
+class GuildRules:
+    """A guild's moderation settings, compiled: the global ones with its overrides applied"""
+
+    __slots__ = ("matcher", "spam_detector", "strikes_to_ban")
+
+    def __init__(self, matcher, spam_detector, strikes_to_ban):
+        self.matcher = matcher
+        self.spam_detector = spam_detector
+        self.strikes_to_ban = strikes_to_ban
+
+
+def compile_rules(overrides, defaults, config, previous=None):
+    """GuildRules for a guild's overrides; parts it doesn't override are shared with defaults
+
+    config is the settings snapshot defaults were built from. A previous
+    compilation's spam detector is kept (with its history) when the spam
+    settings didn't change.
+    """
+    if not overrides:
+        return defaults
+    words = overrides.get("banned_words", config.BANNED_WORDS)
+    mode = overrides.get("banned_word_mode", config.BANNED_WORD_MODE)
+    normalize = overrides.get("banned_word_normalize", config.BANNED_WORD_NORMALIZE)
+    if (words, mode, normalize) == (config.BANNED_WORDS, config.BANNED_WORD_MODE, config.BANNED_WORD_NORMALIZE):
+        matcher = defaults.matcher
+    elif previous is not None and (previous.matcher.terms, previous.matcher.mode, previous.matcher.normalize) == (words, mode, normalize):
+        matcher = previous.matcher
+    else:
+        matcher = BannedWordMatcher(words, mode=mode, normalize=normalize)
+    limit = overrides.get("spam_message_limit", config.SPAM_MESSAGE_LIMIT)
+    window = overrides.get("spam_time_window", config.SPAM_TIME_WINDOW)
+    if (limit, window) == (config.SPAM_MESSAGE_LIMIT, config.SPAM_TIME_WINDOW):
+        spam_detector = defaults.spam_detector
+    elif (previous is not None and previous.spam_detector is not defaults.spam_detector
+          and (previous.spam_detector.limit, previous.spam_detector.window) == (limit, float(window))):
+        spam_detector = previous.spam_detector
+    else:
+        spam_detector = SpamDetector(limit, window)
+    return GuildRules(matcher, spam_detector, overrides.get("strikes_to_ban", config.STRIKES_TO_BAN))
+
+
+def raid_settings(config):
+    return dict(
+        window=config.RAID_WINDOW,
+        channel_messages=config.RAID_CHANNEL_MESSAGES,
+        duplicate_messages=config.RAID_DUPLICATE_MESSAGES,
+        min_authors=config.RAID_MIN_AUTHORS,
+        fresh_authors=config.RAID_FRESH_AUTHORS,
+        cooldown=config.RAID_COOLDOWN,
+    )
+
+
+def build_duplicate_index(config):
+    return DuplicateIndex(
+        window=config.DUPLICATE_WINDOW,
+        threshold=config.DUPLICATE_THRESHOLD,
+        max_distance=config.DUPLICATE_MAX_DISTANCE,
+    )
+
+
+def is_fresh_account(member, max_age):
+    """True if the account was created, or joined the guild, less than max_age ago"""
+    cutoff = discord.utils.utcnow() - max_age
+    joined_at = getattr(member, "joined_at", None)
+    return member.created_at > cutoff or (joined_at is not None and joined_at > cutoff)
+
+
+class Moderation(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # what the live settings were when the state below was built; message handling reads
+        # these rather than BotConfig, which a reload changes before the state is rebuilt
+        self.config = BotConfig.snapshot()
+        self.banned_matcher = build_matcher(self.config)
+        self.profanity_classifier = None
+        if BotConfig.PROFANITY_API_ENABLED:
+            # aiohttp is only imported when the remote filter is actually used
+            from classifier import ProfanityClassifier
+            self.profanity_classifier = ProfanityClassifier(
+                BotConfig.PROFANITY_API_KEY,
+                # looked up at call time so a rebuilt matcher is picked up
+                fallback=lambda text: self.banned_matcher.contains(text),
+                api_url=BotConfig.PROFANITY_API_URL,
+                max_concurrency=BotConfig.PROFANITY_API_CONCURRENCY,
+                timeout=BotConfig.PROFANITY_API_TIMEOUT,
+                cache_size=BotConfig.PROFANITY_CACHE_SIZE,
+                cache_ttl=BotConfig.PROFANITY_CACHE_TTL,
+            )
+        self.strikes = create_strike_store(BotConfig)
+        self.spam_detector = SpamDetector(self.config.SPAM_MESSAGE_LIMIT, self.config.SPAM_TIME_WINDOW)
+        # the global settings, shared by every guild without overrides
+        self.default_rules = GuildRules(self.banned_matcher, self.spam_detector, self.config.STRIKES_TO_BAN)
+        self.guild_rules = {}  # guild_id -> GuildRules, compiled on the guild's first message
+        self.raid_monitor = RaidMonitor(**raid_settings(self.config))
+        self.fresh_account_age = datetime.timedelta(days=self.config.RAID_FRESH_ACCOUNT_DAYS)
+        self.duplicate_index = build_duplicate_index(self.config)
+        self.pipeline = self.build_pipeline(self.config)
+        self.actions = ActionQueue(workers=BotConfig.ACTION_WORKERS)
+        self.bans = BanIndex()
+        self.scans = {}  # guild_id -> running HistoryScan
+        self._scan_followers = set()
+
+    async def cog_load(self):
+        await self.strikes.start()
+        await self.actions.start()
+        if self.profanity_classifier is not None:
+            await self.profanity_classifier.start()
+        if self.config.RAID_DETECTION:
+            self.raid_watch.start()
+        self.register_metrics()
+
+    def register_metrics(self):
+        # read from the cog's own state at export time; re-registered by a reload
+        REGISTRY.collect("pipeline_stage_seconds", "Time spent in each message pipeline stage",
+                         lambda: {(name,): h for name, h in self.pipeline.histograms.items()}, ("stage",), kind="histogram")
+        REGISTRY.collect("moderation_action_seconds", "Time from verdict to its actions completing",
+                         lambda: {(): self.actions.latency}, kind="histogram")
+        REGISTRY.collect("moderation_actions_queued", "Verdict jobs waiting for an action worker", lambda: len(self.actions))
+        REGISTRY.collect("moderation_actions_total", "Failed and dropped verdict actions",
+                         lambda: {("failed",): self.actions.failed, ("dropped",): self.actions.dropped}, ("result",), kind="counter")
+        REGISTRY.collect("spam_tracked_users", "Users with recent messages in the spam detectors",
+                         lambda: sum(len(d) for d in {id(r.spam_detector): r.spam_detector for r in [self.default_rules, *self.guild_rules.values()]}.values()))
+        if self.profanity_classifier is not None:
+            REGISTRY.collect("profanity_classifier_total", "Remote profanity filter lookups, by outcome",
+                             lambda: {(k,): v for k, v in self.profanity_classifier.stats.items()}, ("outcome",), kind="counter")
+
+    async def cog_unload(self):
+        # also runs on bot shutdown and before a reload swaps in the new module
+        REGISTRY.unregister(*METRIC_NAMES)
+        self.raid_watch.cancel()
+        await self.stop_scans()
+        await self.actions.close()
+        if self.profanity_classifier is not None:
+            await self.profanity_classifier.close()
+        await self.strikes.close()
+
+    def rebuild_matcher(self):
+        """Swap in a freshly compiled matcher, e.g. after the banned word list changes"""
+        self.banned_matcher = build_matcher(self.config)
+        self.default_rules = GuildRules(self.banned_matcher, self.spam_detector, self.config.STRIKES_TO_BAN)
+        self.guild_rules.clear()
+        return self.banned_matcher
+
+    # ---------------- PER-GUILD SETTINGS ---------------- #
+    async def load_rules(self, guild_id):
+        """Compile a guild's rules from its stored overrides and cache them"""
+        overrides = await self.bot.guild_settings.overrides(guild_id) if guild_id else NO_OVERRIDES
+        previous = self.guild_rules.get(guild_id)
+        defaults, config = self.default_rules, self.config
+        if overrides:
+            # a guild word list means compiling a matcher; keep that off the event loop
+            rules = await asyncio.to_thread(compile_rules, overrides, defaults, config, previous)
+        else:
+            rules = defaults
+        if self.default_rules is defaults:  # else a config reload raced us and recompiles everything
+            self.guild_rules[guild_id] = rules
+        return rules
+
+    async def rules_for(self, guild_id):
+        rules = self.guild_rules.get(guild_id)
+        if rules is None:
+            rules = await self.load_rules(guild_id)
+        return rules
+
+    @commands.Cog.listener()
+    async def on_guild_settings_update(self, guild_id):
+        await self.load_rules(guild_id)
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed):
+        """Rebuild what the changed settings feed into, then swap it all in at once
+
+        The new matcher is compiled off the event loop and everything else is
+        built beforehand, so messages keep flowing meanwhile and each one sees
+        either the old state or the new, never a mix: the new settings are
+        read into a snapshot that is swapped in along with what was built
+        from it. Detectors whose settings didn't change keep their history.
+        """
+        config = BotConfig.snapshot()
+        matcher = self.banned_matcher
+        if changed & {"BANNED_WORDS", "BANNED_WORD_MODE", "BANNED_WORD_NORMALIZE"}:
+            matcher = await asyncio.to_thread(build_matcher, config)
+        spam_detector = self.spam_detector
+        if changed & {"SPAM_MESSAGE_LIMIT", "SPAM_TIME_WINDOW"}:
+            spam_detector = SpamDetector(config.SPAM_MESSAGE_LIMIT, config.SPAM_TIME_WINDOW)
+        duplicate_index = self.duplicate_index
+        if "DUPLICATE_MAX_DISTANCE" in changed:
+            duplicate_index = build_duplicate_index(config)
+        defaults = GuildRules(matcher, spam_detector, config.STRIKES_TO_BAN)
+        guild_rules = {}
+        for guild_id, previous in list(self.guild_rules.items()):
+            overrides = self.bot.guild_settings.cached(guild_id) or NO_OVERRIDES
+            guild_rules[guild_id] = (await asyncio.to_thread(compile_rules, overrides, defaults, config, previous)
+                                     if overrides else defaults)
+        pipeline = self.pipeline
+        if changed & {"RAID_DETECTION", "DUPLICATE_DETECTION"}:
+            pipeline = self.build_pipeline(config)
+            for name, histogram in self.pipeline.histograms.items():
+                if name in pipeline.histograms:
+                    pipeline.histograms[name] = histogram
+
+        # ---- swap: no awaits from here on ----
+        self.config = config
+        self.banned_matcher = matcher
+        self.spam_detector = spam_detector
+        self.default_rules = defaults
+        self.guild_rules = guild_rules
+        self.duplicate_index = duplicate_index
+        duplicate_index.window = float(config.DUPLICATE_WINDOW)
+        duplicate_index.threshold = config.DUPLICATE_THRESHOLD
+        self.raid_monitor.configure(**raid_settings(config))
+        self.fresh_account_age = datetime.timedelta(days=config.RAID_FRESH_ACCOUNT_DAYS)
+        self.pipeline = pipeline
+        if config.RAID_DETECTION and not self.raid_watch.is_running():
+            self.raid_watch.start()
+        elif not config.RAID_DETECTION:
+            self.raid_watch.cancel()
+
+    async def screen(self, message):
+        """Run the pipeline; returns False if a verdict claimed the message"""
+        guild_id = message.guild.id if message.guild else None
+        rules = self.guild_rules.get(guild_id)
+        if rules is None:
+            rules = await self.load_rules(guild_id)
+        verdict = await self.pipeline.process(MessageContext(message, rules))
+        if verdict is not None:
+            self.actions.submit(*verdict.actions, label=verdict.stage)
+            if verdict.final:
+                return False
+        return True
+
+    # ---------------- PIPELINE STAGES ---------------- #
+    # Stages only inspect the message and in-memory state; anything that
+    # talks to Discord or storage is returned as a verdict action.
+    def build_pipeline(self, config):
+        pipeline = Pipeline()
+        if config.RAID_DETECTION:
+            pipeline.register("raid", self.stage_raid)
+        pipeline.register("profanity", self.stage_profanity)
+        pipeline.register("spam", self.stage_spam)
+        if config.DUPLICATE_DETECTION:
+            pipeline.register("duplicate", self.stage_duplicate)
+        if self.profanity_classifier is not None:
+            pipeline.register("classifier", self.stage_classifier)
+        return pipeline
+
+    def stage_raid(self, ctx):
+        # observes every guild message (before anything can claim it) but never claims one
+        if ctx.guild_id is None:
+            return None
+        transition = self.raid_monitor.observe(
+            ctx.guild_id,
+            ctx.channel_id,
+            ctx.author_id,
+            content_key=ctx.folded if ctx.content else None,
+            fresh=is_fresh_account(ctx.message.author, self.fresh_account_age),
+            now=ctx.now,
+        )
+        if transition == RAID_START:
+            self.actions.submit(partial(self.on_raid_transition, ctx.message.guild, transition), label="raid")
+        return None
+
+    def stage_profanity(self, ctx):
+        matcher = ctx.settings.matcher
+        hit = matcher.search(ctx.content, ctx.normalized if matcher.normalize else None)
+        if hit:
+            return self.profanity_verdict(ctx, f"banned word \"{hit.term}\"")
+        return None
+
+    async def stage_classifier(self, ctx):
+        # the remote check for what the local matcher missed, so it runs last
+        if ctx.content and await self.profanity_classifier.classify(ctx.content, ctx.folded):
+            return self.profanity_verdict(ctx, "language flagged by the profanity filter")
+        return None
+
+    def profanity_verdict(self, ctx, reason):
+        return Verdict(reason, [
+            partial(self.delete_message, ctx.message),
+            partial(self.handle_profanity, ctx.message, reason, ctx.settings),
+        ])
+
+    def stage_spam(self, ctx):
+        spam_detector = ctx.settings.spam_detector
+        if not spam_detector.record(ctx.author_id, ctx.now):
+            return None
+        spam_detector.reset(ctx.author_id)
+        return Verdict("spam", [
+            partial(self.delete_message, ctx.message),
+            partial(self.handle_spam, ctx.message, spam_detector),
+        ])
+
+    def stage_duplicate(self, ctx):
+        if len(ctx.content) < self.config.DUPLICATE_MIN_LENGTH:
+            return None
+        dup = self.duplicate_index.check(
+            simhash(ctx.content, folded=ctx.folded),
+            ctx.author_id,
+            ctx.channel_id,
+            scope=ctx.guild_id,
+            now=ctx.now,
+        )
+        if not dup:
+            return None
+        message = ctx.message
+        return Verdict("duplicate flood", [
+            partial(self.delete_message, message),
+            partial(
+                self.bot.log_mod_action,
+                f"Duplicate flood: deleted message from {message.author} ({message.author.id}) in "
+                f"{getattr(message.channel, 'mention', str(message.channel))}, {dup.count} near-identical messages "
+                f"from {dup.authors} users across {dup.channels} channels in {self.config.DUPLICATE_WINDOW}s.",
+                action="duplicate", user_id=message.author.id, guild_id=ctx.guild_id, channel_id=message.channel.id, copies=dup.count,
+            ),
+        ])
+
+    # ---------------- ACTIONS ---------------- #
+    # Discord calls go through the bot's outbound scheduler: deletes and bans
+    # are batched into bulk requests and jump ahead of warnings and logs.
+    async def delete_message(self, message):
+        self.bot.outbound.delete(message)
+
+    async def safe_send(self, channel, content, key=None, **kwargs):
+        self.bot.outbound.send(channel, content, key=key, **kwargs)
+
+    async def handle_profanity(self, message, reason, rules):
+        """Add a strike for a profane message and ban once the limit is reached"""
+        strike_count = await self.strikes.add(
+            message.guild.id if message.guild else 0,
+            message.author.id,
+            reason=reason,
+        )
+        # only the latest strike count is worth showing if warnings pile up
+        await self.safe_send(message.channel, f"{message.author.mention}, that language is not allowed. Strike {strike_count}/{rules.strikes_to_ban}.",
+                             key=("strike-warning", message.channel.id, message.author.id), delete_after=8)
+        await self.bot.log_mod_action(
+            f"Profanity: {message.author} ({message.author.id}) used {reason} in {getattr(message.channel, 'mention', str(message.channel))}. Strike {strike_count}.",
+            action="strike", user_id=message.author.id, guild_id=message.guild.id if message.guild else None,
+            channel_id=message.channel.id, reason=reason, strikes=strike_count,
+        )
+        if strike_count >= rules.strikes_to_ban:
+            if message.guild:
+                if await self.bot.outbound.ban(message.guild, message.author, reason="Exceeded profanity strikes"):
+                    await self.bot.log_mod_action(f"Banned {message.author} for exceeding profanity strikes.",
+                                                  action="ban", user_id=message.author.id, guild_id=message.guild.id)
+                else:
+                    await self.bot.log_mod_action(f"Failed to ban {message.author}.",
+                                                  action="ban_failed", user_id=message.author.id, guild_id=message.guild.id)
+
+    async def handle_spam(self, message, spam_detector):
+        """Ban a spammer (only in guilds), or warn them in DMs"""
+        if message.guild:
+            if await self.bot.outbound.ban(message.guild, message.author, reason="Spam detected (automated)"):
+                await self.safe_send(message.channel, f"{message.author.mention} has been banned for spamming.", delete_after=8)
+                await self.bot.log_mod_action(f"Banned {message.author} for spamming ({spam_detector.limit} msgs in {spam_detector.window:g}s).",
+                                              action="ban", user_id=message.author.id, guild_id=message.guild.id, reason="spam")
+            else:
+                await self.bot.log_mod_action(f"Failed to ban {message.author} for spam.",
+                                              action="ban_failed", user_id=message.author.id, guild_id=message.guild.id, reason="spam")
+        else:
+            # DM spam or unable to ban: warn
+            await self.safe_send(message.channel, "Please stop spamming.", key=("spam-warning", message.channel.id), delete_after=8)
+
+    @tasks.loop(seconds=5)
+    async def raid_watch(self):
+        # raids end on silence, so they have to be polled rather than observed
+        for guild_id, transition in list(self.raid_monitor.poll()):
+            guild = self.bot.get_guild(guild_id)
+            if guild:
+                await self.on_raid_transition(guild, transition)
+
+    async def on_raid_transition(self, guild, transition):
+        """Announce a raid starting or ending; listeners can hook on_raid_start/on_raid_end to lock down"""
+        stats = self.raid_monitor.get(guild.id).snapshot()
+        if transition == RAID_START:
+            await self.bot.log_mod_action(
+                f"🚨 Raid detected in {guild.name}: {stats['reason']} "
+                f"({stats['distinct_authors']} authors, {stats['fresh_authors']} new accounts). Lockdown recommended.",
+                action="raid_start", guild_id=guild.id,
+            )
+            self.bot.dispatch("raid_start", guild, stats)
+        elif transition == RAID_END:
+            await self.bot.log_mod_action(f"✅ Raid in {guild.name} has ended.", action="raid_end", guild_id=guild.id)
+            self.bot.dispatch("raid_end", guild, stats)
+
+    # ---------------- PIPELINE STATS ---------------- #
+    @commands.command(name="pipeline")
+    @commands.has_permissions(administrator=True)
+    async def pipeline_stats(self, ctx):
+        lines = []
+        for name, stats in self.pipeline.stats().items():
+            lines.append(f"{name:<16} n={stats['count']:<8} p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms max={stats['max_ms']:.2f}ms")
+        actions = self.actions.latency.summary()
+        lines.append(
+            f"{'actions':<16} n={actions['count']:<8} p50={actions['p50_ms']:.1f}ms p99={actions['p99_ms']:.1f}ms "
+            f"queued={len(self.actions)} failed={self.actions.failed} dropped={self.actions.dropped}"
+        )
+        outbound = self.bot.outbound.stats()
+        for name in PRIORITY_NAMES:
+            latency = outbound["latency"][name]
+            lines.append(
+                f"{'api ' + name:<16} n={latency['count']:<8} p50={latency['p50_ms']:.1f}ms p99={latency['p99_ms']:.1f}ms "
+                f"queued={outbound['queued'][name]}"
+            )
+        lines.append(
+            f"{'api':<16} running={outbound['running']} merged={outbound['merged']} dropped={outbound['dropped']} "
+            f"failed={outbound['failed']} bulk_deleted={outbound['bulk_deleted']} bulk_banned={outbound['bulk_banned']}"
+        )
+        try:
+            await ctx.send("```\n" + "\n".join(lines) + "\n```")
+        except Exception:
+            pass
+
+    # ---------------- ADMIN / MODERATION COMMANDS ---------------- #
+    @commands.command(name="addrole")
+    @commands.has_permissions(manage_roles=True)
+    async def addrole(self, ctx, members: commands.Greedy[discord.Member], *, role_name: str):
+        """Add a role to one or more members: !addrole @a @b Role Name"""
+        await self.edit_role(ctx, members, role_name, add=True)
+
+    @commands.command(name="removerole")
+    @commands.has_permissions(manage_roles=True)
+    async def removerole(self, ctx, members: commands.Greedy[discord.Member], *, role_name: str):
+        """Remove a role from one or more members: !removerole @a @b Role Name"""
+        await self.edit_role(ctx, members, role_name, add=False)
+
+    @commands.command(name="roleall")
+    @commands.has_permissions(manage_roles=True)
+    async def roleall(self, ctx, action: str, role_name: str, *, with_role: str = None):
+        """Add or remove a role for every member, or only for members with another role"""
+        if action not in ("add", "remove"):
+            await ctx.send('Usage: !roleall <add|remove> "<role>" ["<members with this role>"]')
+            return
+        filter_role = None
+        if with_role is not None:
+            filter_role = await self.resolve_role(ctx, with_role)
+            if filter_role is None:
+                return
+        members = await self.guild_members(ctx.guild)
+        if filter_role is not None:
+            members = [m for m in members if m.get_role(filter_role.id) is not None]
+        await self.edit_role(ctx, members, role_name, add=action == "add")
+
+    async def guild_members(self, guild):
+        """Every member of the guild, fetched on demand if the cache profile doesn't keep them all"""
+        if guild.chunked:
+            return guild.members
+        # with a member cache the chunk stays cached and join/leave events keep it
+        # current; without one (minimal profile) it is fetched again each time
+        return await guild.chunk(cache=self.bot.member_cache_flags.joined)
+
+    async def resolve_role(self, ctx, name):
+        """Role by name (any case) from the bot's role index; replies with suggestions if there is none"""
+        role = self.bot.role_index.find(ctx.guild, name)
+        if role is None:
+            close = self.bot.role_index.suggest(ctx.guild, name)
+            hint = f" Did you mean {', '.join(r.name for r in close)}?" if close else ""
+            await ctx.send(f"Role not found.{hint}")
+        return role
+
+    async def edit_role(self, ctx, members, role_name, add):
+        role = await self.resolve_role(ctx, role_name)
+        if role is None:
+            return
+        if not members:
+            await ctx.send("Name at least one member.")
+            return
+        if role.managed or role >= ctx.guild.me.top_role:
+            await ctx.send("I don't have permission to manage that role.")
+            return
+        # members that already have (or lack) the role cost no API call
+        members = [m for m in members if (role in m.roles) != add]
+        verb, prep = ("Added", "to") if add else ("Removed", "from")
+        if not members:
+            await ctx.send(f"Nothing to do: every member {'already has' if add else 'lacks'} {role.name}.")
+            return
+        if len(members) == 1:
+            member = members[0]
+            try:
+                if add:
+                    await member.add_roles(role, reason=f"Role added by {ctx.author}")
+                else:
+                    await member.remove_roles(role, reason=f"Role removed by {ctx.author}")
+                await ctx.send(f"{verb} role {role.name} {prep} {member.mention}.")
+                await self.bot.log_mod_action(f"{ctx.author} {verb.lower()} role {role.name} {prep} {member}.",
+                                              action="role_add" if add else "role_remove", user_id=member.id, guild_id=ctx.guild.id)
+            except discord.Forbidden:
+                await ctx.send("I don't have permission to manage that role.")
+            except Exception as e:
+                await ctx.send(f"Failed to {'add' if add else 'remove'} role: {e}")
+            return
+
+        # one request per member; the scheduler runs a few at a time per guild,
+        # behind automated bans and deletes
+        reason = f"Role {'added' if add else 'removed'} by {ctx.author}"
+        futures = [
+            self.bot.outbound.submit(
+                (lambda m=member: m.add_roles(role, reason=reason)) if add else (lambda m=member: m.remove_roles(role, reason=reason)),
+                PRIORITY_REPLY, ("guild", ctx.guild.id), label="role edit",
+            )
+            for member in members
+        ]
+        await ctx.send(f"Updating {role.name} for {len(members)} members...")
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        failed = sum(isinstance(result, Exception) for result in results)
+        done = len(members) - failed
+        await ctx.send(f"{verb} role {role.name} {prep} {done} members." + (f" {failed} failed." if failed else ""))
+        await self.bot.log_mod_action(f"{ctx.author} {verb.lower()} role {role.name} {prep} {done} members.",
+                                      action="role_add" if add else "role_remove", guild_id=ctx.guild.id, count=done)
+
+    @commands.command(name="kick")
+    @commands.has_permissions(kick_members=True)
+    async def kick(self, ctx, member: discord.Member, *, reason: str = "No reason provided"):
+        try:
+            await member.kick(reason=f"{reason} (by {ctx.author})")
+            await ctx.send(f"{member.mention} has been kicked. Reason: {reason}")
+            await self.bot.log_mod_action(f"{ctx.author} kicked {member}. Reason: {reason}",
+                                          action="kick", user_id=member.id, guild_id=ctx.guild.id, reason=reason)
+        except Exception as e:
+            await ctx.send(f"Failed to kick: {e}")
+
+    @commands.command(name="ban")
+    @commands.has_permissions(ban_members=True)
+    async def ban(self, ctx, member: discord.Member, *, reason: str = "No reason provided"):
+        try:
+            await member.ban(reason=f"{reason} (by {ctx.author})")
+            await ctx.send(f"{member.mention} has been banned. Reason: {reason}")
+            await self.bot.log_mod_action(f"{ctx.author} banned {member}. Reason: {reason}",
+                                          action="ban", user_id=member.id, guild_id=ctx.guild.id, reason=reason)
+        except Exception as e:
+            await ctx.send(f"Failed to ban: {e}")
+
+    @commands.command(name="unban")
+    @commands.has_permissions(ban_members=True)
+    async def unban(self, ctx, *, user: str):
+        """Unban by user ID, mention, username or the start of a username"""
+        try:
+            matches = await self.bans.find(ctx.guild, user, limit=10)
+        except discord.HTTPException as e:
+            await ctx.send(f"Could not read the ban list: {e}")
+            return
+        if not matches:
+            await ctx.send("User not found in ban list.")
+            return
+        if len(matches) > 1:
+            names = ", ".join(f"{tag} ({user_id})" for user_id, tag in matches)
+            await ctx.send(f"Several banned users match: {names}. Use the full name or the ID.")
+            return
+        user_id, tag = matches[0]
+        try:
+            await ctx.guild.unban(discord.Object(id=user_id), reason=f"Unbanned by {ctx.author}")
+        except discord.NotFound:
+            pass  # already unbanned; the index just hadn't seen the event yet
+        except Exception as e:
+            await ctx.send(f"Failed to unban: {e}")
+            return
+        self.bans.unbanned(ctx.guild.id, user_id)
+        await ctx.send(f"Unbanned {tag} (<@{user_id}>)")
+        await self.bot.log_mod_action(f"{ctx.author} unbanned {tag}.", action="unban", user_id=user_id, guild_id=ctx.guild.id)
+
+    @commands.command(name="bulkunban")
+    @commands.has_permissions(ban_members=True)
+    async def bulkunban(self, ctx, *targets: str):
+        """Unban several users: IDs, usernames, or name* for every ban starting with name"""
+        if not targets:
+            await ctx.send("Usage: !bulkunban <id|username|prefix*> ...")
+            return
+        users = {}
+        try:
+            for target in targets:
+                if target.endswith("*"):
+                    matches = await self.bans.match_prefix(ctx.guild, target[:-1])
+                else:
+                    matches = (await self.bans.find(ctx.guild, target))[:1]
+                users.update(matches)
+        except discord.HTTPException as e:
+            await ctx.send(f"Could not read the ban list: {e}")
+            return
+        if not users:
+            await ctx.send("No banned users match.")
+            return
+
+        # Discord has no bulk unban; queue them behind automated bans, a few at a time per guild
+        guild = ctx.guild
+        reason = f"Bulk unban by {ctx.author}"
+        futures = {
+            user_id: self.bot.outbound.submit(
+                lambda u=user_id: guild.unban(discord.Object(id=u), reason=reason),
+                PRIORITY_MODERATION, ("guild", guild.id), label="unban",
+            )
+            for user_id in users
+        }
+        await ctx.send(f"Unbanning {len(users)} users...")
+        results = await asyncio.gather(*futures.values(), return_exceptions=True)
+        done = 0
+        for user_id, result in zip(futures, results):
+            if not isinstance(result, Exception) or isinstance(result, discord.NotFound):
+                self.bans.unbanned(guild.id, user_id)
+                done += 1
+        failed = len(users) - done
+        await ctx.send(f"Unbanned {done} users." + (f" {failed} failed." if failed else ""))
+        await self.bot.log_mod_action(f"{ctx.author} bulk unbanned {done} users ({', '.join(targets)[:200]}).",
+                                      action="bulk_unban", guild_id=guild.id, count=done)
+
+    # ---------------- SERVER SETTINGS ---------------- #
+    @commands.group(name="guildconfig", invoke_without_command=True)
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def guildconfig(self, ctx):
+        """Show this server's setting overrides: !guildconfig [set <key> <value> | reset [key]]"""
+        overrides = await self.bot.guild_settings.overrides(ctx.guild.id)
+        lines = [f"{key} = {format_setting(value)}"[:200] for key, value in sorted(overrides.items())]
+        lines = lines or ["(no overrides; the global configuration applies)"]
+        lines += ["", "Settings:"] + [f"  {key}: {description}" for key, (_, description) in SETTINGS.items()]
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @guildconfig.command(name="set")
+    async def guildconfig_set(self, ctx, key: str, *, value: str):
+        key = key.lower()
+        if key == "mod_log_channel_id":
+            try:
+                channel_id = parse_setting(key, value)
+            except ValueError as e:
+                await ctx.send(f"Invalid value: {e}")
+                return
+            if ctx.guild.get_channel(channel_id) is None:
+                await ctx.send("The mod log channel must be a channel in this server.")
+                return
+        try:
+            parsed = await self.bot.guild_settings.set(ctx.guild.id, key, value)
+        except KeyError:
+            await ctx.send(f"Unknown setting {key}. Choose from: {', '.join(SETTINGS)}")
+            return
+        except ValueError as e:
+            await ctx.send(f"Invalid value: {e}")
+            return
+        self.bot.dispatch("guild_settings_update", ctx.guild.id)
+        await ctx.send(f"Set {key} to {format_setting(parsed)[:200]} for this server.")
+        await self.bot.log_mod_action(f"{ctx.author} set {key} for this server.", action="guild_config", guild_id=ctx.guild.id, key=key)
+
+    @guildconfig.command(name="reset")
+    async def guildconfig_reset(self, ctx, key: str = None):
+        key = key.lower() if key else None
+        if key is not None and key not in SETTINGS:
+            await ctx.send(f"Unknown setting {key}. Choose from: {', '.join(SETTINGS)}")
+            return
+        if not await self.bot.guild_settings.reset(ctx.guild.id, key):
+            await ctx.send("Nothing to reset.")
+            return
+        self.bot.dispatch("guild_settings_update", ctx.guild.id)
+        await ctx.send(f"Reset {key or 'all settings'} to the global configuration.")
+        await self.bot.log_mod_action(f"{ctx.author} reset {key or 'all settings'} for this server.",
+                                      action="guild_config", guild_id=ctx.guild.id, key=key)
+
+    # ---------------- HISTORY SCAN ---------------- #
+    @commands.group(name="scan", invoke_without_command=True)
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def scan(self, ctx):
+        """Show the history scan's progress: !scan [start [#channel...] [strikes] [spam] [dryrun] | resume | stop]"""
+        scan = self.scans.get(ctx.guild.id)
+        state = scan.state if scan else await self.saved_scan(ctx.guild.id)
+        if state is None:
+            await ctx.send("No history scan has run in this server. Usage: !scan start [#channel...] [strikes] [spam] [dryrun]")
+            return
+        status = "running" if scan else "finished" if state.finished else "stopped (`!scan resume` continues it)"
+        await ctx.send(f"History scan {status}: {state.summary()}.")
+
+    @scan.command(name="start")
+    async def scan_start(self, ctx, channels: commands.Greedy[discord.TextChannel], *options: str):
+        """Scan channels' history (every readable channel if none are named) and delete what the filters catch"""
+        options = {option.lower() for option in options}
+        if not options <= set(SCAN_OPTIONS):
+            await ctx.send(f"Unknown options: {', '.join(sorted(options - set(SCAN_OPTIONS)))}. Choose from: {', '.join(SCAN_OPTIONS)}")
+            return
+        if ctx.guild.id in self.scans:
+            await ctx.send("A history scan is already running here; `!scan stop` it first.")
+            return
+        dry_run = "dryrun" in options
+        named = bool(channels)
+        channels = channels or ctx.guild.text_channels
+        usable = []
+        for channel in channels:
+            permissions = channel.permissions_for(ctx.guild.me)
+            if permissions.read_message_history and (dry_run or permissions.manage_messages):
+                usable.append(channel)
+        skipped = [channel for channel in channels if channel not in usable]
+        if not usable:
+            await ctx.send("I can't read and manage messages in any of those channels.")
+            return
+        if skipped and named:
+            await ctx.send(f"Skipping channels I can't read or manage: {', '.join(c.mention for c in skipped)[:1500]}")
+        # everything sent after the command is screened live, so the scan starts before it
+        state = ScanState.start(ctx.guild.id, [channel.id for channel in usable], ctx.message.id,
+                                strikes="strikes" in options, spam="spam" in options, dry_run=dry_run)
+        await self.run_scan(ctx, state)
+
+    @scan.command(name="resume")
+    async def scan_resume(self, ctx):
+        """Continue a stopped or interrupted scan from its last checkpoint"""
+        if ctx.guild.id in self.scans:
+            await ctx.send("The history scan is already running.")
+            return
+        state = await self.saved_scan(ctx.guild.id)
+        if state is None or state.finished:
+            await ctx.send("There is no unfinished history scan to resume.")
+            return
+        await self.run_scan(ctx, state)
+
+    @scan.command(name="stop")
+    async def scan_stop(self, ctx):
+        """Stop the running scan after its current pages; `!scan resume` continues it"""
+        scan = self.scans.get(ctx.guild.id)
+        if scan is None:
+            await ctx.send("No history scan is running.")
+            return
+        scan.stop()
+        await ctx.send("Stopping the history scan once its current pages are done...")
+
+    async def saved_scan(self, guild_id):
+        text = await self.bot.guild_settings.get_meta(META_KEY.format(guild_id))
+        return ScanState.loads(guild_id, text) if text else None
+
+    async def run_scan(self, ctx, state):
+        guild = ctx.guild
+        save = partial(self.bot.guild_settings.set_meta, META_KEY.format(guild.id))
+        await save(state.dumps())
+        scan = HistoryScan(self.bot, guild, state, partial(self.rules_for, guild.id), self.strikes, save,
+                           concurrency=BotConfig.SCAN_CONCURRENCY)
+        self.scans[guild.id] = scan
+        scan.start()
+        status = await ctx.send(f"History scan of {len(state.remaining)} channels started: {state.summary()}.")
+        follower = asyncio.create_task(self.follow_scan(scan, status))
+        self._scan_followers.add(follower)
+        follower.add_done_callback(self._scan_followers.discard)
+        options = ", ".join(name for name, on in (("strikes", state.strikes), ("spam", state.spam), ("dry run", state.dry_run)) if on)
+        await self.bot.log_mod_action(f"{ctx.author} started a history scan of {len(state.remaining)} channels"
+                                      + (f" ({options})." if options else "."), action="history_scan", guild_id=guild.id)
+
+    async def follow_scan(self, scan, status):
+        """Keep the scan's status message current, then report how it ended"""
+        guild = scan.guild
+        try:
+            while not scan.task.done():
+                await asyncio.wait({scan.task}, timeout=SCAN_PROGRESS_INTERVAL)
+                # a pending edit is replaced by the newer one rather than queued behind it
+                self.bot.outbound.submit(partial(status.edit, content=f"History scan: {scan.state.summary()}."),
+                                         PRIORITY_REPLY, ("channel", status.channel.id), key=("scan-progress", guild.id),
+                                         label="scan progress")
+            state = scan.task.result()
+        except Exception as e:
+            log.exception("History scan of guild %s failed", guild.id)
+            await self.safe_send(status.channel, f"History scan failed: {e}. `!scan resume` continues from the last checkpoint.")
+            return
+        finally:
+            if self.scans.get(guild.id) is scan:
+                del self.scans[guild.id]
+        outcome = "finished" if state.finished else "stopped (`!scan resume` continues it)"
+        await self.safe_send(status.channel, f"History scan {outcome}: {state.summary()}.")
+        await self.bot.log_mod_action(f"History scan {outcome.split(' ')[0]}: {state.summary()}.",
+                                      action="history_scan", guild_id=guild.id, deleted=state.deleted, struck=state.struck)
+
+    async def stop_scans(self):
+        """Let running scans checkpoint their current pages, then cancel what is left"""
+        tasks = [scan.task for scan in self.scans.values()]
+        for scan in self.scans.values():
+            scan.stop()
+        if tasks:
+            await asyncio.wait(tasks, timeout=SCAN_STOP_TIMEOUT)
+        for task in tasks + list(self._scan_followers):
+            task.cancel()
+
+    # ---------------- BAN LIST EVENTS ---------------- #
+    @commands.Cog.listener()
+    async def on_member_ban(self, guild, user):
+        self.bans.banned(guild.id, user)
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild, user):
+        self.bans.unbanned(guild.id, user.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.bans.drop(guild.id)
+        self.guild_rules.pop(guild.id, None)
+        self.raid_monitor.drop(guild.id)
+        scan = self.scans.get(guild.id)
+        if scan is not None:
+            scan.stop()
+
+async def setup(bot):
+    await bot.add_cog(Moderation(bot))
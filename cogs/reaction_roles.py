@@ -0,0 +1,245 @@
+"""
+Reaction roles extension
+/colorrole posts a color panel and /reactionrole binds any emoji on any
+message to a role; reacting adds the role and removing the reaction takes
+it away. Bindings survive restarts (reaction_roles.json). Panels can also
+use buttons, which carry their role ID and need no stored binding.
+"""
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import components
+from config import BotConfig
+from outbound import PRIORITY_REPLY
+from role_registry import ReactionRoleRegistry, RoleEditBatcher
+
+COLOR_ROLES = {
+    '🟥': 'Red',
+    '🟩': 'Green',
+    '🟦': 'Blue',
+    '🟨': 'Yellow',
+    '🩷': 'Pink'
+}
+
+
+def parse_message_id(text):
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+class ReactionRoles(commands.Cog):
+    reactionrole = app_commands.Group(name="reactionrole", description="Manage reaction role panels", guild_only=True)
+
+    def __init__(self, bot):
+        self.bot = bot
+        # clustered processes share the file, each keeping only its own guilds' panels
+        self.registry = ReactionRoleRegistry(BotConfig.REACTION_ROLES_FILE, owns=self.bot.owns_guild if BotConfig.SHARD_IDS else None)
+        self.role_edits = RoleEditBatcher(self.apply_role_changes, delay=BotConfig.REACTION_ROLE_DEBOUNCE)
+
+    async def cog_load(self):
+        await self.registry.start()
+        self.bot.components.register("role", self.role_button)
+
+    async def cog_unload(self):
+        self.bot.components.unregister("role")
+        await self.role_edits.close()
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed):
+        self.role_edits.delay = BotConfig.REACTION_ROLE_DEBOUNCE
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.guild is None:
+            # in DMs interaction.user is a User, without guild permissions
+            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+            return False
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+            return False
+        return True
+
+    # ---------------- PANELS ---------------- #
+    @app_commands.command(name="colorrole", description="Create a message that lets the users pick color role")
+    @app_commands.guild_only()
+    @app_commands.describe(buttons="Use buttons instead of reactions")
+    async def color_role(self, interaction: discord.Interaction, buttons: bool = False):
+        await interaction.response.defer(ephemeral=True)
+
+        # roles are looked up by name once, here; reactions only use the stored IDs
+        roles = {emoji: self.bot.role_index.find(interaction.guild, name) for emoji, name in COLOR_ROLES.items()}
+        missing = [COLOR_ROLES[emoji] for emoji, role in roles.items() if role is None]
+        if len(missing) == len(COLOR_ROLES):
+            await interaction.followup.send(f"Create the roles {', '.join(missing)} first.", ephemeral=True)
+            return
+
+        verb = "Click a button" if buttons else "React to the message"
+        description = f"{verb} to become the Power Ranger you want to become:\n" + "".join(
+            f"{emoji} {COLOR_ROLES[emoji]}\n" for emoji, role in roles.items() if role is not None
+        )
+        embed = discord.Embed(
+            title="Pick The Color You Want!",
+            description=description,
+            color=discord.Color.blurple()
+        )
+
+        if buttons:
+            # each button carries its role ID, so there is nothing to store
+            panel = components.view(*(
+                components.button("role", role.id, label=COLOR_ROLES[emoji], emoji=emoji, style=discord.ButtonStyle.secondary)
+                for emoji, role in roles.items() if role is not None
+            ))
+            await interaction.channel.send(embed=embed, view=panel)
+            note = f" Missing roles skipped: {', '.join(missing)}." if missing else ""
+            await interaction.followup.send(f"Color role message created successfully!{note}", ephemeral=True)
+            return
+
+        # send the embed in the channel (not ephemeral)
+        message = await interaction.channel.send(embed=embed)
+        await self.registry.add_panel(
+            interaction.guild.id,
+            message.channel.id,
+            message.id,
+            {emoji: role.id for emoji, role in roles.items() if role is not None},
+        )
+
+        # add reactions
+        for emoji, role in roles.items():
+            if role is not None:
+                await message.add_reaction(emoji)
+
+        note = f" Missing roles skipped: {', '.join(missing)}." if missing else ""
+        await interaction.followup.send(f"Color role message created successfully!{note}", ephemeral=True)
+
+    @reactionrole.command(name="bind", description="Give a role to users who react to a message with an emoji")
+    @app_commands.describe(channel="Channel of the message (defaults to this one)")
+    async def bind(self, interaction: discord.Interaction, message_id: str, emoji: str, role: discord.Role,
+                   channel: discord.TextChannel = None):
+        channel = channel or interaction.channel
+        message_id = parse_message_id(message_id)
+        if message_id is None:
+            await interaction.response.send_message("That is not a message ID.", ephemeral=True)
+            return
+        if role >= interaction.guild.me.top_role:
+            await interaction.response.send_message(f"{role.mention} is above my highest role, so I can't assign it.", ephemeral=True)
+            return
+        partial = discord.PartialEmoji.from_str(emoji.strip())
+        await self.registry.bind(interaction.guild.id, channel.id, message_id, partial, role.id)
+        try:
+            await channel.get_partial_message(message_id).add_reaction(partial)
+        except discord.HTTPException:
+            # e.g. an emoji from another server; users can still add the reaction themselves
+            pass
+        await interaction.response.send_message(f"Reacting with {emoji} on that message now gives {role.mention}.", ephemeral=True)
+
+    @reactionrole.command(name="unbind", description="Stop an emoji on a message from giving a role")
+    async def unbind(self, interaction: discord.Interaction, message_id: str, emoji: str):
+        message_id = parse_message_id(message_id)
+        if message_id is None or not await self.registry.unbind(message_id, discord.PartialEmoji.from_str(emoji.strip())):
+            await interaction.response.send_message("No such reaction role.", ephemeral=True)
+            return
+        await interaction.response.send_message("Reaction role removed.", ephemeral=True)
+
+    @reactionrole.command(name="list", description="List the reaction role panels in this server")
+    async def list_panels(self, interaction: discord.Interaction):
+        panels = self.registry.guild_panels(interaction.guild.id)
+        if not panels:
+            await interaction.response.send_message("No reaction role panels in this server.", ephemeral=True)
+            return
+        lines = []
+        for message_id, panel in panels.items():
+            # custom emoji are stored by ID; Discord renders <:name:id> with any name
+            bindings = ", ".join(
+                f"{f'<:e:{key}>' if key.isdigit() else key} → <@&{role_id}>" for key, role_id in panel["roles"].items()
+            )
+            lines.append(f"https://discord.com/channels/{panel['guild_id']}/{panel['channel_id']}/{message_id}: {bindings}")
+        await interaction.response.send_message("\n".join(lines)[:2000], ephemeral=True)
+
+    # ---------------- REACTIONS ---------------- #
+    # Raw events fire whether or not the panel message is in the message
+    # cache, so panels keep working after a restart without any fetches.
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        self.queue_change(payload, add=True)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        self.queue_change(payload, add=False)
+
+    def queue_change(self, payload, add):
+        if payload.guild_id is None or payload.user_id == self.bot.user.id:
+            return
+        if payload.member is not None and payload.member.bot:  # only set on adds
+            return
+        role_id = self.registry.role_for(payload.message_id, payload.emoji)
+        if role_id is not None:
+            self.role_edits.queue(payload.guild_id, payload.user_id, role_id, add)
+
+    async def role_button(self, interaction: discord.Interaction, role_id: str):
+        """Toggle the button's role for whoever clicked it, through the same batcher as reactions"""
+        role = self.bot.role_index.get(interaction.guild, int(role_id)) if interaction.guild else None
+        if role is None:
+            await interaction.response.send_message("That role no longer exists.", ephemeral=True)
+            return
+        # a click still inside the debounce window toggles the queued change, not the current roles
+        queued = self.role_edits.pending(interaction.guild.id, interaction.user.id, role.id)
+        add = not queued if queued is not None else interaction.user.get_role(role.id) is None
+        self.role_edits.queue(interaction.guild.id, interaction.user.id, role.id, add)
+        await interaction.response.send_message(f"{'Added' if add else 'Removed'} {role.mention}.", ephemeral=True)
+
+    async def apply_role_changes(self, guild_id, user_id, changes):
+        """Set a member's roles once for all reaction changes in the debounce window"""
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+        member = guild.get_member(user_id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                return
+        if member.bot:
+            return
+        changes = {role_id: add for role_id, add in changes.items() if self.bot.role_index.get(guild, role_id) is not None}
+        if not changes:
+            return
+
+        async def edit():
+            # the edit may wait behind moderation traffic, so the roles are read when it runs,
+            # not when it was queued; otherwise it would undo changes made meanwhile
+            cached = guild.get_member(user_id)
+            if cached is None:
+                # no member cache (minimal profile): change only these roles, one request each
+                for role_id, add in changes.items():
+                    role = discord.Object(id=role_id)
+                    await (member.add_roles(role, reason="Reaction roles") if add else
+                           member.remove_roles(role, reason="Reaction roles"))
+                return
+            current = {role.id for role in cached.roles if not role.is_default()}
+            wanted = {role_id for role_id in current if changes.get(role_id, True)}
+            wanted.update(role_id for role_id, add in changes.items() if add)
+            if wanted != current:
+                await cached.edit(roles=[discord.Object(id=role_id) for role_id in wanted], reason="Reaction roles")
+
+        await self.bot.outbound.submit(
+            edit,
+            priority=PRIORITY_REPLY,
+            bucket=("guild", guild_id),
+            label="reaction roles",
+        )
+
+    # ---------------- CLEANUP ---------------- #
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if self.registry.is_panel(payload.message_id):
+            await self.registry.remove_panel(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        await self.registry.remove_role(role.id)
+
+
+async def setup(bot):
+    await bot.add_cog(ReactionRoles(bot), guild=bot.guild_object)
@@ -0,0 +1,112 @@
+"""
+Component dispatcher for the Discord bot
+Buttons and select menus carry their handler's route and arguments in their
+custom_id ("c:route:arg:arg"), so one handler per route serves every panel
+ever posted, across restarts, without a View object per message
+"""
+import logging
+
+import discord
+
+from metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+PREFIX = "c"
+CUSTOM_ID_LIMIT = 100  # Discord's limit
+
+INTERACTIONS = REGISTRY.counter("component_interactions_total", "Button and select interactions, by route and outcome",
+                                ("route", "outcome"))
+
+
+def custom_id(route, *args):
+    """The custom_id routing a component to route's handler with args (strings, without ':')"""
+    parts = [PREFIX, route, *map(str, args)]
+    if any(":" in part for part in parts[1:]):
+        raise ValueError("component routes and arguments can't contain ':'")
+    value = ":".join(parts)
+    if len(value) > CUSTOM_ID_LIMIT:
+        raise ValueError(f"custom_id longer than {CUSTOM_ID_LIMIT} characters: {value!r}")
+    return value
+
+
+def button(route, *args, **kwargs):
+    """A button that calls route's handler; kwargs go to discord.ui.Button (label, style, emoji...)"""
+    return discord.ui.Button(custom_id=custom_id(route, *args), **kwargs)
+
+
+def select(route, *args, **kwargs):
+    """A select menu that calls route's handler; the picked values are in interaction.data["values"]"""
+    return discord.ui.Select(custom_id=custom_id(route, *args), **kwargs)
+
+
+def view(*items):
+    """A view to send with a message, holding routed components
+
+    The view is stopped before it is sent, so discord.py only renders it
+    and never stores it; clicks are routed by RoutedComponent instead.
+    """
+    panel = discord.ui.View(timeout=None)
+    for item in items:
+        panel.add_item(item)
+    panel.stop()
+    return panel
+
+
+class ComponentRouter:
+    """Handlers for routed components, by route
+
+    A handler is awaited as handler(interaction, *args) with the arguments
+    from the custom_id and must respond to the interaction. Features
+    register their routes when they load and unregister them on unload;
+    clicks on a route nobody handles get an ephemeral notice.
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+    def register(self, route, handler):
+        if ":" in route:
+            raise ValueError("component routes can't contain ':'")
+        self.routes[route] = handler
+
+    def unregister(self, *routes):
+        for route in routes:
+            self.routes.pop(route, None)
+
+    async def dispatch(self, interaction, route, args):
+        handler = self.routes.get(route)
+        if handler is None:
+            INTERACTIONS.inc(route, "unrouted")
+            await interaction.response.send_message("This control is no longer active.", ephemeral=True)
+            return
+        try:
+            await handler(interaction, *args)
+        except Exception:
+            INTERACTIONS.inc(route, "error")
+            log.exception("Component handler for %r failed", route)
+            if not interaction.response.is_done():
+                await interaction.response.send_message("Something went wrong.", ephemeral=True)
+            return
+        INTERACTIONS.inc(route, "ok")
+
+
+class RoutedComponent(discord.ui.DynamicItem[discord.ui.Button], template=PREFIX + r":(?P<route>[^:]+)(?P<args>(?::[^:]*)*)"):
+    """Matches every routed custom_id; registered once with bot.add_dynamic_items()
+
+    discord.py builds one of these per click from the custom_id and drops
+    it afterwards, so nothing is kept per posted message.
+    """
+
+    def __init__(self, item, route, args):
+        super().__init__(item)
+        self.route = route
+        self.args = args
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        args = match["args"].split(":")[1:] if match["args"] else []
+        return cls(item, match["route"], args)
+
+    async def callback(self, interaction):
+        await interaction.client.components.dispatch(interaction, self.route, self.args)
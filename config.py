@@ -3,33 +3,186 @@ Configuration module for Discord Bot
 Centralizes all environment variable loading and configuration
 """
 import os
-from dotenv import load_dotenv
+from types import SimpleNamespace
+
+from dotenv import dotenv_values, find_dotenv, load_dotenv
+
+# the real environment wins over .env, at startup and on every reload
+_PROCESS_ENV = dict(os.environ)
+ENV_FILE = find_dotenv() or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
 
 # Load environment variables from .env file
-load_dotenv()
+load_dotenv(ENV_FILE)
+
+
+# what the client keeps in memory, by CACHE_PROFILE; main.py turns these into discord.py options
+CACHE_PROFILES = {
+    # every member chunked at startup and cached, default intents, 1000 cached messages
+    "full": {"member_cache": "all", "chunk_at_startup": True, "max_messages": 1000, "default_intents": True},
+    # members cached as they join or are fetched, guilds chunked on first need, only the intents features use
+    "balanced": {"member_cache": "joined", "chunk_at_startup": False, "max_messages": 100, "default_intents": False},
+    # no member or message cache; members are fetched whenever a command needs them
+    "minimal": {"member_cache": "none", "chunk_at_startup": False, "max_messages": 0, "default_intents": False},
+}
+
+
+def read_settings(env):
+    """Every setting, by BotConfig attribute name, from a mapping like os.environ"""
+    getenv = env.get
 
-class BotConfig:
-    """Central configuration class for the Discord bot"""
-    
     # Discord Bot Settings
-    BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
-    GUILD_ID = int(os.getenv("DISCORD_GUILD_ID", "0"))
-    
+    BOT_TOKEN = getenv("DISCORD_BOT_TOKEN")
+    GUILD_ID = int(getenv("DISCORD_GUILD_ID", "0"))
+
     # Moderation Settings
-    MOD_LOG_CHANNEL_ID = os.getenv("MOD_LOG_CHANNEL_ID")
-    BANNED_WORDS = {w.lower() for w in os.getenv("BANNED_WORDS", "").split(",") if w.strip()}
-    
+    MOD_LOG_CHANNEL_ID = getenv("MOD_LOG_CHANNEL_ID")
+    MOD_LOG_FLUSH_INTERVAL = float(getenv("MOD_LOG_FLUSH_INTERVAL", "5.0"))  # seconds between log posts
+    MOD_LOG_BATCH_SIZE = int(getenv("MOD_LOG_BATCH_SIZE", "25"))  # entries that trigger an early post
+    MOD_LOG_AUDIT_FILE = getenv("MOD_LOG_AUDIT_FILE", "modlog.jsonl")  # empty = no audit file
+    BANNED_WORDS = {w.strip().lower() for w in getenv("BANNED_WORDS", "").split(",") if w.strip()}
+    BANNED_WORD_MODE = getenv("BANNED_WORD_MODE", "substring").lower()  # substring | word
+    BANNED_WORD_NORMALIZE = getenv("BANNED_WORD_NORMALIZE", "true").lower() in ("1", "true", "yes", "on")
+
     # Spam Detection Settings
-    SPAM_TIME_WINDOW = int(os.getenv("SPAM_TIME_WINDOW", "7"))  # seconds
-    SPAM_MESSAGE_LIMIT = int(os.getenv("SPAM_MESSAGE_LIMIT", "5"))  # messages
-    
+    SPAM_TIME_WINDOW = int(getenv("SPAM_TIME_WINDOW", "7"))  # seconds
+    SPAM_MESSAGE_LIMIT = int(getenv("SPAM_MESSAGE_LIMIT", "5"))  # messages
+
+    # Remote Profanity Classifier (API Ninjas)
+    PROFANITY_API_ENABLED = getenv("PROFANITY_API_ENABLED", "false").lower() in ("1", "true", "yes", "on")
+    PROFANITY_API_KEY = getenv("PROFANITY_API_KEY")
+    PROFANITY_API_URL = getenv("PROFANITY_API_URL", "https://api.api-ninjas.com/v1/profanityfilter")
+    PROFANITY_API_CONCURRENCY = int(getenv("PROFANITY_API_CONCURRENCY", "8"))  # requests in flight
+    PROFANITY_API_TIMEOUT = float(getenv("PROFANITY_API_TIMEOUT", "3"))  # seconds
+    PROFANITY_CACHE_SIZE = int(getenv("PROFANITY_CACHE_SIZE", "10000"))  # cached verdicts
+    PROFANITY_CACHE_TTL = int(getenv("PROFANITY_CACHE_TTL", "3600"))  # seconds
+
+    # Duplicate Message Detection Settings
+    DUPLICATE_DETECTION = getenv("DUPLICATE_DETECTION", "true").lower() in ("1", "true", "yes", "on")
+    DUPLICATE_WINDOW = int(getenv("DUPLICATE_WINDOW", "60"))  # seconds
+    DUPLICATE_THRESHOLD = int(getenv("DUPLICATE_THRESHOLD", "5"))  # copies before deleting
+    DUPLICATE_MAX_DISTANCE = int(getenv("DUPLICATE_MAX_DISTANCE", "3"))  # differing fingerprint bits
+    DUPLICATE_MIN_LENGTH = int(getenv("DUPLICATE_MIN_LENGTH", "20"))  # shorter messages are ignored
+
+    # Raid Detection Settings
+    RAID_DETECTION = getenv("RAID_DETECTION", "true").lower() in ("1", "true", "yes", "on")
+    RAID_WINDOW = int(getenv("RAID_WINDOW", "30"))  # seconds
+    RAID_CHANNEL_MESSAGES = int(getenv("RAID_CHANNEL_MESSAGES", "60"))  # messages in one channel
+    RAID_DUPLICATE_MESSAGES = int(getenv("RAID_DUPLICATE_MESSAGES", "8"))  # copies of one message
+    RAID_MIN_AUTHORS = int(getenv("RAID_MIN_AUTHORS", "5"))  # distinct authors involved
+    RAID_FRESH_AUTHORS = int(getenv("RAID_FRESH_AUTHORS", "10"))  # distinct new accounts posting
+    RAID_FRESH_ACCOUNT_DAYS = int(getenv("RAID_FRESH_ACCOUNT_DAYS", "7"))
+    RAID_COOLDOWN = int(getenv("RAID_COOLDOWN", "60"))  # quiet seconds before a raid ends
+
     # Strike System Settings
-    STRIKES_TO_BAN = int(os.getenv("STRIKES_TO_BAN", "3"))
+    STRIKES_TO_BAN = int(getenv("STRIKES_TO_BAN", "3"))
     STRIKE_FILE = "strikes.json"
-    
+    STRIKE_FLUSH_INTERVAL = float(getenv("STRIKE_FLUSH_INTERVAL", "1.0"))  # seconds
+    STRIKE_BACKEND = getenv("STRIKE_BACKEND", "json").lower()  # json | sqlite
+    STRIKE_DB_FILE = getenv("STRIKE_DB_FILE", "moderation.db")
+    STRIKE_EXPIRY_DAYS = float(getenv("STRIKE_EXPIRY_DAYS", "0"))  # 0 = strikes never expire
+    STRIKE_RETENTION_DAYS = float(getenv("STRIKE_RETENTION_DAYS", "0"))  # 0 = keep history forever
+    STRIKE_CACHE_SIZE = int(getenv("STRIKE_CACHE_SIZE", "10000"))  # users kept in memory
+
+    # Message Pipeline Settings
+    ACTION_WORKERS = int(getenv("ACTION_WORKERS", "4"))  # concurrent moderation actions
+
+    # Outbound API Scheduler Settings
+    OUTBOUND_WORKERS = int(getenv("OUTBOUND_WORKERS", "8"))  # concurrent Discord API calls
+    OUTBOUND_BUCKET_CONCURRENCY = int(getenv("OUTBOUND_BUCKET_CONCURRENCY", "2"))  # per channel / guild
+    OUTBOUND_BULK_WINDOW = float(getenv("OUTBOUND_BULK_WINDOW", "0.25"))  # seconds to gather deletes and bans
+    OUTBOUND_MAX_REPLIES = int(getenv("OUTBOUND_MAX_REPLIES", "500"))  # queued replies before new ones are dropped
+
+    # History Scan (!scan)
+    SCAN_CONCURRENCY = int(getenv("SCAN_CONCURRENCY", "2"))  # channels read at once per scan
+
+    # Reaction Roles
+    REACTION_ROLES_FILE = getenv("REACTION_ROLES_FILE", "reaction_roles.json")
+    REACTION_ROLE_DEBOUNCE = float(getenv("REACTION_ROLE_DEBOUNCE", "1.0"))  # seconds to gather a member's changes
+
+    # Logging and Metrics
+    LOG_LEVEL = getenv("LOG_LEVEL", "INFO").upper()
+    LOG_MESSAGE_SAMPLE_RATE = float(getenv("LOG_MESSAGE_SAMPLE_RATE", "0"))  # fraction of messages logged (0 = none)
+    LOG_MESSAGE_CONTENT = getenv("LOG_MESSAGE_CONTENT", "false").lower() in ("1", "true", "yes", "on")
+    METRICS_HOST = getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(getenv("METRICS_PORT", "0"))  # 0 = no /metrics endpoint
+    METRICS_SNAPSHOT_FILE = getenv("METRICS_SNAPSHOT_FILE", "")  # empty = no snapshot file
+    METRICS_SNAPSHOT_INTERVAL = float(getenv("METRICS_SNAPSHOT_INTERVAL", "15"))
+
     # Command Prefix
-    COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "!")
-    
+    COMMAND_PREFIX = getenv("COMMAND_PREFIX", "!")
+
+    # Features loaded as extensions from cogs/ (moderation, reaction_roles, demo)
+    ENABLED_EXTENSIONS = [e.strip().lower() for e in getenv("ENABLED_EXTENSIONS", "moderation,reaction_roles,demo").split(",") if e.strip()]
+
+    # Per-Guild Settings and Slash Commands
+    GUILD_SETTINGS_FILE = getenv("GUILD_SETTINGS_FILE", "guild_settings.db")
+    SLASH_COMMAND_SCOPE = getenv("SLASH_COMMAND_SCOPE", "guild").lower()  # guild (DISCORD_GUILD_ID only) | global
+
+    # Client Cache Profile
+    CACHE_PROFILE = getenv("CACHE_PROFILE", "full").lower()  # full | balanced | minimal
+    MESSAGE_CACHE_SIZE = int(getenv("MESSAGE_CACHE_SIZE") or -1)  # cached messages, -1 = the profile's
+
+    # Sharding and Clusters (launcher.py)
+    SHARD_COUNT = int(getenv("SHARD_COUNT", "0"))  # 0 = Discord's recommendation
+    SHARD_IDS = [int(s) for s in getenv("SHARD_IDS", "").split(",") if s.strip()]  # this process's shards, empty = all
+    CLUSTER_COUNT = int(getenv("CLUSTER_COUNT", "0"))  # processes launcher.py runs, 0 = one per CPU core
+    CLUSTER_ID = int(getenv("CLUSTER_ID", "0"))  # set by launcher.py for each process
+
+    # Live Configuration Reload
+    CONFIG_WATCH_INTERVAL = float(getenv("CONFIG_WATCH_INTERVAL", "0"))  # seconds between .env checks (0 = off)
+    return {name: value for name, value in locals().items() if name.isupper()}
+
+
+class BotConfig:
+    """Central configuration class for the Discord bot
+
+    The settings are class attributes, filled from read_settings() at import.
+    reload() re-reads them and applies the ones that can change while running.
+    """
+
+    # only read when the bot or a feature starts; reload() reports changes to these instead of applying them
+    RESTART_REQUIRED = frozenset({
+        "BOT_TOKEN", "GUILD_ID", "ENABLED_EXTENSIONS", "ACTION_WORKERS", "REACTION_ROLES_FILE",
+        "STRIKE_FILE", "STRIKE_FLUSH_INTERVAL", "STRIKE_BACKEND", "STRIKE_DB_FILE", "STRIKE_EXPIRY_DAYS",
+        "STRIKE_RETENTION_DAYS", "STRIKE_CACHE_SIZE", "PROFANITY_API_ENABLED", "PROFANITY_API_KEY",
+        "PROFANITY_API_URL", "PROFANITY_API_CONCURRENCY", "PROFANITY_API_TIMEOUT", "PROFANITY_CACHE_SIZE",
+        "PROFANITY_CACHE_TTL", "METRICS_HOST", "METRICS_PORT", "METRICS_SNAPSHOT_FILE",
+        "METRICS_SNAPSHOT_INTERVAL", "CONFIG_WATCH_INTERVAL", "GUILD_SETTINGS_FILE", "SLASH_COMMAND_SCOPE",
+        "CACHE_PROFILE", "MESSAGE_CACHE_SIZE", "SHARD_COUNT", "SHARD_IDS", "CLUSTER_COUNT", "CLUSTER_ID",
+    })
+
+    @classmethod
+    def apply(cls, settings):
+        for name, value in settings.items():
+            setattr(cls, name, value)
+
+    @classmethod
+    def snapshot(cls):
+        """A copy of the current settings, for state that must stay consistent with the values it was built from"""
+        return SimpleNamespace(**{name: value for name, value in vars(cls).items() if name.isupper()})
+
+    @classmethod
+    def reload(cls):
+        """Re-read .env and the environment, validate, and apply what can change live
+
+        Raises ValueError (current settings untouched) if the new values are
+        invalid. Returns (applied, pending): names of changed settings that
+        took effect, and of changed ones that need a restart.
+        """
+        env = {k: v for k, v in dotenv_values(ENV_FILE).items() if v is not None}
+        env.update(_PROCESS_ENV)
+        try:
+            settings = read_settings(env)
+        except ValueError as e:
+            raise ValueError(f"Invalid setting: {e}") from None
+        # validated as a whole, as a throwaway subclass, before anything is applied
+        type("Candidate", (cls,), settings).validate()
+        changed = {name for name, value in settings.items() if getattr(cls, name) != value}
+        pending = changed & cls.RESTART_REQUIRED
+        applied = changed - pending
+        cls.apply({name: settings[name] for name in applied})
+        return sorted(applied), sorted(pending)
+
     @classmethod
     def validate(cls):
         """Validate that required configuration is present"""
@@ -37,9 +190,50 @@ class BotConfig:
             raise ValueError(
                 "Bot token not found. Please set DISCORD_BOT_TOKEN in your .env file."
             )
-        if not cls.GUILD_ID or cls.GUILD_ID == 0:
+        if cls.SLASH_COMMAND_SCOPE not in ("guild", "global"):
+            raise ValueError(
+                "SLASH_COMMAND_SCOPE must be either 'guild' or 'global'."
+            )
+        if cls.SLASH_COMMAND_SCOPE == "guild" and not cls.GUILD_ID:
+            raise ValueError(
+                "Guild ID not found or invalid. Please set DISCORD_GUILD_ID in your .env file, or use SLASH_COMMAND_SCOPE=global."
+            )
+        if cls.PROFANITY_API_ENABLED and not cls.PROFANITY_API_KEY:
+            raise ValueError(
+                "PROFANITY_API_ENABLED is set but PROFANITY_API_KEY is missing."
+            )
+        if cls.STRIKE_BACKEND not in ("json", "sqlite"):
             raise ValueError(
-                "Guild ID not found or invalid. Please set DISCORD_GUILD_ID in your .env file."
+                "STRIKE_BACKEND must be either 'json' or 'sqlite'."
+            )
+        if cls.BANNED_WORD_MODE not in ("substring", "word"):
+            raise ValueError(
+                "BANNED_WORD_MODE must be either 'substring' or 'word'."
+            )
+        if cls.LOG_LEVEL not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+            raise ValueError(
+                "LOG_LEVEL must be one of DEBUG, INFO, WARNING, ERROR or CRITICAL."
+            )
+        if cls.SHARD_IDS and not cls.SHARD_COUNT:
+            raise ValueError(
+                "SHARD_IDS needs SHARD_COUNT, the total number of shards across every process."
+            )
+        if any(not 0 <= shard_id < cls.SHARD_COUNT for shard_id in cls.SHARD_IDS):
+            raise ValueError(
+                f"SHARD_IDS must be between 0 and SHARD_COUNT - 1 ({cls.SHARD_COUNT - 1})."
+            )
+        if cls.SHARD_IDS and cls.STRIKE_BACKEND != "sqlite":
+            raise ValueError(
+                "Running a subset of shards (SHARD_IDS) needs STRIKE_BACKEND=sqlite, which processes can share."
+            )
+        if cls.CACHE_PROFILE not in CACHE_PROFILES:
+            raise ValueError(
+                f"CACHE_PROFILE must be one of {', '.join(CACHE_PROFILES)}."
+            )
+        unknown = set(cls.ENABLED_EXTENSIONS) - {"moderation", "reaction_roles", "demo"}
+        if unknown:
+            raise ValueError(
+                f"Unknown ENABLED_EXTENSIONS: {', '.join(sorted(unknown))}. Choose from moderation, reaction_roles, demo."
             )
         return True
     
@@ -48,10 +242,30 @@ class BotConfig:
         """Get a summary of current configuration (without sensitive data)"""
         return {
             "Guild ID": cls.GUILD_ID,
+            "Shards": (f"{','.join(map(str, cls.SHARD_IDS))} of {cls.SHARD_COUNT} (cluster {cls.CLUSTER_ID})" if cls.SHARD_IDS
+                       else f"All ({cls.SHARD_COUNT or 'auto'})"),
+            "Cache Profile": cls.CACHE_PROFILE,
+            "Slash Commands": "Global" if cls.SLASH_COMMAND_SCOPE == "global" else f"Guild {cls.GUILD_ID}",
             "Spam Time Window": f"{cls.SPAM_TIME_WINDOW}s",
             "Spam Message Limit": cls.SPAM_MESSAGE_LIMIT,
+            "Profanity API": "Enabled" if cls.PROFANITY_API_ENABLED else "Disabled",
+            "Duplicate Detection": f"{cls.DUPLICATE_THRESHOLD} copies in {cls.DUPLICATE_WINDOW}s" if cls.DUPLICATE_DETECTION else "Disabled",
+            "Raid Detection": "Enabled" if cls.RAID_DETECTION else "Disabled",
             "Strikes to Ban": cls.STRIKES_TO_BAN,
+            "Strike Backend": cls.STRIKE_BACKEND,
+            "Strike Expiry": f"{cls.STRIKE_EXPIRY_DAYS}d" if cls.STRIKE_EXPIRY_DAYS else "Never",
             "Command Prefix": cls.COMMAND_PREFIX,
+            "Log Level": cls.LOG_LEVEL,
+            "Metrics": ", ".join(filter(None, [
+                f"http://{cls.METRICS_HOST}:{cls.METRICS_PORT}/metrics" if cls.METRICS_PORT else "",
+                cls.METRICS_SNAPSHOT_FILE,
+            ])) or "Disabled",
+            "Extensions": ", ".join(cls.ENABLED_EXTENSIONS) or "None",
             "Banned Words Count": len(cls.BANNED_WORDS),
+            "Banned Word Mode": cls.BANNED_WORD_MODE,
+            "Obfuscation Folding": "Enabled" if cls.BANNED_WORD_NORMALIZE else "Disabled",
             "Mod Log Channel": "Configured" if cls.MOD_LOG_CHANNEL_ID else "Not Set"
         }
+
+
+BotConfig.apply(read_settings(os.environ))
@@ -0,0 +1,140 @@
+"""
+Near-duplicate message detection for the Discord bot
+SimHash fingerprints kept in a time-windowed, banded index shared by all users
+"""
+import time
+from collections import deque, namedtuple
+
+from normalize import fold
+
+FINGERPRINT_BITS = 64
+_MASK = (1 << FINGERPRINT_BITS) - 1
+_LANE = 16  # bits per counter lane when summing shingle hashes
+
+# _SPREAD[b] places bit i of byte b at the bottom of lane i, so summing
+# spread hashes counts set bits per position with C-level integer adds
+_SPREAD = [sum(((b >> i) & 1) << (_LANE * i) for i in range(8)) for b in range(256)]
+
+DuplicateHit = namedtuple("DuplicateHit", ["count", "authors", "channels"])
+
+
+def simhash(text, shingle=5, max_length=600, folded=None):
+    """64-bit SimHash over character shingles of the normalized text
+
+    Messages that differ by a few characters get fingerprints a few bits
+    apart; unrelated messages differ in about half of their bits. folded
+    may pass fold(text) when the caller already has it.
+    """
+    folded = fold(text[:max_length]) if folded is None else folded[:max_length]
+    # punctuation and emoji are the cheapest way to vary a copy-pasted
+    # message, so only letters and digits take part in the fingerprint
+    text = " ".join("".join(ch if ch.isalnum() else " " for ch in folded).split())
+    if not text:
+        return 0
+    if len(text) <= shingle:
+        shingles = [text]
+    else:
+        shingles = [text[i:i + shingle] for i in range(len(text) - shingle + 1)]
+
+    # one accumulator per byte of the hash, each counting its 8 bit positions
+    acc = [0] * 8
+    spread = _SPREAD
+    for s in shingles:
+        b0, b1, b2, b3, b4, b5, b6, b7 = (hash(s) & _MASK).to_bytes(8, "little")
+        acc[0] += spread[b0]
+        acc[1] += spread[b1]
+        acc[2] += spread[b2]
+        acc[3] += spread[b3]
+        acc[4] += spread[b4]
+        acc[5] += spread[b5]
+        acc[6] += spread[b6]
+        acc[7] += spread[b7]
+
+    half = len(shingles) / 2
+    lane_mask = (1 << _LANE) - 1
+    fingerprint = 0
+    for byte_index, total in enumerate(acc):
+        for i in range(8):
+            if ((total >> (_LANE * i)) & lane_mask) > half:
+                fingerprint |= 1 << (8 * byte_index + i)
+    return fingerprint
+
+
+class DuplicateIndex:
+    """Recent fingerprints, indexed so near-identical ones are found in O(1)
+
+    Each fingerprint is split into max_distance + 1 bands; two fingerprints
+    within max_distance bits must agree exactly on at least one band, so only
+    the entries sharing a band bucket need a Hamming comparison. Entries
+    older than `window` seconds are expired in arrival order, and each
+    bucket is capped at max_bucket entries so a flood can't make lookups
+    expensive.
+    """
+
+    def __init__(self, window=60, threshold=5, max_distance=3, max_bucket=256):
+        self.window = float(window)
+        self.threshold = threshold
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // self.bands
+        self.max_bucket = max_bucket
+        self._buckets = {}  # (scope, band, value) -> deque of entries
+        self._timeline = deque()  # entries in arrival order, for expiry
+
+    def __len__(self):
+        return len(self._timeline)
+
+    def _band_keys(self, scope, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(scope, band, (fingerprint >> (band * self.band_bits)) & mask) for band in range(self.bands)]
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        timeline = self._timeline
+        while timeline and timeline[0][0] < cutoff:
+            _, _, _, _, keys = timeline.popleft()
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                while bucket and bucket[0][0] < cutoff:
+                    bucket.popleft()
+                if not bucket:
+                    del self._buckets[key]
+
+    def check(self, fingerprint, author_id, channel_id, scope=None, now=None):
+        """Add a message and return a DuplicateHit if it is part of a flood, else None
+
+        The count includes this message. `scope` (e.g. a guild ID) keeps
+        unrelated communities from matching each other.
+        """
+        now = time.time() if now is None else now
+        self._expire(now)
+        keys = self._band_keys(scope, fingerprint)
+
+        # an entry sharing several bands with us is still one message
+        seen = set()
+        count = 1
+        authors = {author_id}
+        channels = {channel_id}
+        for key in keys:
+            for entry in self._buckets.get(key, ()):
+                if id(entry) in seen:
+                    continue
+                seen.add(id(entry))
+                if bin(entry[1] ^ fingerprint).count("1") <= self.max_distance:
+                    count += 1
+                    authors.add(entry[2])
+                    channels.add(entry[3])
+
+        entry = (now, fingerprint, author_id, channel_id, keys)
+        self._timeline.append(entry)
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = deque(maxlen=self.max_bucket)
+            bucket.append(entry)
+
+        if count >= self.threshold:
+            return DuplicateHit(count, len(authors), len(channels))
+        return None
@@ -0,0 +1,217 @@
+"""
+Per-guild settings for the Discord bot
+Overrides of the global configuration (banned words, spam limits, strikes,
+mod log channel) stored per guild in SQLite and cached in memory, loaded
+the first time a guild needs them
+"""
+import asyncio
+import logging
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+from persistence import transaction
+
+log = logging.getLogger(__name__)
+
+NO_OVERRIDES = MappingProxyType({})
+
+
+# ---------------- SETTINGS ---------------- #
+def _words(text):
+    words = {w.strip().lower() for w in text.split(",") if w.strip()}
+    if not words:
+        raise ValueError("give a comma separated list of words")
+    return words
+
+
+def _choice(*options):
+    def parse(text):
+        text = text.strip().lower()
+        if text not in options:
+            raise ValueError(f"must be one of {', '.join(options)}")
+        return text
+    return parse
+
+
+def _flag(text):
+    text = text.strip().lower()
+    if text in ("1", "true", "yes", "on"):
+        return True
+    if text in ("0", "false", "no", "off"):
+        return False
+    raise ValueError("must be on or off")
+
+
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise ValueError("must be at least 1")
+    return value
+
+
+def _channel(text):
+    match = re.fullmatch(r"<#(\d+)>|(\d+)", text.strip())
+    if not match:
+        raise ValueError("must be a channel mention or ID")
+    return int(match.group(1) or match.group(2))
+
+
+# key -> (parser, description); keys are the lowercased BotConfig names they override
+SETTINGS = {
+    "banned_words": (_words, "comma separated banned words (replaces the global list)"),
+    "banned_word_mode": (_choice("substring", "word"), "substring or word"),
+    "banned_word_normalize": (_flag, "fold leetspeak and look-alike letters (on/off)"),
+    "spam_message_limit": (_positive_int, "messages within the spam window that count as spam"),
+    "spam_time_window": (_positive_int, "spam window in seconds"),
+    "strikes_to_ban": (_positive_int, "strikes before an automatic ban"),
+    "mod_log_channel_id": (_channel, "channel for this server's mod log"),
+}
+
+
+def parse_setting(key, text):
+    """Parse a raw value for key; raises KeyError for unknown keys, ValueError for bad values"""
+    parser, _ = SETTINGS[key]
+    try:
+        return parser(text)
+    except ValueError as e:
+        raise ValueError(f"{key}: {e}") from None
+
+
+def format_setting(value):
+    if isinstance(value, (set, frozenset)):
+        return ",".join(sorted(value))
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    return str(value)
+
+
+# ---------------- STORE ---------------- #
+class GuildSettingsStore:
+    """Guild overrides in SQLite, cached per guild on first use
+
+    start() only reads which guilds have any overrides, so a guild without
+    them never costs a query and cached() answers for it immediately. A
+    configured guild's rows are read (off the event loop) the first time
+    overrides() is awaited for it and are then served from memory. The
+    database is only touched from one worker thread.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (guild_id, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._configured = set()  # guilds with at least one override
+        self._cache = {}  # guild_id -> {key: parsed value}
+        self._loading = {}  # guild_id -> task
+        self._executor = None
+        self._conn = None
+
+    # ---------------- LIFECYCLE ---------------- #
+    async def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="guild-settings-db")
+            await self._run(self._open)
+            rows = await self._run(self._query, "SELECT DISTINCT guild_id FROM guild_settings")
+            self._configured = {guild_id for guild_id, in rows}
+
+    async def close(self):
+        if self._executor is not None:
+            await self._run(self._conn.close)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._conn = None
+        self._cache.clear()
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _query(self, sql, *params):
+        return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, *params):
+        with transaction(self._conn):
+            self._conn.execute(sql, params)
+
+    # ---------------- READS ---------------- #
+    def cached(self, guild_id):
+        """The guild's overrides if known without a query, else None"""
+        if guild_id not in self._configured:
+            return NO_OVERRIDES
+        return self._cache.get(guild_id)
+
+    async def overrides(self, guild_id):
+        """The guild's overrides ({key: value}, read-only), loading them on first use"""
+        found = self.cached(guild_id)
+        if found is not None:
+            return found
+        task = self._loading.get(guild_id)
+        if task is None:
+            task = self._loading[guild_id] = asyncio.create_task(self._load(guild_id))
+            task.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, guild_id):
+        rows = await self._run(self._query, "SELECT key, value FROM guild_settings WHERE guild_id = ?", guild_id)
+        values = {}
+        for key, raw in rows:
+            try:
+                values[key] = parse_setting(key, raw)
+            except (KeyError, ValueError) as e:
+                log.warning("Ignoring stored setting %s for guild %s: %s", key, guild_id, e)
+        self._cache[guild_id] = values = MappingProxyType(values)
+        return values
+
+    # ---------------- WRITES ---------------- #
+    async def set(self, guild_id, key, text):
+        """Validate and store an override; returns the parsed value"""
+        value = parse_setting(key, text)
+        current = dict(await self.overrides(guild_id))
+        await self._run(self._write, "INSERT OR REPLACE INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?)",
+                        guild_id, key, format_setting(value))
+        current[key] = value
+        self._configured.add(guild_id)
+        self._cache[guild_id] = MappingProxyType(current)
+        return value
+
+    async def reset(self, guild_id, key=None):
+        """Drop one override, or all of them; returns whether anything was removed"""
+        current = dict(await self.overrides(guild_id))
+        if key is None:
+            removed = bool(current)
+            current.clear()
+            await self._run(self._write, "DELETE FROM guild_settings WHERE guild_id = ?", guild_id)
+        else:
+            removed = current.pop(key, None) is not None
+            await self._run(self._write, "DELETE FROM guild_settings WHERE guild_id = ? AND key = ?", guild_id, key)
+        if current:
+            self._cache[guild_id] = MappingProxyType(current)
+        else:
+            self._configured.discard(guild_id)
+            self._cache.pop(guild_id, None)
+        return removed
+
+    # ---------------- BOT STATE ---------------- #
+    async def get_meta(self, key):
+        rows = await self._run(self._query, "SELECT value FROM meta WHERE key = ?", key)
+        return rows[0][0] if rows else None
+
+    async def set_meta(self, key, value):
+        await self._run(self._write, "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", key, value)
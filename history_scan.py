@@ -0,0 +1,304 @@
+"""
+Historical message scan for the Discord bot
+Streams channel history through the banned word and spam checks, deletes
+what they catch (in bulk where Discord allows it) and checkpoints every
+channel after each page, so a stopped or interrupted scan resumes where it
+left off
+"""
+import asyncio
+import datetime
+import json
+import logging
+import time
+from collections import deque
+
+import discord
+
+from metrics import REGISTRY
+from outbound import BULK_DELETE_LIMIT, PRIORITY_REPLY
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 100  # messages per history request, and per check batch
+# Discord only bulk deletes messages younger than 14 days; the margin covers clock skew and slow queues
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(hours=1)
+META_KEY = "history_scan:{}"  # guild settings meta row holding a guild's checkpoint
+
+SCANNED = REGISTRY.counter("history_scan_messages_total", "Messages read by history scans, by outcome", ("outcome",))
+
+
+def find_banned(matcher, messages):
+    """(message_id, author_id, reason) for each message with a banned word; pure, so it runs in a thread"""
+    hits = []
+    for message_id, author_id, content in messages:
+        hit = matcher.search(content)
+        if hit:
+            hits.append((message_id, author_id, f"banned word \"{hit.term}\""))
+    return hits
+
+
+class Bursts:
+    """Spam in history read newest first: `limit` messages by one author within `window` seconds
+
+    Every message of a burst is caught, not only the one that tipped it, and
+    so are the author's further messages within the window of the burst.
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = float(window)
+        self._recent = {}  # author_id -> deque of (timestamp, message_id), newest first
+        self._caught = {}  # author_id -> timestamp of their oldest caught message
+
+    def add(self, message_id, author_id, timestamp):
+        """Message IDs caught as spam by this message (possibly with earlier ones), else ()"""
+        caught = self._caught.get(author_id)
+        if caught is not None and caught - timestamp <= self.window:
+            self._caught[author_id] = timestamp
+            return (message_id,)
+        recent = self._recent.get(author_id)
+        if recent is None:
+            recent = self._recent[author_id] = deque()
+        while recent and recent[0][0] - timestamp > self.window:
+            recent.popleft()
+        recent.append((timestamp, message_id))
+        if len(recent) < self.limit:
+            return ()
+        del self._recent[author_id]
+        self._caught[author_id] = timestamp
+        return tuple(message_id for _, message_id in recent)
+
+
+class ScanState:
+    """What a guild's scan covers and how far it got; saved as JSON after every page
+
+    channels maps each channel ID to the ID of the oldest message checked
+    so far (history continues before it), or None once the channel is done.
+    failed holds channels whose history Discord failed to serve; they keep
+    their checkpoint, so a resume tries them again.
+    """
+
+    def __init__(self, guild_id, channels, strikes=False, spam=False, dry_run=False):
+        self.guild_id = guild_id
+        self.channels = dict(channels)
+        self.strikes = strikes
+        self.spam = spam
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.found = 0
+        self.deleted = 0
+        self.struck = 0
+        self.at_limit = set()  # users whose strikes reached the ban limit during the scan
+        self.failed = set()
+        self.started_at = time.time()
+
+    @classmethod
+    def start(cls, guild_id, channel_ids, start_id, **options):
+        """A fresh scan of the channels' messages sent before start_id"""
+        return cls(guild_id, {channel_id: start_id for channel_id in channel_ids}, **options)
+
+    @property
+    def finished(self):
+        return all(before is None for before in self.channels.values())
+
+    @property
+    def remaining(self):
+        return [channel_id for channel_id, before in self.channels.items() if before is not None]
+
+    def dumps(self):
+        return json.dumps({
+            "channels": {str(channel_id): before for channel_id, before in self.channels.items()},
+            "strikes": self.strikes, "spam": self.spam, "dry_run": self.dry_run,
+            "scanned": self.scanned, "found": self.found, "deleted": self.deleted, "struck": self.struck,
+            "at_limit": sorted(self.at_limit), "failed": sorted(self.failed), "started_at": self.started_at,
+        })
+
+    @classmethod
+    def loads(cls, guild_id, text):
+        data = json.loads(text)
+        state = cls(guild_id, {int(channel_id): before for channel_id, before in data["channels"].items()},
+                    strikes=data["strikes"], spam=data["spam"], dry_run=data["dry_run"])
+        state.scanned, state.found, state.deleted, state.struck = data["scanned"], data["found"], data["deleted"], data["struck"]
+        state.at_limit = set(data["at_limit"])
+        state.failed = set(data.get("failed", ()))
+        state.started_at = data["started_at"]
+        return state
+
+    def summary(self):
+        text = f"{self.scanned} messages checked, {self.found} caught"
+        text += " (dry run, nothing deleted)" if self.dry_run else f", {self.deleted} deleted"
+        if self.strikes:
+            text += f", {self.struck} strikes"
+            if self.at_limit:
+                text += f" ({len(self.at_limit)} users at the ban limit)"
+        done = len(self.channels) - len(self.remaining)
+        text = f"{text}; {done}/{len(self.channels)} channels done"
+        if self.failed:
+            text += f", {len(self.failed)} failed"
+        return text
+
+
+class HistoryScan:
+    """Runs one guild's scan: channels in parallel, each a stream of history pages
+
+    Each page is checked against the guild's current rules (the banned word
+    matcher in a worker thread, spam bursts in order on the loop), its hits
+    are deleted through the outbound scheduler at reply priority, so live
+    moderation always goes first, and the checkpoint is saved once the
+    deletes and strikes of the page are done. rules is an async callable
+    returning the guild's GuildRules; save is an async callable taking the
+    state's JSON.
+    """
+
+    def __init__(self, bot, guild, state, rules, strikes, save, concurrency=2):
+        self.bot = bot
+        self.guild = guild
+        self.state = state
+        self.rules = rules
+        self.strike_store = strikes
+        self.save = save
+        self.concurrency = max(1, concurrency)
+        self.stopping = False
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run(), name=f"history-scan-{self.guild.id}")
+        return self.task
+
+    def stop(self):
+        """Finish the pages in progress, save them and stop; the scan can be resumed later"""
+        self.stopping = True
+
+    async def run(self):
+        """Scan the remaining channels; an error in one cancels the others and is raised once they have stopped"""
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def scan(channel_id):
+            async with slots:
+                if not self.stopping:
+                    await self.scan_channel(channel_id)
+
+        self.state.failed.clear()  # retried now
+        try:
+            async with asyncio.TaskGroup() as group:
+                for channel_id in self.state.remaining:
+                    group.create_task(scan(channel_id))
+        except ExceptionGroup as e:
+            raise e.exceptions[0] from e
+        return self.state
+
+    async def scan_channel(self, channel_id):
+        channel = self.guild.get_channel_or_thread(channel_id)
+        if channel is None:
+            # deleted since the scan started
+            self.state.channels[channel_id] = None
+            await self.save(self.state.dumps())
+            return
+        bursts = None
+        page = []
+        try:
+            async for message in channel.history(limit=None, before=discord.Object(id=self.state.channels[channel_id])):
+                if self.stopping:
+                    return
+                page.append(message)
+                if len(page) == PAGE_SIZE:
+                    bursts = await self.check_page(channel, page, bursts)
+                    page = []
+            if page and not self.stopping:
+                await self.check_page(channel, page, bursts)
+        except discord.Forbidden:
+            log.warning("History scan of guild %s can't read channel %s; skipping it", self.guild.id, channel_id)
+        except discord.HTTPException as e:
+            # the checkpoint stays, so a resume retries the channel from there
+            log.warning("History scan of guild %s failed to read channel %s: %s", self.guild.id, channel_id, e)
+            self.state.failed.add(channel_id)
+            await self.save(self.state.dumps())
+            return
+        if self.stopping:
+            return
+        self.state.channels[channel_id] = None
+        await self.save(self.state.dumps())
+
+    async def check_page(self, channel, page, bursts):
+        """Check, delete and strike one page, then checkpoint it; returns the channel's spam tracker"""
+        rules = await self.rules()
+        messages = [(m.id, m.author.id, m.content or "") for m in page if not m.author.bot]
+        hits = await asyncio.to_thread(find_banned, rules.matcher, messages)
+        caught = {message_id for message_id, _, _ in hits}
+        if self.state.spam:
+            if bursts is None:
+                bursts = Bursts(rules.spam_detector.limit, rules.spam_detector.window)
+            for message_id, author_id, _ in messages:
+                caught.update(bursts.add(message_id, author_id, discord.utils.snowflake_time(message_id).timestamp()))
+        SCANNED.inc("clean", amount=len(page) - len(caught))
+        SCANNED.inc("banned_word", amount=len(hits))
+        SCANNED.inc("spam", amount=len(caught) - len(hits))
+
+        commit = asyncio.ensure_future(self.commit_page(channel, page, caught, hits, rules))
+        try:
+            await asyncio.shield(commit)
+        except asyncio.CancelledError:
+            # a page is deleted, struck and checkpointed as a whole, or a resume would strike it twice
+            await commit
+            raise
+        return bursts
+
+    async def commit_page(self, channel, page, caught, hits, rules):
+        self.state.scanned += len(page)
+        self.state.found += len(caught)
+        if caught and not self.state.dry_run:
+            deleted = await self.purge(channel, caught)  # not `+= await`: other channels update the count meanwhile
+            self.state.deleted += deleted
+            if self.state.strikes and hits:
+                await self.strike(rules, hits)
+        self.state.channels[channel.id] = page[-1].id
+        await self.save(self.state.dumps())
+
+    async def purge(self, channel, message_ids):
+        """Delete the messages, in bulk where they are young enough; returns how many are gone"""
+        cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - BULK_DELETE_MAX_AGE)
+        recent = sorted(i for i in message_ids if i > cutoff)
+        old = [i for i in message_ids if i <= cutoff]
+        outbound = self.bot.outbound
+        bucket = ("channel", channel.id)
+        futures = [
+            outbound.submit(lambda chunk=recent[i:i + BULK_DELETE_LIMIT]: self.delete_bulk(channel, chunk),
+                            PRIORITY_REPLY, bucket, label="scan delete")
+            for i in range(0, len(recent), BULK_DELETE_LIMIT)
+        ]
+        futures += [
+            outbound.submit(lambda message_id=message_id: self.delete_one(channel, message_id),
+                            PRIORITY_REPLY, bucket, label="scan delete")
+            for message_id in old
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        return sum(result for result in results if not isinstance(result, Exception))
+
+    async def delete_bulk(self, channel, message_ids):
+        if len(message_ids) > 1:
+            try:
+                await channel.delete_messages([discord.Object(id=i) for i in message_ids], reason="History scan")
+                return len(message_ids)
+            except discord.HTTPException:
+                # e.g. one of them was deleted meanwhile; fall back to one by one
+                pass
+        deleted = 0
+        for message_id in message_ids:
+            deleted += await self.delete_one(channel, message_id)
+        return deleted
+
+    @staticmethod
+    async def delete_one(channel, message_id):
+        try:
+            await channel.get_partial_message(message_id).delete()
+        except discord.NotFound:
+            return 0
+        return 1
+
+    async def strike(self, rules, hits):
+        amounts = {}
+        for _, author_id, _ in hits:
+            amounts[author_id] = amounts.get(author_id, 0) + 1
+        counts = await self.strike_store.add_many(self.guild.id, amounts, reason="banned word (history scan)")
+        self.state.struck += len(hits)
+        self.state.at_limit.update(int(user_id) for user_id, count in counts.items() if count >= rules.strikes_to_ban)
@@ -0,0 +1,253 @@
+"""
+Cluster launcher for the Discord bot
+Runs the bot as several processes ("clusters"), each an AutoShardedBot
+serving its own range of shards, so moderation work is spread over CPU
+cores. The launcher supervises them: a cluster that crashes is restarted
+on its own while the others stay connected, SIGHUP is passed on so every
+cluster re-reads the shared .env, and the clusters' metrics are served as
+one set with a cluster label.
+
+State is shared through files every cluster opens: strikes in SQLite
+(STRIKE_BACKEND=sqlite), per-guild settings in guild_settings.db, reaction
+roles in reaction_roles.json (each cluster rewrites only its own guilds).
+A guild lives on exactly one shard, so everything keyed by guild (ban
+lists, spam windows, raid and duplicate detection, cached settings) is
+only ever touched by one cluster.
+
+Usage: python launcher.py [--clusters N] [--shards N]
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import signal
+import sys
+import time
+
+import aiohttp
+
+from config import BotConfig
+from logs import setup_logging
+from metrics import REGISTRY, MetricsExporter, merge_expositions
+
+log = logging.getLogger("launcher")
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+IDENTIFY_INTERVAL = 5.0  # Discord allows max_concurrency shard logins per 5 seconds
+STABLE_AFTER = 60.0  # a cluster that stayed up this long restarts without backoff
+MAX_BACKOFF = 60.0
+SHUTDOWN_TIMEOUT = 30.0  # seconds clusters get to close before they are killed
+METRICS_DIR = "cluster_metrics"
+
+RESTARTS = REGISTRY.counter("cluster_restarts_total", "Cluster processes restarted after a crash, by cluster", ("cluster",))
+
+
+def split_shards(shard_count, clusters):
+    """Contiguous, near-equal shard ranges, one per cluster"""
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + size + (i < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def gateway_info(token):
+    """Discord's recommended shard count and how many shards may log in at once"""
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(GATEWAY_URL, headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data.get("session_start_limit", {}).get("max_concurrency", 1)
+
+
+# ---------------- CLUSTERS ---------------- #
+class Cluster:
+    """One bot process and the shards it serves"""
+
+    def __init__(self, cluster_id, shard_ids, shard_count, metrics_path=None):
+        self.id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.metrics_path = metrics_path
+        self.process = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+    def env(self):
+        # the process environment wins over .env, so these hold across config reloads too
+        return dict(
+            os.environ,
+            SHARD_IDS=",".join(map(str, self.shard_ids)),
+            SHARD_COUNT=str(self.shard_count),
+            CLUSTER_ID=str(self.id),
+            METRICS_PORT="0",
+            METRICS_SNAPSHOT_FILE=self.metrics_path or "",
+        )
+
+    def signal(self, signum):
+        if self.running:
+            self.process.send_signal(signum)
+
+
+class ClusterMetrics:
+    """What the launcher's metrics exporter renders: every cluster's snapshot, merged, plus its own"""
+
+    def __init__(self, clusters):
+        self.clusters = clusters
+
+    def render(self):
+        texts = {}
+        for cluster in self.clusters:
+            try:
+                with open(cluster.metrics_path, encoding="utf-8") as f:
+                    texts[str(cluster.id)] = f.read()
+            except OSError:
+                continue  # not written yet
+        return merge_expositions(texts) + REGISTRY.render()
+
+
+class Supervisor:
+    """Starts the clusters, staggered, and restarts any that crash"""
+
+    def __init__(self, clusters):
+        self.clusters = clusters
+        self._closing = False
+        self._stop = asyncio.Event()
+        REGISTRY.collect("cluster_up", "Whether each cluster process is running", self.up, ("cluster",))
+
+    def up(self):
+        return {(str(cluster.id),): int(cluster.running) for cluster in self.clusters}
+
+    async def run(self, start_delays):
+        await asyncio.gather(*(self.supervise(cluster, delay) for cluster, delay in zip(self.clusters, start_delays)))
+
+    async def supervise(self, cluster, delay):
+        await self._sleep(delay)
+        backoff = 1.0
+        while not self._closing:
+            started = time.monotonic()
+            # own session: a Ctrl+C in the terminal reaches the launcher only, which then stops each cluster once
+            cluster.process = await asyncio.create_subprocess_exec(sys.executable, MAIN, env=cluster.env(),
+                                                                   start_new_session=True)
+            log.info("Cluster %d started (pid %d, shards %d-%d of %d)", cluster.id, cluster.process.pid,
+                     cluster.shard_ids[0], cluster.shard_ids[-1], cluster.shard_count)
+            code = await cluster.process.wait()
+            if self._closing:
+                break
+            if code == 0:
+                log.info("Cluster %d exited cleanly; not restarting it", cluster.id)
+                break
+            if time.monotonic() - started > STABLE_AFTER:
+                backoff = 1.0
+            RESTARTS.inc(str(cluster.id))
+            log.warning("Cluster %d exited with code %d; restarting it in %.0fs", cluster.id, code, backoff)
+            await self._sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    async def _sleep(self, seconds):
+        # cut short when the launcher is stopping
+        try:
+            await asyncio.wait_for(self._stop.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def stop(self):
+        if self._closing:
+            return
+        log.info("Stopping %d clusters...", sum(cluster.running for cluster in self.clusters))
+        self._closing = True
+        self._stop.set()
+        for cluster in self.clusters:
+            # the bot closes cleanly (flushing strikes, logs and role edits) on SIGINT
+            cluster.signal(signal.SIGINT)
+        asyncio.get_running_loop().call_later(SHUTDOWN_TIMEOUT, self.kill)
+
+    def kill(self):
+        for cluster in self.clusters:
+            if cluster.running:
+                log.warning("Cluster %d did not stop in %.0fs; killing it", cluster.id, SHUTDOWN_TIMEOUT)
+                cluster.process.kill()
+
+    def reload(self):
+        log.info("Asking every cluster to reload the configuration")
+        for cluster in self.clusters:
+            cluster.signal(signal.SIGHUP)
+
+
+# ---------------- LAUNCH ---------------- #
+async def launch(cluster_count, shard_count):
+    max_concurrency = 1
+    try:
+        recommended, max_concurrency = await gateway_info(BotConfig.BOT_TOKEN)
+    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as e:
+        if not shard_count:
+            raise SystemExit(f"Could not ask Discord for a shard count ({e}); set SHARD_COUNT or --shards.")
+        log.warning("Could not read the gateway's login limits (%s); logging shards in one at a time", e)
+    else:
+        shard_count = shard_count or recommended
+    cluster_count = max(1, min(cluster_count or os.cpu_count() or 1, shard_count))
+
+    exporting = bool(BotConfig.METRICS_PORT or BotConfig.METRICS_SNAPSHOT_FILE)
+    if exporting:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+    clusters = [
+        Cluster(i, shard_ids, shard_count, os.path.join(METRICS_DIR, f"cluster{i}.prom") if exporting else None)
+        for i, shard_ids in enumerate(split_shards(shard_count, cluster_count))
+    ]
+    # shards log in max_concurrency at a time every 5s; later clusters wait for the earlier ones' turn
+    delays, before = [], 0
+    for cluster in clusters:
+        delays.append(math.ceil(before / max_concurrency) * IDENTIFY_INTERVAL)
+        before += len(cluster.shard_ids)
+    log.info("Running %d shards in %d clusters", shard_count, cluster_count)
+
+    supervisor = Supervisor(clusters)
+    loop = asyncio.get_running_loop()
+    for signum, handler in ((signal.SIGINT, supervisor.stop), (signal.SIGTERM, supervisor.stop),
+                            (getattr(signal, "SIGHUP", None), supervisor.reload)):
+        if signum is not None:
+            try:
+                loop.add_signal_handler(signum, handler)
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C still ends the launcher, without a graceful stop
+    metrics = MetricsExporter(
+        registry=ClusterMetrics(clusters),
+        host=BotConfig.METRICS_HOST,
+        port=BotConfig.METRICS_PORT,
+        snapshot_path=BotConfig.METRICS_SNAPSHOT_FILE or None,
+        interval=BotConfig.METRICS_SNAPSHOT_INTERVAL,
+    )
+    await metrics.start()
+    try:
+        await supervisor.run(delays)
+    finally:
+        await metrics.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clusters", type=int, default=BotConfig.CLUSTER_COUNT,
+                        help="bot processes to run (default CLUSTER_COUNT, 0 = one per CPU core)")
+    parser.add_argument("--shards", type=int, default=BotConfig.SHARD_COUNT,
+                        help="total shards (default SHARD_COUNT, 0 = Discord's recommendation)")
+    args = parser.parse_args()
+
+    setup_logging(BotConfig.LOG_LEVEL, prefix="[launcher] ")
+    try:
+        # checked the way each cluster will see it
+        type("Cluster", (BotConfig,), {"SHARD_IDS": [0], "SHARD_COUNT": 1}).validate()
+    except ValueError as e:
+        log.error("%s", e)
+        sys.exit(1)
+    asyncio.run(launch(args.clusters, args.shards))
+
+
+if __name__ == "__main__":
+    main()
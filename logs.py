@@ -0,0 +1,95 @@
+"""
+Logging setup for the Discord bot
+Queue-based, non-blocking log output, sampling for high-volume loggers,
+and rate limit metrics read from discord.py's HTTP log records
+"""
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+from metrics import REGISTRY
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+RATE_LIMITED = REGISTRY.counter(
+    "discord_rate_limited_total", "Requests Discord answered with 429, by scope", ("scope",)
+)
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "discord_rate_limit_wait_seconds", "Retry-after Discord asked for on a 429, by scope", ("scope",)
+)
+
+_listener = None
+
+
+def setup_logging(level="INFO", prefix=""):
+    """Send all logging through a queue to a stderr handler on its own thread
+
+    Callers only pay for building the record; formatting the line and the
+    write to stderr happen on the listener thread. Safe to call twice.
+    prefix is put in front of every line, e.g. to tell clusters apart.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(prefix + LOG_FORMAT))
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(records)]
+    root.setLevel(level)
+    logging.getLogger("discord.http").addFilter(RateLimitRecorder())
+    return _listener
+
+
+class SampleFilter(logging.Filter):
+    """Lets through a `rate` fraction (0-1) of records, evenly spaced"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._credit = 0.0
+
+    def filter(self, record):
+        self._credit += self.rate
+        if self._credit >= 1.0:
+            self._credit -= 1.0
+            return True
+        return False
+
+
+def set_sample_rate(logger, rate):
+    """Sample logger's records at rate (0-1), replacing any earlier sampling; 1 or more logs everything"""
+    for f in [f for f in logger.filters if isinstance(f, SampleFilter)]:
+        logger.removeFilter(f)
+    if 0 < rate < 1:
+        logger.addFilter(SampleFilter(rate))
+
+
+class RateLimitRecorder(logging.Filter):
+    """Counts the 429s discord.py logs (it waits them out internally)
+
+    Bucket-level pre-emptive waits are only logged at DEBUG, so they are
+    counted only when discord.http logs at that level.
+    """
+
+    def filter(self, record):
+        msg = record.msg
+        if not isinstance(msg, str) or "rate limit" not in msg:
+            return True
+        try:
+            if msg.startswith("We are being rate limited"):
+                RATE_LIMITED.inc("route")
+                RATE_LIMIT_WAIT.observe(float(record.args[2]), "route")
+            elif msg.startswith("Global rate limit has been hit"):
+                RATE_LIMITED.inc("global")
+                RATE_LIMIT_WAIT.observe(float(record.args[0]), "global")
+            elif msg.startswith("A rate limit bucket"):
+                RATE_LIMITED.inc("bucket_exhausted")
+        except (IndexError, TypeError, ValueError):
+            pass
+        return True
@@ -1,193 +1,358 @@
+"""
+Entry point for the Discord bot
+Runs a single bot and loads its features (moderation, reaction roles,
+demo UI) as discord.py extensions from cogs/, as enabled in the configuration
+"""
+import time
+
+_PROCESS_START = time.perf_counter()
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import signal
+import sys
+
 import discord
 from discord.ext import commands
-from discord import app_commands
-from config import BotConfig
 
-# Validate configuration on startup
-BotConfig.validate()
+from components import ComponentRouter, RoutedComponent
+from config import CACHE_PROFILES, BotConfig
+from guild_settings import GuildSettingsStore
+from logs import set_sample_rate, setup_logging
+from metrics import REGISTRY, MetricsExporter, rss_bytes
+from modlog import ModLogSink
+from outbound import PRIORITY_NAMES, OutboundScheduler
+from role_index import RoleIndex
+
+log = logging.getLogger("bot")
+message_log = logging.getLogger("bot.messages")
+
+EVENTS = REGISTRY.counter("discord_events_total", "Gateway and custom events dispatched, by event", ("event",))
+MESSAGES = REGISTRY.counter("bot_messages_total", "Messages handled, by outcome", ("outcome",))
+MESSAGE_SECONDS = REGISTRY.histogram("bot_message_seconds", "Time spent in on_message").labels()
+
+# feature name (as used in ENABLED_EXTENSIONS) -> extension module
+EXTENSIONS = {
+    "moderation": "cogs.moderation",
+    "reaction_roles": "cogs.reaction_roles",
+    "demo": "cogs.demo",
+}
+# always loaded: owner commands to load, unload and hot-reload the others
+CORE_EXTENSIONS = ("cogs.admin",)
+
+
+def client_options(profile):
+    """Intents and cache options for discord.py for a CACHE_PROFILE"""
+    settings = CACHE_PROFILES[profile]
+    if settings["default_intents"]:
+        intents = discord.Intents.default()
+    else:
+        # only events some feature handles: no typing, voice, invites, webhooks, scheduled events...
+        intents = discord.Intents(guilds=True, guild_messages=True, dm_messages=True, guild_reactions=True, moderation=True)
+    intents.message_content = True
+    intents.reactions = True
+    # kept in every profile: it is what lets commands chunk a guild or look members up by name
+    intents.members = True
+    if settings["member_cache"] == "all":
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        member_cache_flags = discord.MemberCacheFlags.none()
+        member_cache_flags.joined = settings["member_cache"] == "joined"
+    max_messages = BotConfig.MESSAGE_CACHE_SIZE if BotConfig.MESSAGE_CACHE_SIZE >= 0 else settings["max_messages"]
+    return {
+        "intents": intents,
+        "member_cache_flags": member_cache_flags,
+        "chunk_guilds_at_startup": settings["chunk_at_startup"],
+        # discord.py treats 0 as "use the default", None turns the cache off
+        "max_messages": max_messages or None,
+    }
 
-# Setup guild ID
-GUILD_ID = discord.Object(id=BotConfig.GUILD_ID)
 
 # ---------------- BOT CLIENT ---------------- #
-class Client(commands.Bot):
-    def __init__(self):
-        intents = discord.Intents.default()
-        intents.message_content = True
-        intents.reactions = True  
-        intents.guilds = True  
-        intents.members = True  
-        super().__init__(command_prefix="!", intents=intents)
+class Client(commands.AutoShardedBot):
+    def __init__(self, extensions=None):
+        options = client_options(BotConfig.CACHE_PROFILE)
+        super().__init__(
+            command_prefix=BotConfig.COMMAND_PREFIX,
+            # every shard by default; launcher.py gives each cluster process a subset
+            shard_ids=BotConfig.SHARD_IDS or None,
+            shard_count=BotConfig.SHARD_COUNT or None,
+            **options,
+        )
+        # discord.py keeps these private; commands check them before chunking a guild
+        self.member_cache_flags = options["member_cache_flags"]
         self.synced = False  # Prevent multiple syncs
-        self.colour_role_message_id = None
+        # slash commands go to the one configured guild, or to every guild when global
+        self.guild_object = discord.Object(id=BotConfig.GUILD_ID) if BotConfig.SLASH_COMMAND_SCOPE == "guild" else None
+        self.enabled_extensions = list(BotConfig.ENABLED_EXTENSIONS if extensions is None else extensions)
+        self.startup_report = {}
+        # every automated Discord call goes through here, so bans never wait behind chatter
+        self.outbound = OutboundScheduler(
+            workers=BotConfig.OUTBOUND_WORKERS,
+            bucket_concurrency=BotConfig.OUTBOUND_BUCKET_CONCURRENCY,
+            bulk_window=BotConfig.OUTBOUND_BULK_WINDOW,
+            max_replies=BotConfig.OUTBOUND_MAX_REPLIES,
+        )
+        self.modlog = ModLogSink(
+            self,
+            BotConfig.MOD_LOG_CHANNEL_ID,
+            flush_interval=BotConfig.MOD_LOG_FLUSH_INTERVAL,
+            batch_size=BotConfig.MOD_LOG_BATCH_SIZE,
+            audit_path=BotConfig.MOD_LOG_AUDIT_FILE or None,
+            route=self.mod_log_channel_for,
+        )
+        # per-guild overrides of the global settings, for every feature
+        self.guild_settings = GuildSettingsStore(BotConfig.GUILD_SETTINGS_FILE)
+        # button and select handlers by route, for every feature; see components.py
+        self.components = ComponentRouter()
+        # name and ID lookups of roles for every feature, kept current by the role events below
+        self.role_index = RoleIndex()
+        self.metrics = MetricsExporter(
+            host=BotConfig.METRICS_HOST,
+            port=BotConfig.METRICS_PORT,
+            snapshot_path=BotConfig.METRICS_SNAPSHOT_FILE or None,
+            interval=BotConfig.METRICS_SNAPSHOT_INTERVAL,
+        )
+        self.register_metrics()
+
+    def register_metrics(self):
+        outbound = self.outbound
+        REGISTRY.collect("outbound_queue_depth", "Outbound API calls waiting, by priority",
+                         lambda: {(name,): len(q) for name, q in zip(PRIORITY_NAMES, outbound._queues)}, ("priority",))
+        REGISTRY.collect("outbound_running", "Outbound API calls in flight", lambda: len(outbound._running))
+        REGISTRY.collect("outbound_time_to_action_seconds", "Time from queueing an API call to its completion, by priority",
+                         lambda: {(name,): h for name, h in zip(PRIORITY_NAMES, outbound.latency)}, ("priority",), kind="histogram")
+        REGISTRY.collect("outbound_call_seconds", "Duration of the API call itself (incl. rate limit waits), by call",
+                         lambda: {(label,): h for label, h in outbound.calls.items()}, ("call",), kind="histogram")
+        REGISTRY.collect("outbound_events_total", "Merged, dropped and failed calls, and items sent in bulk",
+                         lambda: {(k,): v for k, v in outbound.counters.items()}, ("event",), kind="counter")
+        REGISTRY.collect("modlog_entries_total", "Mod log entries recorded", lambda: self.modlog.stats["entries"], kind="counter")
+        REGISTRY.collect("modlog_pending", "Mod log entries waiting to be flushed", lambda: len(self.modlog))
+        REGISTRY.collect("process_resident_memory_bytes", "Resident memory size", rss_bytes)
+        REGISTRY.collect("discord_cached_members", "Members held in the member cache",
+                         lambda: sum(len(guild.members) for guild in self.guilds))
+        REGISTRY.collect("discord_cached_messages", "Messages held in the message cache",
+                         lambda: len(self.cached_messages))
+        REGISTRY.collect("discord_gateway_latency_seconds", "Gateway heartbeat latency, by shard",
+                         lambda: {(str(shard_id),): latency if math.isfinite(latency) else 0 for shard_id, latency in self.latencies},
+                         ("shard",))
+        REGISTRY.collect("discord_guilds", "Guilds served, by shard", self.guilds_per_shard, ("shard",))
+
+    def guilds_per_shard(self):
+        counts = {(str(shard_id),): 0 for shard_id in self.shards}
+        for guild in self.guilds:
+            counts[(str(guild.shard_id),)] = counts.get((str(guild.shard_id),), 0) + 1
+        return counts
+
+    def owns_guild(self, guild_id):
+        """Whether this process's shards serve the guild (always true without SHARD_IDS)"""
+        if not BotConfig.SHARD_IDS:
+            return True
+        return (guild_id >> 22) % BotConfig.SHARD_COUNT in BotConfig.SHARD_IDS
+
+    def dispatch(self, event_name, /, *args, **kwargs):
+        EVENTS.inc(event_name)
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def setup_hook(self):
+        try:
+            # launcher.py forwards SIGHUP to every cluster so they all re-read the shared .env
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.reload_config_on_signal)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass  # no SIGHUP on Windows
+        await self.guild_settings.start()
+        # one persistent, stateless entry point for every routed button and select menu
+        self.add_dynamic_items(RoutedComponent)
+        await self.modlog.start()
+        await self.metrics.start()
+        # extensions are only imported here, so disabled features cost nothing
+        modules_before = len(sys.modules)
+        for name in [*CORE_EXTENSIONS, *(EXTENSIONS[n] for n in self.enabled_extensions)]:
+            start = time.perf_counter()
+            await self.load_extension(name)
+            self.startup_report[name] = (time.perf_counter() - start) * 1000
+        self.startup_report["modules imported by extensions"] = len(sys.modules) - modules_before
+
+    async def close(self):
+        # extensions still flush moderation actions into the scheduler while
+        # unloading, and the scheduler needs the HTTP session to drain
+        for name in list(self.extensions):
+            try:
+                await self.unload_extension(name)
+            except Exception:
+                pass
+        await self.modlog.close()
+        await self.outbound.close()
+        await self.metrics.close()
+        await self.guild_settings.close()
+        await super().close()
 
     async def on_ready(self):
+        # on_ready fires again after every reconnect; commands only need pushing once
         if not self.synced:
-            await self.tree.sync(guild=GUILD_ID)
             self.synced = True
-        print(f'✅ Logged in as {self.user}!')
+            # clusters share one command tree; the first one syncs it
+            if BotConfig.CLUSTER_ID == 0:
+                try:
+                    await self.sync_commands()
+                except Exception as e:
+                    log.warning("Slash command sync failed: %s", e)
+            log.info("Startup: %.0f ms to ready, %.1f MB RSS, %d members cached in %d guilds on %d shards (%s cache profile), %d modules loaded",
+                     (time.perf_counter() - _PROCESS_START) * 1000, rss_bytes() / 2 ** 20,
+                     sum(len(guild.members) for guild in self.guilds), len(self.guilds), len(self.shards),
+                     BotConfig.CACHE_PROFILE, len(sys.modules))
+            for name, value in self.startup_report.items():
+                log.info("  %s: %s", name, f"{value:.1f} ms" if isinstance(value, float) else value)
+        log.info("✅ Logged in as %s!", self.user)
+
+    async def sync_commands(self, force=False):
+        """Push the slash commands to Discord if they changed since the last sync
+
+        A hash of the command payload is kept in the settings database, so a
+        restart with the same commands makes no API call. Returns the number
+        of commands synced, or None if nothing changed.
+        """
+        payload = [command.to_dict(self.tree) for command in self.tree.get_commands(guild=self.guild_object)]
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        key = f"command_tree:{self.guild_object.id if self.guild_object else 'global'}"
+        if not force and await self.guild_settings.get_meta(key) == digest:
+            log.info("Slash commands unchanged, not syncing")
+            return None
+        synced = await self.tree.sync(guild=self.guild_object)
+        await self.guild_settings.set_meta(key, digest)
+        log.info("Synced %d slash commands (%s)", len(synced), key.split(":")[1])
+        return len(synced)
 
     async def on_message(self, message):
-        print(f'Message from {message.author}: {message.content}')
-        if message.author == self.user:
+        # Basic guards
+        if message.author.bot:
+            MESSAGES.inc("bot")
             return
-        if message.content.startswith('Hey'):
-            await message.channel.send(f'Hello There {message.author.mention}!')
+        start = time.perf_counter()
 
-    async def on_reaction_add(self, reaction, user):
-        await reaction.message.channel.send(f'{user} reacted with {reaction.emoji}!')
-        if user.bot:
-            return
-        
-        guild = reaction.message.guild
-        if not guild:
-            return
-        
-        if hasattr(self, 'colour_role_message_id') and reaction.message.id != self.colour_role_message_id:
-            return
-        emoji = str(reaction.emoji)
-        
-        reaction_roles = {
-            '🟥': 'Red',
-            '🟩': 'Green',
-            '🟦': 'Blue',
-            '🟨': 'Yellow',
-            '🩷': 'Pink'
-        }
-        
-        if emoji in reaction_roles:
-            role_name = reaction_roles[emoji]
-            role = discord.utils.get(guild.roles, name=role_name)
-            if role and user:
-                await user.add_roles(role)
-                await reaction.message.channel.send(f'{user} has been given the {role_name} role!')
+        # a sample of messages, as IDs only unless content logging is switched on
+        if BotConfig.LOG_MESSAGE_SAMPLE_RATE:
+            if BotConfig.LOG_MESSAGE_CONTENT:
+                message_log.info("Message %s from %s in %s: %r", message.id, message.author.id, message.channel.id, message.content)
             else:
-                await reaction.message.channel.send(f'Role {role_name} not found.')
-
-    async def on_reaction_remove(self, reaction, user):
-        await reaction.message.channel.send(f'{user} removed their reaction {reaction.emoji}!')
-        if user.bot:
-            return
+                message_log.info("Message %s from %s in %s (%d chars)", message.id, message.author.id, message.channel.id, len(message.content or ""))
 
-        guild = reaction.message.guild
-        if not guild:
+        # the moderation extension gets the first look and may claim the message
+        moderation = self.get_cog("Moderation")
+        if moderation is not None and not await moderation.screen(message):
+            MESSAGES.inc("claimed")
+            MESSAGE_SECONDS.observe(time.perf_counter() - start)
             return
-
-        if hasattr(self, 'colour_role_message_id') and reaction.message.id != self.colour_role_message_id:
+        MESSAGES.inc("clean")
+        self.dispatch("clean_message", message)
+
+        # allow commands to be processed
+        await self.process_commands(message)
+        MESSAGE_SECONDS.observe(time.perf_counter() - start)
+
+    # ---------------- CONFIG RELOAD ---------------- #
+    def reload_config(self):
+        """Re-read the configuration and apply the changes to the client and every feature
+
+        Returns (applied, pending) like BotConfig.reload(), and raises
+        ValueError, changing nothing, if the new settings are invalid.
+        Features rebuild their own state from on_config_reload.
+        """
+        applied, pending = BotConfig.reload()
+        if applied:
+            self.command_prefix = BotConfig.COMMAND_PREFIX
+            logging.getLogger().setLevel(BotConfig.LOG_LEVEL)
+            set_sample_rate(message_log, BotConfig.LOG_MESSAGE_SAMPLE_RATE)
+            self.outbound.workers = BotConfig.OUTBOUND_WORKERS
+            self.outbound.bucket_concurrency = BotConfig.OUTBOUND_BUCKET_CONCURRENCY
+            self.outbound.bulk_window = BotConfig.OUTBOUND_BULK_WINDOW
+            self.outbound.max_replies = BotConfig.OUTBOUND_MAX_REPLIES
+            self.modlog.configure(
+                BotConfig.MOD_LOG_CHANNEL_ID,
+                flush_interval=BotConfig.MOD_LOG_FLUSH_INTERVAL,
+                batch_size=BotConfig.MOD_LOG_BATCH_SIZE,
+                audit_path=BotConfig.MOD_LOG_AUDIT_FILE or None,
+            )
+            self.dispatch("config_reload", set(applied))
+        return applied, pending
+
+    def reload_config_on_signal(self):
+        try:
+            applied, pending = self.reload_config()
+        except ValueError as e:
+            log.error("Configuration not reloaded: %s", e)
             return
-        emoji = str(reaction.emoji)
-
-        reaction_roles = {
-            '🟥': 'Red',
-            '🟩': 'Green',
-            '🟦': 'Blue',
-            '🟨': 'Yellow',
-            '🩷': 'Pink'
-        }
-
-        if emoji in reaction_roles:
-            role_name = reaction_roles[emoji]
-            role = discord.utils.get(guild.roles, name=role_name)
-            if role and user:
-                await user.remove_roles(role)
-                await reaction.message.channel.send(f'{user} has been removed from the {role_name} role!')
-            else:
-                await reaction.message.channel.send(f'Role {role_name} not found.')
-
-
-client = Client()
-
-
-# ---------------- SLASH COMMANDS ---------------- #
-
-@client.tree.command(name="colorrole", description="Create a message that lets the users pick color role", guild=GUILD_ID)
-async def color_role(interaction: discord.Interaction):
-    if not interaction.user.guild_permissions.administrator:
-        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
-        return
-    
-    await interaction.response.defer(ephemeral=True)  
-    
-    description = (
-        "React to the message to become the Power Ranger you want to become:\n"
-        "🟥 Red\n"
-        "🟩 Green\n"
-        "🟦 Blue\n"
-        "🟨 Yellow\n"
-        "🩷 Pink\n" 
-    )
-
-    embed = discord.Embed(
-        title="Pick The Color You Want!",
-        description=description,
-        color=discord.Color.blurple()
-    )
-
-    # send the embed in the channel (not ephemeral)
-    message = await interaction.channel.send(embed=embed)
-
-    # add reactions
-    emojis = ["🟥", "🟩", "🟦", "🟨", "🩷"]
-    for emoji in emojis:
-        await message.add_reaction(emoji)
-        
-    client.colour_role_message_id = message.id
-    
-    await interaction.followup.send("Color role message created successfully!", ephemeral=True) 
-
-
-@client.tree.command(name="hello", description="Say Hello!", guild=GUILD_ID)
-async def say_hello(interaction: discord.Interaction):
-    await interaction.response.send_message(f'Hello {interaction.user.mention}!')
-
-
-@client.tree.command(name="print", description="Print whatever you say", guild=GUILD_ID)
-async def printer(interaction: discord.Interaction, printer: str):
-    await interaction.response.send_message(printer)
-
-
-@client.tree.command(name="embed", description="Embed Demo!", guild=GUILD_ID)
-async def embed(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title="I am a Title",
-        url="https://www.reddit.com/r/mushokutensei/",
-        description="I am the description",
-        color=discord.Color.red()
-    )
-    embed.set_thumbnail(url="https://static.wikia.nocookie.net/mushoku-tensei/images/5/54/Rudeus_Greyrat_Anime.png")
-    embed.add_field(name="Field 1", value="This is field 1", inline=False)
-    await interaction.response.send_message(embed=embed)
-
-
-# ---------------- DROPDOWN MENU ---------------- #
-class Menu(discord.ui.Select):
-    def __init__(self):
-        options = [
-            discord.SelectOption(label="Option 1", description="This is option 1", emoji="🍎"),
-            discord.SelectOption(label="Option 2", description="This is option 2", emoji="🍌"),
-            discord.SelectOption(label="Option 3", description="This is option 3", emoji="🍇"),
-        ]
-        super().__init__(placeholder="Please choose an option", min_values=1, max_values=1, options=options)
-
-    async def callback(self, interaction: discord.Interaction):
-        await interaction.response.send_message(f"You selected: **{self.values[0]}**", ephemeral=True)
-
-
-class MenuView(discord.ui.View):
-    def __init__(self, *, timeout=180):
-        super().__init__(timeout=timeout)
-        self.add_item(Menu())
-
-
-@client.tree.command(name="menu", description="Display a dropdown menu", guild=GUILD_ID)
-async def myMenu(interaction: discord.Interaction):
-    await interaction.response.send_message("Here is a menu:", view=MenuView())
+        log.info("Configuration reloaded on SIGHUP: %s", ", ".join(applied) or "no changes")
+        if pending:
+            log.warning("Changed settings that need a restart: %s", ", ".join(pending))
+
+    # ---------------- ROLE INDEX ---------------- #
+    async def on_guild_role_create(self, role):
+        self.role_index.created(role)
+
+    async def on_guild_role_update(self, before, after):
+        self.role_index.updated(before, after)
+
+    async def on_guild_role_delete(self, role):
+        self.role_index.deleted(role)
+
+    async def on_guild_remove(self, guild):
+        self.role_index.drop(guild.id)
+
+    async def on_guild_available(self, guild):
+        # after an outage or reconnect; role changes made meanwhile fired no events
+        self.role_index.drop(guild.id)
+
+    async def on_guild_join(self, guild):
+        self.role_index.drop(guild.id)
+
+    async def on_command_error(self, ctx, error):
+        if isinstance(error, commands.CommandNotFound):
+            try:
+                await ctx.send("Command not found.")
+            except Exception:
+                pass
+        elif isinstance(error, (commands.MissingPermissions, commands.NotOwner)):
+            try:
+                await ctx.send("You don't have permission to run that command.")
+            except Exception:
+                pass
+        else:
+            try:
+                await ctx.send(f"An error occurred: {str(error)}")
+            except Exception:
+                pass
+            # also log
+            try:
+                await self.log_mod_action(f"Command error by {getattr(ctx, 'author', 'unknown')}: {error}")
+            except Exception:
+                pass
+
+    async def mod_log_channel_for(self, guild_id):
+        return (await self.guild_settings.overrides(guild_id)).get("mod_log_channel_id")
+
+    async def log_mod_action(self, message: str, **fields):
+        # buffered: posted to the mod log channel in batches and written to the audit file
+        self.modlog.log(message, **fields)
+
+
+def run(extensions=None):
+    """Validate the configuration and run the bot until it is stopped"""
+    setup_logging(BotConfig.LOG_LEVEL, prefix=f"[cluster {BotConfig.CLUSTER_ID}] " if BotConfig.SHARD_IDS else "")
+    set_sample_rate(message_log, BotConfig.LOG_MESSAGE_SAMPLE_RATE)
+    BotConfig.validate()
+    client = Client(extensions)
+    log.info("Starting Discord Bot...")
+    log.info("Configuration Summary:")
+    for key, value in BotConfig.get_summary().items():
+        log.info("  %s: %s", key, value)
+    # logging is already set up; stop discord.py from adding its own handler
+    client.run(BotConfig.BOT_TOKEN, log_handler=None)
 
 
 # ---------------- RUN BOT ---------------- #
 if __name__ == "__main__":
-    print("Starting Discord Bot...")
-    print("Configuration Summary:")
-    for key, value in BotConfig.get_summary().items():
-        print(f"  {key}: {value}")
-    client.run(BotConfig.BOT_TOKEN)
+    run()
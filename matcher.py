@@ -0,0 +1,146 @@
+"""
+Banned word matcher for the Discord bot
+Aho-Corasick automaton that finds every banned term in one pass over a message
+"""
+from collections import deque, namedtuple
+
+from normalize import normalize as normalize_text, normalize_term
+
+# A single hit: the configured term, and the [start, end) span it covered
+Match = namedtuple("Match", ["term", "start", "end"])
+
+MODE_SUBSTRING = "substring"
+MODE_WORD = "word"
+MODES = (MODE_SUBSTRING, MODE_WORD)
+
+
+class BannedWordMatcher:
+    """Multi-pattern matcher compiled once from a collection of banned words
+
+    The automaton is built in O(total pattern length) and each scan costs
+    O(message length + number of matches), independent of how many terms
+    are configured.
+
+    With normalize=True the terms are indexed in the same normalized space
+    that messages are folded into (see normalize.py), so leetspeak,
+    homoglyphs, zero-width characters and stretched letters still match
+    after one normalization pass and one scan. Reported spans always refer
+    to the original message.
+    """
+
+    __slots__ = ("mode", "normalize", "terms", "_variants", "_goto", "_fail", "_out")
+
+    def __init__(self, words=(), mode=MODE_SUBSTRING, normalize=False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown match mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.normalize = normalize
+        self.terms = frozenset(w.strip().lower() for w in words if w and w.strip())
+        # pattern in the automaton -> ((original term, run lengths), ...)
+        self._variants = {}
+        if normalize:
+            for term in self.terms:
+                key, runs = normalize_term(term)
+                if key:
+                    self._variants[key] = self._variants.get(key, ()) + ((term, runs),)
+        else:
+            for term in self.terms:
+                self._variants[term] = ((term, None),)
+        # state 0 is the root; each state has a dict of char -> next state
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self._build()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    def _build(self):
+        goto, fail, out = self._goto, self._fail, self._out
+
+        # trie of all patterns
+        for term in self._variants:
+            state = 0
+            for ch in term:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                state = nxt
+            out[state] = out[state] + (term,)
+
+        # failure links, breadth first so parents are resolved before children
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+    def _scan(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for term in out[state]:
+                    end = i + 1
+                    yield Match(term, end - len(term), end)
+
+    @staticmethod
+    def _is_word_boundary(text, start, end):
+        before = text[start - 1] if start > 0 else ""
+        after = text[end] if end < len(text) else ""
+        return not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_")
+
+    def finditer(self, text, normalized=None):
+        """Yield every Match in text (lowercased, or fully normalized, before scanning)
+
+        normalized may pass normalize(text) when the caller already has it.
+        """
+        if not self._variants or not text:
+            return
+        whole_word = self.mode == MODE_WORD
+        if not self.normalize:
+            text = text.lower()
+            for match in self._scan(text):
+                if whole_word and not self._is_word_boundary(text, match.start, match.end):
+                    continue
+                yield match
+            return
+
+        norm = normalized if normalized is not None else normalize_text(text)
+        for match in self._scan(norm.text):
+            if whole_word and not self._is_word_boundary(norm.text, match.start, match.end):
+                continue
+            for term, runs in self._variants[match.term]:
+                # a collapsed hit only counts if every letter was repeated at
+                # least as often as in the banned word, so "as" != "ass"
+                if all(norm.runs[match.start + k] >= r for k, r in enumerate(runs)):
+                    yield Match(term, norm.starts[match.start], norm.ends[match.end - 1])
+
+    def find_all(self, text, normalized=None):
+        """Return a list of every Match in text, in order of their end offset"""
+        return list(self.finditer(text, normalized))
+
+    def search(self, text, normalized=None):
+        """Return the first Match in text, or None"""
+        return next(self.finditer(text, normalized), None)
+
+    def contains(self, text):
+        """Return True if text contains any banned term"""
+        return self.search(text) is not None
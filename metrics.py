@@ -0,0 +1,283 @@
+"""
+Metrics for the Discord bot
+Counters and latency histograms cheap enough for the hot path, collected in
+a registry and exported as Prometheus text over HTTP or to a snapshot file
+"""
+import asyncio
+import logging
+import os
+import sys
+from bisect import bisect_left
+
+from persistence import atomic_write_text
+
+log = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (seconds), cheap enough for the hot path"""
+
+    # 10us .. ~10s, doubling
+    BOUNDS = tuple(0.00001 * 2 ** i for i in range(21))
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0-100)"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class Counter:
+    """Monotonic counter, one value per tuple of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        return self.values
+
+
+class Histogram:
+    """A LatencyHistogram per tuple of label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+
+    def labels(self, *labels):
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = LatencyHistogram()
+        return child
+
+    def observe(self, seconds, *labels):
+        self.labels(*labels).observe(seconds)
+
+    def samples(self):
+        return self.children
+
+
+class Collected:
+    """A metric read from a callback at export time, for state a component already keeps
+
+    fn returns a number, or a dict of label value tuples to numbers (or to
+    LatencyHistograms when kind is "histogram").
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self):
+        values = self.fn()
+        return values if isinstance(values, dict) else {(): values}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, le=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+_LE = [f"{bound:g}" for bound in LatencyHistogram.BOUNDS]
+
+
+class Registry:
+    """Named metrics, get-or-create so reloaded code picks up the same series"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, cls, name, help, labelnames):
+        metric = self.metrics.get(name)
+        if metric is None or type(metric) is not cls:
+            metric = self.metrics[name] = cls(name, help, labelnames)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=()):
+        return self._get(Histogram, name, help, labelnames)
+
+    def collect(self, name, help, fn, labelnames=(), kind="gauge"):
+        """Register (or replace) a callback metric"""
+        self.metrics[name] = Collected(name, help, fn, labelnames, kind)
+
+    def unregister(self, *names):
+        for name in names:
+            self.metrics.pop(name, None)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                log.warning("Metric %s failed to collect: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in samples.items():
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for le, n in zip(_LE, value.counts):
+                        cumulative += n
+                        lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, labels, le)} {cumulative}")
+                    lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, labels, '+Inf')} {value.count}")
+                    lines.append(f"{metric.name}_sum{_labels(metric.labelnames, labels)} {value.total}")
+                    lines.append(f"{metric.name}_count{_labels(metric.labelnames, labels)} {value.count}")
+                else:
+                    lines.append(f"{metric.name}{_labels(metric.labelnames, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def merge_expositions(texts, label="cluster"):
+    """Merge Prometheus text from several processes into one, adding label=<key> to each sample
+
+    texts maps a label value (e.g. the cluster ID) to that process's
+    render() output. Each metric keeps a single HELP/TYPE header, with
+    every process's samples under it.
+    """
+    headers = {}  # metric name -> [HELP line, TYPE line]
+    samples = {}  # metric name -> [sample lines]
+    for value, text in texts.items():
+        extra = f'{label}="{_escape(value)}"'
+        name = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                header = headers.setdefault(name, [None, None])
+                header[line.startswith("# TYPE ")] = header[line.startswith("# TYPE ")] or line
+                samples.setdefault(name, [])
+            elif line and not line.startswith("#") and name is not None:
+                series, _, number = line.rpartition(" ")
+                if series.endswith("}"):
+                    series = series[:-1] + "," + extra + "}"
+                else:
+                    series = series + "{" + extra + "}"
+                samples[name].append(f"{series} {number}")
+    lines = []
+    for name, header in headers.items():
+        lines.extend(line for line in header if line)
+        lines.extend(samples[name])
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is missing)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MetricsExporter:
+    """Serves REGISTRY at http://host:port/metrics and/or rewrites a snapshot file
+
+    The snapshot uses the same text format, so it can be picked up by the
+    node_exporter textfile collector or just read by hand.
+    """
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=0, snapshot_path=None, interval=15.0):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self._runner = None
+        self._task = None
+
+    async def start(self):
+        if self.port and self._runner is None:
+            from aiohttp import web
+
+            async def handle(request):
+                return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+            app = web.Application()
+            app.router.add_get("/metrics", handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            log.info("Metrics served on http://%s:%s/metrics", self.host, self.port)
+        if self.snapshot_path and self._task is None:
+            self._task = asyncio.create_task(self._snapshots(), name="metrics-snapshot")
+
+    async def _snapshots(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.write_snapshot()
+
+    async def write_snapshot(self):
+        try:
+            await asyncio.to_thread(atomic_write_text, self.snapshot_path, self.registry.render())
+        except OSError as e:
+            log.warning("Could not write metrics snapshot: %s", e)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.write_snapshot()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,198 @@
+"""
+Moderation log sink for the Discord bot
+Buffers mod log entries, posts them to the log channel as consolidated
+embeds, and appends every entry to a local JSONL audit file
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+import discord
+
+from outbound import PRIORITY_LOG
+
+log = logging.getLogger(__name__)
+
+EMBED_DESCRIPTION_LIMIT = 4000  # Discord allows 4096
+MAX_LINE = 500
+
+
+class ModLogSink:
+    """Collects mod log entries and flushes them in batches
+
+    log() only appends to a buffer, so callers never wait on Discord. A
+    background task flushes every flush_interval seconds, or as soon as
+    batch_size entries are waiting: the batch is appended to the audit file
+    (off the event loop) and posted as one embed per ~4000 characters, with
+    identical entries folded into a single line with a count. The audit file
+    is written even when the channel is unset or Discord is throttling us.
+
+    `route`, if given, is awaited with a guild ID and returns that guild's
+    log channel ID (or None for the default channel), so each guild's
+    entries go to its own channel. A guild's entries are only ever posted
+    in a channel of that guild: a routed channel outside it is ignored, and
+    the default channel only takes its own guild's entries (and those of no
+    guild); the rest go to the audit file alone.
+    """
+
+    def __init__(self, bot, channel_id=None, flush_interval=5.0, batch_size=25, audit_path=None, route=None):
+        self.bot = bot
+        self.channel_id = int(channel_id) if channel_id else None
+        self.route = route
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.audit_path = audit_path
+        self._channels = {}  # channel_id -> resolved channel
+        self._rejected = set()  # (guild_id, channel_id) routes already warned about
+        self._buffer = []
+        self._wake = None
+        self._closing = False
+        self._task = None
+        self.stats = {"entries": 0, "embeds": 0, "audit_errors": 0}
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def configure(self, channel_id=None, flush_interval=5.0, batch_size=25, audit_path=None):
+        """Change settings on a running sink; the next flush uses them"""
+        self.channel_id = int(channel_id) if channel_id else None
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.audit_path = audit_path
+
+    def log(self, message, **fields):
+        """Record an entry; extra fields (action, user_id, ...) go to the audit file"""
+        entry = {"ts": time.time(), "message": str(message)}
+        entry.update(fields)
+        self._buffer.append(entry)
+        self.stats["entries"] += 1
+        if self._wake is not None and len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._flusher(), name="mod-log-flusher")
+
+    async def close(self):
+        # the flusher is signalled rather than cancelled so a flush in
+        # progress completes; the final flush picks up what is left
+        if self._task is not None:
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _flusher(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._closing:
+                return
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning("Mod log flush failed: %s", e)
+
+    async def flush(self):
+        entries, self._buffer = self._buffer, []
+        if not entries:
+            return
+        if self.audit_path:
+            try:
+                await asyncio.to_thread(self._append_audit, entries)
+            except OSError as e:
+                self.stats["audit_errors"] += 1
+                log.warning("Could not write mod log audit file: %s", e)
+        destinations = {}
+        for entry in entries:
+            channel = await self._destination(entry.get("guild_id"))
+            if channel is not None:
+                destinations.setdefault(channel.id, (channel, []))[1].append(entry)
+        for channel, batch in destinations.values():
+            for embed in self.build_embeds(batch):
+                self.stats["embeds"] += 1
+                self.bot.outbound.send(channel, embed=embed, priority=PRIORITY_LOG)
+
+    def _append_audit(self, entries):
+        data = "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in entries)
+        # one O_APPEND write per batch, so clustered processes sharing the file never interleave lines
+        fd = os.open(self.audit_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    async def _destination(self, guild_id):
+        """The channel for a guild's entries, if any: its own log channel, else the default one when it's in that guild"""
+        if self.route and guild_id:
+            channel_id = await self.route(guild_id)
+            if channel_id:
+                channel = await self._resolve_channel(channel_id)
+                if channel is not None and getattr(getattr(channel, "guild", None), "id", None) == guild_id:
+                    return channel
+                if channel is not None and (guild_id, channel_id) not in self._rejected:
+                    self._rejected.add((guild_id, channel_id))
+                    log.warning("Ignoring mod log channel %s for guild %s: it belongs to another guild", channel_id, guild_id)
+        if self.channel_id:
+            channel = await self._resolve_channel(self.channel_id)
+            if channel is not None and (not guild_id or getattr(getattr(channel, "guild", None), "id", None) == guild_id):
+                return channel
+        return None
+
+    async def _resolve_channel(self, channel_id):
+        # looked up once per channel; retried on later flushes until it succeeds
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                try:
+                    channel = await self.bot.fetch_channel(channel_id)
+                except discord.HTTPException as e:
+                    log.warning("Mod log channel %s unavailable: %s", channel_id, e)
+                    return None
+            self._channels[channel_id] = channel
+        return channel
+
+    @staticmethod
+    def build_embeds(entries):
+        """Consolidate entries into as few embeds as the description limit allows"""
+        counts = {}
+        first_seen = {}
+        for entry in entries:
+            message = entry["message"]
+            if message not in counts:
+                counts[message] = 0
+                first_seen[message] = entry["ts"]
+            counts[message] += 1
+        lines = []
+        for message, count in counts.items():
+            text = message if len(message) <= MAX_LINE else message[:MAX_LINE - 1] + "…"
+            lines.append(f"<t:{int(first_seen[message])}:T> {text}" + (f" (×{count})" if count > 1 else ""))
+
+        chunks, current, size = [], [], 0
+        for line in lines:
+            if current and size + len(line) + 1 > EMBED_DESCRIPTION_LIMIT:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append(current)
+
+        embeds = []
+        for i, chunk in enumerate(chunks):
+            embed = discord.Embed(title="Moderation log", description="\n".join(chunk), color=discord.Color.orange())
+            if len(chunks) > 1:
+                embed.set_footer(text=f"Part {i + 1}/{len(chunks)} · {len(entries)} entries")
+            else:
+                embed.set_footer(text=f"{len(entries)} entries")
+            embeds.append(embed)
+        return embeds
@@ -0,0 +1,121 @@
+"""
+Text normalization for the profanity filter
+Folds messages into a canonical form so obfuscated spellings match banned words
+"""
+import unicodedata
+from collections import namedtuple
+
+# text: normalized string, runs[i]: how many source characters collapsed into text[i],
+# starts[i]/ends[i]: [start, end) span of text[i]'s run in the original message
+NormalizedText = namedtuple("NormalizedText", ["text", "runs", "starts", "ends"])
+
+# Characters that are invisible or only change rendering (joiners, direction marks, ...)
+_STRIP_CATEGORIES = {"Cf", "Mn", "Me"}
+
+# Look-alike characters from other scripts, mapped to the Latin letter they imitate
+CONFUSABLES = {
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i",
+    "ј": "j", "ԁ": "d", "ɡ": "g", "һ": "h", "ԛ": "q", "ԝ": "w", "ү": "y", "ӏ": "l",
+    # Greek
+    "α": "a", "β": "b", "γ": "y", "ε": "e", "η": "n", "ι": "i", "κ": "k", "μ": "u",
+    "ν": "v", "ο": "o", "ρ": "p", "σ": "o", "ς": "c", "τ": "t", "υ": "u", "χ": "x",
+    "ω": "w",
+    # Latin extensions and symbols that NFKC leaves alone
+    "ı": "i", "ł": "l", "ø": "o", "đ": "d", "ħ": "h", "ŧ": "t", "ß": "ss", "æ": "ae",
+    "œ": "oe", "ƒ": "f", "¢": "c", "€": "e", "£": "l", "¥": "y",
+}
+
+# Digits and symbols commonly substituted for letters. Punctuation such as
+# "!" is left alone because it usually ends a sentence rather than a word.
+LEETSPEAK = {
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g",
+    "@": "a", "$": "s",
+}
+# Digits only stand in for letters inside a word ("h3ll0"); a plain number
+# such as "455" is left alone so it can't match a banned word
+DIGIT_LEETSPEAK = {k: v for k, v in LEETSPEAK.items() if k.isdigit()}
+_SYMBOL_LEETSPEAK = {k: v for k, v in LEETSPEAK.items() if not k.isdigit()}
+
+_fold_cache = {}
+
+
+def _fold_char(ch):
+    """Map a single character to its folded form (possibly empty or several characters)"""
+    folded = _fold_cache.get(ch)
+    if folded is not None:
+        return folded
+    parts = []
+    for d in unicodedata.normalize("NFKD", ch):
+        if unicodedata.category(d) in _STRIP_CATEGORIES:
+            continue
+        for c in d.casefold():
+            c = CONFUSABLES.get(c, c)
+            parts.append(_SYMBOL_LEETSPEAK.get(c, c))
+    folded = "".join(parts)
+    _fold_cache[ch] = folded
+    return folded
+
+
+def normalize(text):
+    """Normalize text in a single pass
+
+    Applies Unicode compatibility folding (NFKD, so fullwidth and styled
+    letters become plain ones), case folding, diacritic and zero-width
+    stripping, confusable and leetspeak folding, then collapses
+    runs of repeated characters. Digits are folded only in words that also
+    contain a letter. Returns a NormalizedText whose offsets map back into
+    the original message.
+    """
+    text = text or ""
+    folded = [_fold_char(ch) for ch in text]
+    if any(f in DIGIT_LEETSPEAK for f in folded):
+        _fold_digits(text, folded)
+    out, runs, starts, ends = [], [], [], []
+    last = None
+    for i, chars in enumerate(folded):
+        for c in chars:
+            if c == last:
+                runs[-1] += 1
+                ends[-1] = i + 1
+                continue
+            out.append(c)
+            runs.append(1)
+            starts.append(i)
+            ends.append(i + 1)
+            last = c
+    return NormalizedText("".join(out), runs, starts, ends)
+
+
+def _fold_digits(text, folded):
+    """Fold the digits of every word that has a letter, in place
+
+    Words end where word mode matching puts a boundary: at anything but
+    letters, digits and underscores, so "hello,455" keeps its number. The
+    symbols of LEETSPEAK are part of a word but don't count as its letter,
+    so a price such as "$455" stays a number too.
+    """
+    digits, has_letter = [], False
+    for k in range(len(folded) + 1):
+        chars = folded[k] if k < len(folded) else " "
+        if chars and not any(c.isalnum() or c == "_" for c in chars):
+            if has_letter:
+                for d in digits:
+                    folded[d] = DIGIT_LEETSPEAK[folded[d]]
+            digits, has_letter = [], False
+        elif chars in DIGIT_LEETSPEAK:
+            digits.append(k)
+        elif text[k] not in _SYMBOL_LEETSPEAK and any(c.isalpha() for c in chars):
+            has_letter = True
+
+
+def normalize_term(term):
+    """Normalize a banned word, returning (collapsed text, run lengths)"""
+    norm = normalize(term.strip())
+    return norm.text, tuple(norm.runs)
+
+
+def fold(text):
+    """Return just the normalized string, e.g. for use as a cache key"""
+    return normalize(text).text
@@ -0,0 +1,301 @@
+"""
+Outbound Discord API scheduler for the Discord bot
+Priority classes, per-bucket concurrency limits, coalescing of redundant
+low-priority messages, and batching of deletes and bans into bulk calls
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from metrics import LatencyHistogram
+
+log = logging.getLogger(__name__)
+
+PRIORITY_MODERATION = 0  # bans, deletes
+PRIORITY_LOG = 1  # mod log
+PRIORITY_REPLY = 2  # warnings, greetings, role updates
+PRIORITY_NAMES = ("moderation", "log", "reply")
+
+BULK_DELETE_LIMIT = 100  # messages per bulk delete request
+BULK_BAN_LIMIT = 200  # users per bulk ban request
+
+
+class _Job:
+    __slots__ = ("fn", "priority", "bucket", "key", "label", "future", "queued_at")
+
+    def __init__(self, fn, priority, bucket, key, label, future, queued_at=None):
+        self.fn = fn
+        self.priority = priority
+        self.bucket = bucket
+        self.key = key
+        self.label = label or "call"
+        self.future = future
+        self.queued_at = time.perf_counter() if queued_at is None else queued_at
+
+
+def _consume_exception(future):
+    # callers that fire and forget never await the future
+    if not future.cancelled():
+        future.exception()
+
+
+class OutboundScheduler:
+    """Runs outbound API calls in priority order within per-bucket limits
+
+    Jobs are zero-argument callables returning awaitables. At most
+    `workers` run at once, and at most `bucket_concurrency` per bucket (a
+    channel or guild), so one hot channel can't take every slot while bans
+    wait. A job whose bucket is full is skipped in favour of the next one.
+    discord.py still handles the actual 429s; this decides what goes first.
+
+    Jobs can carry a `key`: a newer job with the same key replaces a queued
+    one instead of adding another message. Reply-priority sends are
+    droppable: once max_replies replies are queued, new ones are discarded.
+
+    delete() and ban() gather calls for bulk_window seconds and send them
+    as bulk requests per channel / guild.
+    """
+
+    def __init__(self, workers=8, bucket_concurrency=2, bulk_window=0.25, max_replies=500, scan_depth=64):
+        self.workers = workers
+        self.bucket_concurrency = bucket_concurrency
+        self.bulk_window = bulk_window
+        self.max_replies = max_replies
+        self.scan_depth = scan_depth
+        self._queues = [deque() for _ in PRIORITY_NAMES]
+        self._keyed = {}  # key -> queued job
+        self._busy = {}  # bucket -> running jobs
+        self._running = set()
+        self._deletes = {}  # channel_id -> (channel, [messages], first queued at)
+        self._bans = {}  # (guild_id, reason) -> (guild, [(user, future)], first queued at)
+        self._timers = set()
+        self.latency = [LatencyHistogram() for _ in PRIORITY_NAMES]  # submit -> done
+        self.calls = {}  # label -> LatencyHistogram of the API call itself, incl. discord.py's rate limit waits
+        self.counters = {"merged": 0, "dropped": 0, "failed": 0, "bulk_deleted": 0, "bulk_banned": 0}
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues)
+
+    # ---------------- SUBMISSION ---------------- #
+    def submit(self, fn, priority=PRIORITY_REPLY, bucket=None, key=None, label=None, queued_at=None, droppable=False):
+        """Queue a call; returns a future for its result, or None if it was dropped
+
+        queued_at (a perf_counter time) backdates the job for the latency
+        histogram, e.g. to when the first call of a bulk batch arrived.
+        """
+        if key is not None:
+            queued = self._keyed.get(key)
+            if queued is not None:
+                queued.fn = fn
+                self.counters["merged"] += 1
+                return queued.future
+        if droppable and len(self._queues[PRIORITY_REPLY]) >= self.max_replies:
+            self.counters["dropped"] += 1
+            return None
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        job = _Job(fn, priority, bucket, key, label, future, queued_at)
+        self._queues[priority].append(job)
+        if key is not None:
+            self._keyed[key] = job
+        self._pump()
+        return future
+
+    def send(self, channel, content=None, priority=PRIORITY_REPLY, key=None, **kwargs):
+        """Queue channel.send(content, **kwargs) in the channel's bucket"""
+        return self.submit(
+            lambda: channel.send(content, **kwargs),
+            priority=priority,
+            bucket=("channel", channel.id),
+            key=key,
+            label="send",
+            droppable=priority == PRIORITY_REPLY,
+        )
+
+    def delete(self, message):
+        """Queue a message deletion; deletions in one channel are sent in bulk"""
+        channel = message.channel
+        if message.guild is None:
+            # bulk delete is guild-only
+            self.submit(lambda: self._delete_one(message), PRIORITY_MODERATION, ("channel", channel.id), label="delete")
+            return
+        entry = self._deletes.get(channel.id)
+        if entry is None:
+            entry = self._deletes[channel.id] = (channel, [], time.perf_counter())
+            self._later(self._flush_deletes, channel.id)
+        entry[1].append(message)
+
+    def ban(self, guild, user, reason=None):
+        """Queue a ban; bans in one guild with the same reason are sent in bulk
+
+        The returned future resolves to True if the user was banned.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        key = (guild.id, reason)
+        entry = self._bans.get(key)
+        if entry is None:
+            entry = self._bans[key] = (guild, [], time.perf_counter())
+            self._later(self._flush_bans, key)
+        entry[1].append((user, future))
+        return future
+
+    # ---------------- DISPATCH ---------------- #
+    def _pump(self):
+        while len(self._running) < self.workers:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.key is not None and self._keyed.get(job.key) is job:
+                del self._keyed[job.key]
+            if job.bucket is not None:
+                self._busy[job.bucket] = self._busy.get(job.bucket, 0) + 1
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _next_job(self):
+        for queue in self._queues:
+            for i, job in enumerate(queue):
+                if i >= self.scan_depth:
+                    break
+                if job.bucket is None or self._busy.get(job.bucket, 0) < self.bucket_concurrency:
+                    del queue[i]
+                    return job
+        return None
+
+    async def _run(self, job):
+        started = time.perf_counter()
+        try:
+            result = await job.fn()
+        except Exception as e:
+            self.counters["failed"] += 1
+            log.warning("Outbound %s failed: %s", job.label, e)
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            done = time.perf_counter()
+            self.latency[job.priority].observe(done - job.queued_at)
+            calls = self.calls.get(job.label)
+            if calls is None:
+                calls = self.calls[job.label] = LatencyHistogram()
+            calls.observe(done - started)
+            if job.bucket is not None:
+                left = self._busy[job.bucket] - 1
+                if left:
+                    self._busy[job.bucket] = left
+                else:
+                    del self._busy[job.bucket]
+
+    def _finished(self, task):
+        self._running.discard(task)
+        self._pump()
+
+    def _later(self, flush, key):
+        async def timer():
+            await asyncio.sleep(self.bulk_window)
+            flush(key)
+        task = asyncio.create_task(timer())
+        self._timers.add(task)
+        task.add_done_callback(self._timers.discard)
+
+    # ---------------- BULK CALLS ---------------- #
+    def _flush_deletes(self, channel_id):
+        entry = self._deletes.pop(channel_id, None)
+        if entry is None:
+            return
+        channel, messages, queued_at = entry
+        for i in range(0, len(messages), BULK_DELETE_LIMIT):
+            chunk = messages[i:i + BULK_DELETE_LIMIT]
+            self.submit(lambda c=chunk: self._delete_many(channel, c), PRIORITY_MODERATION, ("channel", channel_id),
+                        label="delete", queued_at=queued_at)
+
+    async def _delete_many(self, channel, messages):
+        if len(messages) > 1:
+            try:
+                await channel.delete_messages(messages, reason="Automated moderation")
+                self.counters["bulk_deleted"] += len(messages)
+                return
+            except Exception:
+                # e.g. a message is already gone; fall back to one by one
+                pass
+        for message in messages:
+            await self._delete_one(message)
+
+    @staticmethod
+    async def _delete_one(message):
+        try:
+            await message.delete()
+        except Exception as e:
+            if getattr(e, "status", None) != 404:
+                raise
+
+    def _flush_bans(self, key):
+        entry = self._bans.pop(key, None)
+        if entry is None:
+            return
+        guild, pending, queued_at = entry
+        reason = key[1]
+        for i in range(0, len(pending), BULK_BAN_LIMIT):
+            chunk = pending[i:i + BULK_BAN_LIMIT]
+            self.submit(lambda c=chunk: self._ban_many(guild, c, reason), PRIORITY_MODERATION, ("guild", guild.id),
+                        label="ban", queued_at=queued_at)
+
+    async def _ban_many(self, guild, pending, reason):
+        users = [user for user, _ in pending]
+        banned = set()
+        try:
+            if len(users) > 1 and hasattr(guild, "bulk_ban"):
+                try:
+                    result = await guild.bulk_ban(users, reason=reason)
+                    banned = {u.id for u in result.banned}
+                    self.counters["bulk_banned"] += len(banned)
+                except Exception as e:
+                    log.warning("Bulk ban in %s failed, banning one by one: %s", guild, e)
+                    banned = await self._ban_each(guild, users, reason)
+            else:
+                banned = await self._ban_each(guild, users, reason)
+        finally:
+            # resolve every caller, even if this job is cancelled on shutdown
+            for user, future in pending:
+                if not future.done():
+                    future.set_result(user.id in banned)
+
+    async def _ban_each(self, guild, users, reason):
+        banned = set()
+        for user in users:
+            try:
+                await guild.ban(user, reason=reason)
+                banned.add(user.id)
+            except Exception as e:
+                self.counters["failed"] += 1
+                log.warning("Ban of %s failed: %s", user, e)
+        return banned
+
+    # ---------------- LIFECYCLE ---------------- #
+    async def close(self, timeout=10):
+        """Send pending bulk calls now and wait for queued jobs, up to timeout"""
+        for task in list(self._timers):
+            task.cancel()
+        for channel_id in list(self._deletes):
+            self._flush_deletes(channel_id)
+        for key in list(self._bans):
+            self._flush_bans(key)
+        deadline = time.monotonic() + timeout
+        while (self._running or len(self)) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "queued": {name: len(q) for name, q in zip(PRIORITY_NAMES, self._queues)},
+            "running": len(self._running),
+            "latency": {name: h.summary() for name, h in zip(PRIORITY_NAMES, self.latency)},
+            **self.counters,
+        }
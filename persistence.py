@@ -0,0 +1,83 @@
+"""
+File persistence helpers for the Discord bot
+Crash-safe writes shared by the on-disk stores
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: clustered processes aren't supported there anyway
+    fcntl = None
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """Write data as JSON to path so readers only ever see the old or the new file
+
+    The payload goes to a temporary file in the same directory, is fsynced,
+    and then renamed over the target with os.replace.
+    """
+    _atomic_write(path, ".json", lambda f: json.dump(data, f, **dump_kwargs))
+
+
+def atomic_write_text(path, text):
+    """Write text to path with the same guarantees as atomic_write_json"""
+    _atomic_write(path, ".txt", lambda f: f.write(text))
+
+
+def _atomic_write(path, suffix, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path (created if missing) across processes"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def transaction(conn):
+    """Run the block's statements on an autocommit sqlite3 connection as one transaction
+
+    `with conn:` only commits what Python's implicit transactions opened,
+    and an isolation_level=None connection opens none, so every statement
+    would be its own commit.
+    """
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def read_json(path, default=None):
+    """Read a JSON file, returning default if it is missing or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
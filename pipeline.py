@@ -0,0 +1,168 @@
+"""
+Message processing pipeline for the Discord bot
+Registrable stages that short-circuit on the first verdict, a background
+action queue for side effects, and per-stage latency histograms
+"""
+import asyncio
+import inspect
+import logging
+import time
+
+from metrics import LatencyHistogram
+from normalize import normalize
+
+log = logging.getLogger(__name__)
+
+
+class MessageContext:
+    """A message on its way through the pipeline, with values stages share
+
+    normalized is the content folded once (see normalize.py), on first use,
+    for every stage that matches on the folded text.
+    """
+
+    __slots__ = ("message", "content", "guild_id", "channel_id", "author_id", "now", "settings", "data", "_normalized")
+
+    def __init__(self, message, settings=None):
+        self.message = message
+        self.content = message.content or ""
+        self.guild_id = message.guild.id if message.guild else None
+        self.channel_id = message.channel.id
+        self.author_id = message.author.id
+        self.now = time.time()
+        self.settings = settings  # whatever per-guild settings the caller resolved for this message
+        self.data = {}
+        self._normalized = None
+
+    @property
+    def normalized(self):
+        """The content as a NormalizedText, computed on first use"""
+        if self._normalized is None:
+            self._normalized = normalize(self.content)
+        return self._normalized
+
+    @property
+    def folded(self):
+        """Just the normalized string"""
+        return self.normalized.text
+
+
+class Verdict:
+    """The outcome of a stage that claimed the message
+
+    actions are zero-argument callables returning awaitables; they run in
+    order on the action queue, off the hot path. When `final` is false the
+    message still goes on to command processing.
+    """
+
+    __slots__ = ("stage", "reason", "actions", "final")
+
+    def __init__(self, reason, actions=(), final=True):
+        self.stage = None
+        self.reason = reason
+        self.actions = list(actions)
+        self.final = final
+
+    def __repr__(self):
+        return f"<Verdict stage={self.stage!r} reason={self.reason!r} actions={len(self.actions)}>"
+
+
+class Pipeline:
+    """Ordered message checks that stop at the first stage returning a Verdict
+
+    Stages are plain or async callables taking a MessageContext and returning
+    a Verdict or None. Register cheap, pure checks before expensive ones.
+    """
+
+    def __init__(self):
+        self.stages = []  # (name, callable, is_async)
+        self.histograms = {}
+
+    def register(self, name, stage, before=None):
+        """Add a stage at the end, or in front of the stage named `before`"""
+        if name in self.histograms:
+            raise ValueError(f"Stage {name!r} is already registered")
+        entry = (name, stage, inspect.iscoroutinefunction(stage))
+        index = len(self.stages)
+        if before is not None:
+            index = next(i for i, (n, _, _) in enumerate(self.stages) if n == before)
+        self.stages.insert(index, entry)
+        self.histograms[name] = LatencyHistogram()
+
+    def unregister(self, name):
+        self.stages = [s for s in self.stages if s[0] != name]
+        self.histograms.pop(name, None)
+
+    async def process(self, ctx):
+        """Run the stages in order and return the first Verdict, or None"""
+        clock = time.perf_counter
+        for name, stage, is_async in self.stages:
+            start = clock()
+            verdict = await stage(ctx) if is_async else stage(ctx)
+            self.histograms[name].observe(clock() - start)
+            if verdict is not None:
+                verdict.stage = name
+                return verdict
+        return None
+
+    def stats(self):
+        return {name: self.histograms[name].summary() for name, _, _ in self.stages}
+
+
+class ActionQueue:
+    """Runs verdict side effects (delete, warn, log, ban) in background workers
+
+    Each submitted job is a sequence of actions executed in order; separate
+    jobs run concurrently on up to `workers` tasks. A failing action is
+    reported and does not stop the next job.
+    """
+
+    def __init__(self, workers=4, maxsize=10000):
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks = []
+        self.latency = LatencyHistogram()  # submit -> done
+        self.dropped = 0
+        self.failed = 0
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(), name=f"action-worker-{i}") for i in range(self.workers)]
+
+    async def close(self, timeout=10):
+        """Give queued actions a chance to finish, then stop the workers"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, *actions, label=None):
+        """Queue actions to run in order; never blocks the caller"""
+        if not actions:
+            return
+        try:
+            self._queue.put_nowait((time.perf_counter(), label, actions))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            log.warning("Action queue full, dropped %s", label or "job")
+
+    async def _worker(self):
+        while True:
+            queued_at, label, actions = await self._queue.get()
+            try:
+                for action in actions:
+                    try:
+                        await action()
+                    except Exception as e:
+                        self.failed += 1
+                        log.warning("Action %s failed: %s", label or getattr(action, "__name__", action), e)
+            finally:
+                self.latency.observe(time.perf_counter() - queued_at)
+                self._queue.task_done()
@@ -0,0 +1,367 @@
+"""
+Raid detection for the Discord bot
+Guild-wide and per-channel rates over a sliding window, tracked with
+count-min sketches and HyperLogLog counters so memory stays fixed no matter
+how many members a guild has
+"""
+import time
+from array import array
+from hashlib import blake2b
+from math import log
+
+RAID_START = "start"
+RAID_END = "end"
+
+
+def _digest(key):
+    return blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+
+
+def _register(digest, precision):
+    """HyperLogLog (register index, rank) of a digest"""
+    h = int.from_bytes(digest[8:16], "little")
+    index = h >> (64 - precision)
+    rest = h & ((1 << (64 - precision)) - 1)
+    return index, (64 - precision) - rest.bit_length() + 1
+
+
+class CountMinSketch:
+    """Approximate frequency counts in depth x width counters
+
+    Estimates never undercount; they overcount by at most 2N/width with
+    high probability, N being the total added.
+    """
+
+    __slots__ = ("width", "depth", "rows")
+
+    def __init__(self, width=2048, depth=4):
+        if depth > 4:
+            raise ValueError("depth is limited to 4 rows (one per 32-bit slice of the digest)")
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _indexes(self, digest):
+        return [int.from_bytes(digest[4 * r:4 * r + 4], "little") % self.width for r in range(self.depth)]
+
+    def add(self, key, count=1, digest=None):
+        for row, i in zip(self.rows, self._indexes(digest or _digest(key))):
+            row[i] += count
+
+    def estimate(self, key, digest=None):
+        return min(row[i] for row, i in zip(self.rows, self._indexes(digest or _digest(key))))
+
+    def clear(self):
+        for r in range(self.depth):
+            self.rows[r] = array("I", bytes(4 * self.width))
+
+
+class HyperLogLog:
+    """Approximate distinct counts in 2**precision one-byte registers
+
+    The standard error is about 1.04 / sqrt(2**precision), ~3% at precision 10.
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision=10):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, key, digest=None):
+        index, rank = _register(digest or _digest(key), self.precision)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, registers):
+        """Return the register-wise maximum of this counter and `registers`"""
+        return bytearray(map(max, registers, self.registers))
+
+    @staticmethod
+    def count_registers(registers):
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # small range correction: linear counting
+            return m * log(m / zeros)
+        return estimate
+
+    def count(self):
+        return self.count_registers(self.registers)
+
+    def clear(self):
+        self.registers = bytearray(1 << self.precision)
+
+
+class DistinctSketch:
+    """Approximate distinct counts per key: a count-min layout whose cells are small HyperLogLogs
+
+    A key's estimate is the smallest count among its cells, so like
+    count-min it can overcount (when other keys share all of its cells) but
+    doesn't undercount beyond the HyperLogLog error. Small counts, the ones
+    raid thresholds care about, are near exact thanks to linear counting.
+    """
+
+    __slots__ = ("width", "depth", "precision", "cells")
+
+    def __init__(self, width=128, depth=2, precision=6):
+        if depth > 4:
+            raise ValueError("depth is limited to 4 rows (one per 32-bit slice of the digest)")
+        self.width = width
+        self.depth = depth
+        self.precision = precision
+        self.cells = bytearray((depth * width) << precision)
+
+    def _offsets(self, digest):
+        return [(r * self.width + int.from_bytes(digest[4 * r:4 * r + 4], "little") % self.width) << self.precision
+                for r in range(self.depth)]
+
+    def add(self, key_digest, item_digest):
+        index, rank = _register(item_digest, self.precision)
+        for offset in self._offsets(key_digest):
+            if rank > self.cells[offset + index]:
+                self.cells[offset + index] = rank
+
+    @staticmethod
+    def count(sketches, key_digest):
+        """Distinct items added under the key across all `sketches` (which share their shape)"""
+        if not sketches:
+            return 0.0
+        m = 1 << sketches[0].precision
+        best = None
+        for offset in sketches[0]._offsets(key_digest):
+            registers = bytearray(m)
+            for sketch in sketches:
+                registers = bytearray(map(max, registers, sketch.cells[offset:offset + m]))
+            count = HyperLogLog.count_registers(registers)
+            best = count if best is None else min(best, count)
+        return best
+
+    def clear(self):
+        self.cells = bytearray(len(self.cells))
+
+
+class _Bucket:
+    """Everything seen during one slice of the sliding window"""
+
+    __slots__ = ("slot", "messages", "fresh_messages", "channels", "contents", "authors", "fresh_authors",
+                 "channel_authors", "content_authors")
+
+    def __init__(self, width, depth, precision):
+        self.slot = None
+        self.messages = 0
+        self.fresh_messages = 0
+        self.channels = CountMinSketch(width, depth)
+        self.contents = CountMinSketch(width, depth)
+        self.authors = HyperLogLog(precision)
+        self.fresh_authors = HyperLogLog(precision)
+        self.channel_authors = DistinctSketch()
+        self.content_authors = DistinctSketch()
+
+    def reset(self, slot):
+        self.slot = slot
+        self.messages = 0
+        self.fresh_messages = 0
+        self.channels.clear()
+        self.contents.clear()
+        self.authors.clear()
+        self.fresh_authors.clear()
+        self.channel_authors.clear()
+        self.content_authors.clear()
+
+
+class RaidDetector:
+    """Raid detection for a single guild
+
+    The window is split into `buckets` slices, each with its own sketches;
+    queries combine the live slices (sum for count-min, register max for
+    HyperLogLog) and stale slices are recycled in place, so memory is fixed.
+
+    A raid starts when, within the window, any of these hold:
+      - one channel receives channel_messages messages from at least
+        min_authors distinct authors
+      - one message text is posted duplicate_messages times by at least
+        min_authors distinct authors
+      - fresh_authors distinct new accounts post anywhere in the guild
+    It ends once none of them has held for `cooldown` seconds.
+    """
+
+    def __init__(self, window=30, buckets=6, channel_messages=60, duplicate_messages=8,
+                 min_authors=5, fresh_authors=10, cooldown=60, width=2048, depth=4, precision=10):
+        self.window = float(window)
+        self.slice = self.window / buckets
+        self.channel_messages = channel_messages
+        self.duplicate_messages = duplicate_messages
+        self.min_authors = min_authors
+        self.fresh_authors = fresh_authors
+        self.cooldown = cooldown
+        self._buckets = [_Bucket(width, depth, precision) for _ in range(buckets)]
+        self.active = False
+        self.started_at = None
+        self.last_triggered = None
+        self.last_seen = None
+        self.reason = None
+
+    def _live(self, now):
+        current = int(now // self.slice)
+        oldest = current - len(self._buckets) + 1
+        return [b for b in self._buckets if b.slot is not None and b.slot >= oldest]
+
+    def _bucket(self, now):
+        slot = int(now // self.slice)
+        bucket = self._buckets[slot % len(self._buckets)]
+        if bucket.slot != slot:
+            bucket.reset(slot)
+        return bucket
+
+    @staticmethod
+    def _estimate(live, attr, digest):
+        sketches = [getattr(b, attr) for b in live]
+        if not sketches:
+            return 0
+        indexes = sketches[0]._indexes(digest)
+        return min(sum(s.rows[r][i] for s in sketches) for r, i in enumerate(indexes))
+
+    @staticmethod
+    def _distinct(live, attr):
+        if not live:
+            return 0.0
+        registers = bytearray(len(getattr(live[0], attr).registers))
+        for b in live:
+            registers = getattr(b, attr).merge(registers)
+        return HyperLogLog.count_registers(registers)
+
+    @staticmethod
+    def _authors(live, attr, digest):
+        """Distinct authors behind one channel or content digest"""
+        return DistinctSketch.count([getattr(b, attr) for b in live], digest)
+
+    def observe(self, channel_id, author_id, content_key=None, fresh=False, now=None):
+        """Record a message and return RAID_START, RAID_END or None"""
+        now = time.time() if now is None else now
+        self.last_seen = now
+        bucket = self._bucket(now)
+        channel_digest = _digest(channel_id)
+        author_digest = _digest(author_id)
+        bucket.messages += 1
+        bucket.channels.add(None, digest=channel_digest)
+        bucket.channel_authors.add(channel_digest, author_digest)
+        bucket.authors.add(None, digest=author_digest)
+        if fresh:
+            bucket.fresh_messages += 1
+            bucket.fresh_authors.add(None, digest=author_digest)
+        content_digest = None
+        if content_key:
+            content_digest = _digest(content_key)
+            bucket.contents.add(None, digest=content_digest)
+            bucket.content_authors.add(content_digest, author_digest)
+
+        live = self._live(now)
+        reason = None
+        # cheap count-min checks first; distinct counts only when one trips
+        channel_rate = self._estimate(live, "channels", channel_digest)
+        if channel_rate >= self.channel_messages and self._authors(live, "channel_authors", channel_digest) >= self.min_authors:
+            reason = f"{channel_rate} messages in one channel within {self.window:.0f}s"
+        if reason is None and content_digest is not None:
+            duplicates = self._estimate(live, "contents", content_digest)
+            if duplicates >= self.duplicate_messages and self._authors(live, "content_authors", content_digest) >= self.min_authors:
+                reason = f"the same message posted {duplicates} times within {self.window:.0f}s"
+        # a window can't hold more fresh authors than fresh messages, which
+        # keeps the HyperLogLog merge off the path for ordinary traffic
+        if reason is None and fresh and sum(b.fresh_messages for b in live) >= self.fresh_authors:
+            fresh_count = self._distinct(live, "fresh_authors")
+            if fresh_count >= self.fresh_authors:
+                reason = f"{fresh_count:.0f} new accounts posting within {self.window:.0f}s"
+
+        if reason is not None:
+            self.last_triggered = now
+            if not self.active:
+                self.active = True
+                self.started_at = now
+                self.reason = reason
+                return RAID_START
+            return None
+        return self.poll(now)
+
+    def poll(self, now=None):
+        """Return RAID_END once an active raid has been quiet for `cooldown` seconds"""
+        now = time.time() if now is None else now
+        if self.active and now - self.last_triggered >= self.cooldown:
+            self.active = False
+            return RAID_END
+        return None
+
+    def idle(self, now):
+        """True once nothing is left in the window and no raid is running, so the detector can be dropped"""
+        return not self.active and (self.last_seen is None or now - self.last_seen > self.window + self.cooldown)
+
+    def snapshot(self, now=None):
+        """Current window statistics, for mod logs and lockdown decisions"""
+        now = time.time() if now is None else now
+        live = self._live(now)
+        return {
+            "active": self.active,
+            "reason": self.reason,
+            "messages": sum(b.messages for b in live),
+            "distinct_authors": round(self._distinct(live, "authors")),
+            "fresh_authors": round(self._distinct(live, "fresh_authors")),
+            "window": self.window,
+        }
+
+
+class RaidMonitor:
+    """One RaidDetector per guild, created on first use
+
+    A detector holds a few hundred KB of sketches, so poll() drops those of
+    guilds that have gone quiet; the next message starts a fresh one, which
+    loses nothing since their window was empty anyway.
+    """
+
+    def __init__(self, **detector_kwargs):
+        self.detector_kwargs = detector_kwargs
+        self.detectors = {}
+
+    def configure(self, **detector_kwargs):
+        """Change detector settings; running detectors keep their counts unless the window changed"""
+        window_changed = detector_kwargs.get("window", self.detector_kwargs.get("window")) != self.detector_kwargs.get("window")
+        self.detector_kwargs = dict(self.detector_kwargs, **detector_kwargs)
+        for guild_id, old in list(self.detectors.items()):
+            if window_changed:
+                # the slices no longer line up; start counting afresh but keep an ongoing raid going
+                detector = self.detectors[guild_id] = RaidDetector(**self.detector_kwargs)
+                detector.active, detector.started_at = old.active, old.started_at
+                detector.last_triggered, detector.reason = old.last_triggered, old.reason
+            else:
+                for name in ("channel_messages", "duplicate_messages", "min_authors", "fresh_authors", "cooldown"):
+                    if name in detector_kwargs:
+                        setattr(old, name, detector_kwargs[name])
+
+    def get(self, guild_id):
+        detector = self.detectors.get(guild_id)
+        if detector is None:
+            detector = self.detectors[guild_id] = RaidDetector(**self.detector_kwargs)
+        return detector
+
+    def observe(self, guild_id, channel_id, author_id, content_key=None, fresh=False, now=None):
+        return self.get(guild_id).observe(channel_id, author_id, content_key, fresh, now)
+
+    def poll(self, now=None):
+        """Yield (guild_id, RAID_END) for every raid that has just ended, and drop idle detectors"""
+        now = time.time() if now is None else now
+        idle = []
+        for guild_id, detector in list(self.detectors.items()):
+            if detector.poll(now) == RAID_END:
+                yield guild_id, RAID_END
+            elif detector.idle(now):
+                idle.append(guild_id)
+        for guild_id in idle:
+            del self.detectors[guild_id]
+
+    def drop(self, guild_id):
+        self.detectors.pop(guild_id, None)
+
+    def is_active(self, guild_id):
+        detector = self.detectors.get(guild_id)
+        return bool(detector and detector.active)
@@ -0,0 +1,100 @@
+"""
+Role index for the Discord bot
+Per-guild name -> role and ID -> role maps built once from the guild's
+role cache and kept current from role events, with case-insensitive and
+fuzzy lookup by name
+"""
+import difflib
+
+
+class GuildRoles:
+    """One guild's roles by ID and by lowercased name"""
+
+    def __init__(self, roles=(), guild=None):
+        self.guild = guild  # the Guild object indexed; a reconnect may replace it
+        self.by_id = {}
+        self.by_name = {}  # lowercased name -> [roles], names aren't unique
+        for role in roles:
+            self.add(role)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def add(self, role):
+        self.by_id[role.id] = role
+        self.by_name.setdefault(role.name.lower(), []).append(role)
+
+    def remove(self, role_id, name=None):
+        role = self.by_id.pop(role_id, None)
+        if role is None:
+            return
+        key = (name if name is not None else role.name).lower()
+        same = [r for r in self.by_name.get(key, ()) if r.id != role_id]
+        if same:
+            self.by_name[key] = same
+        else:
+            self.by_name.pop(key, None)
+
+
+class RoleIndex:
+    """Role lookups across guilds without scanning guild.roles
+
+    A guild is indexed from its cached roles the first time it is looked up;
+    after that the on_guild_role_* handlers keep it current. Role changes
+    made while the bot was disconnected fire no events, so a guild is
+    re-indexed when it becomes available again (drop()), and whenever
+    discord.py hands out a different Guild object for it.
+    """
+
+    def __init__(self):
+        self.guilds = {}  # guild_id -> GuildRoles
+
+    def for_guild(self, guild):
+        roles = self.guilds.get(guild.id)
+        if roles is None or roles.guild is not guild:
+            roles = self.guilds[guild.id] = GuildRoles(guild.roles, guild)
+        return roles
+
+    # ---------------- LOOKUPS ---------------- #
+    def get(self, guild, role_id):
+        return self.for_guild(guild).by_id.get(role_id)
+
+    def find(self, guild, name):
+        """The role with this name, ignoring case; an exact-case match wins if names clash"""
+        matches = self.for_guild(guild).by_name.get(name.strip().lower())
+        if not matches:
+            return None
+        for role in matches:
+            if role.name == name.strip():
+                return role
+        return matches[0]
+
+    def suggest(self, guild, name, n=3):
+        """Roles whose name starts with, or is close to, name; for 'did you mean' replies"""
+        by_name = self.for_guild(guild).by_name
+        key = name.strip().lower()
+        keys = [k for k in by_name if k.startswith(key)][:n]
+        for close in difflib.get_close_matches(key, by_name, n=n, cutoff=0.6):
+            if close not in keys:
+                keys.append(close)
+        return [by_name[k][0] for k in keys[:n]]
+
+    # ---------------- EVENTS ---------------- #
+    def created(self, role):
+        roles = self.guilds.get(role.guild.id)
+        if roles is not None:
+            roles.add(role)
+
+    def updated(self, before, after):
+        roles = self.guilds.get(after.guild.id)
+        if roles is not None:
+            roles.remove(after.id, name=before.name)
+            roles.add(after)
+
+    def deleted(self, role):
+        roles = self.guilds.get(role.guild.id)
+        if roles is not None:
+            roles.remove(role.id)
+
+    def drop(self, guild_id):
+        self.guilds.pop(guild_id, None)
@@ -0,0 +1,220 @@
+"""
+Reaction role registry for the Discord bot
+Panel bindings of (message, emoji) -> role ID, persisted to reaction_roles.json
+and served from an in-memory index, and per-member batching of the role edits
+"""
+import asyncio
+import logging
+
+from persistence import atomic_write_json, file_lock, read_json
+
+log = logging.getLogger(__name__)
+
+
+def emoji_key(emoji):
+    """Stable key for an emoji: the ID of a custom emoji, else the unicode text
+
+    Accepts the emoji of a Reaction, a raw reaction payload, a PartialEmoji
+    or a plain string, so bindings made from a command match every event.
+    """
+    emoji_id = getattr(emoji, "id", None)
+    if emoji_id:
+        return str(emoji_id)
+    name = getattr(emoji, "name", None)
+    return name if name is not None else str(emoji)
+
+
+class ReactionRoleRegistry:
+    """Reaction role panels across all guilds
+
+    `bindings` maps (message_id, emoji_key) -> role_id, so resolving a
+    reaction is a single dict lookup no matter how many panels exist.
+    `panels` keeps each message's guild, channel and emoji -> role mapping
+    for listing and persistence. Changes are written to disk atomically,
+    off the event loop.
+
+    When several processes share the file (clusters, see launcher.py), each
+    passes `owns`, a guild ID predicate for the guilds it serves: it only
+    loads those guilds' panels, and saves by re-reading the file under a
+    lock and replacing just those panels.
+    """
+
+    def __init__(self, path, owns=None):
+        self.path = path
+        self.owns = owns
+        self.panels = {}  # message_id -> {"guild_id", "channel_id", "roles": {emoji_key: role_id}}
+        self.bindings = {}  # (message_id, emoji_key) -> role_id
+        self._lock = None
+
+    def __len__(self):
+        return len(self.bindings)
+
+    # ---------------- LOADING ---------------- #
+    def load(self):
+        data = read_json(self.path, default={})
+        panels = data.get("panels", {}) if isinstance(data, dict) else {}
+        self.panels = {}
+        self.bindings = {}
+        for message_id, panel in panels.items():
+            try:
+                message_id = int(message_id)
+                roles = {str(k): int(v) for k, v in panel["roles"].items()}
+                self.panels[message_id] = {
+                    "guild_id": int(panel["guild_id"]),
+                    "channel_id": int(panel["channel_id"]),
+                    "roles": roles,
+                }
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+            if self.owns is not None and not self.owns(self.panels[message_id]["guild_id"]):
+                del self.panels[message_id]
+                continue
+            for key, role_id in roles.items():
+                self.bindings[(message_id, key)] = role_id
+        return self
+
+    async def start(self):
+        self._lock = asyncio.Lock()
+        await asyncio.to_thread(self.load)
+
+    async def save(self):
+        snapshot = {"panels": {str(m): dict(p, roles=dict(p["roles"])) for m, p in self.panels.items()}}
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await asyncio.to_thread(self._write, snapshot)
+
+    def _write(self, snapshot):
+        if self.owns is None:
+            atomic_write_json(self.path, snapshot, indent=2)
+            return
+        # the other processes' guilds are in the file too; keep their panels as they are now
+        with file_lock(self.path + ".lock"):
+            data = read_json(self.path, default={})
+            panels = data.get("panels", {}) if isinstance(data, dict) else {}
+            merged = {m: p for m, p in panels.items() if not self._owned(p)}
+            merged.update(snapshot["panels"])
+            atomic_write_json(self.path, {"panels": merged}, indent=2)
+
+    def _owned(self, panel):
+        try:
+            return self.owns(int(panel["guild_id"]))
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    # ---------------- LOOKUPS ---------------- #
+    def role_for(self, message_id, emoji):
+        """Role ID bound to this emoji on this message, or None"""
+        return self.bindings.get((message_id, emoji_key(emoji)))
+
+    def is_panel(self, message_id):
+        return message_id in self.panels
+
+    def guild_panels(self, guild_id):
+        return {m: p for m, p in self.panels.items() if p["guild_id"] == guild_id}
+
+    # ---------------- CHANGES ---------------- #
+    async def bind(self, guild_id, channel_id, message_id, emoji, role_id):
+        panel = self.panels.setdefault(message_id, {"guild_id": guild_id, "channel_id": channel_id, "roles": {}})
+        key = emoji_key(emoji)
+        panel["roles"][key] = role_id
+        self.bindings[(message_id, key)] = role_id
+        await self.save()
+
+    async def add_panel(self, guild_id, channel_id, message_id, roles):
+        """Register a whole panel at once; roles maps emoji -> role ID"""
+        roles = {emoji_key(e): r for e, r in roles.items()}
+        self.panels[message_id] = {"guild_id": guild_id, "channel_id": channel_id, "roles": roles}
+        for key, role_id in roles.items():
+            self.bindings[(message_id, key)] = role_id
+        await self.save()
+
+    async def unbind(self, message_id, emoji):
+        key = emoji_key(emoji)
+        if self.bindings.pop((message_id, key), None) is None:
+            return False
+        panel = self.panels[message_id]
+        panel["roles"].pop(key, None)
+        if not panel["roles"]:
+            del self.panels[message_id]
+        await self.save()
+        return True
+
+    async def remove_panel(self, message_id):
+        panel = self.panels.pop(message_id, None)
+        if panel is None:
+            return False
+        for key in panel["roles"]:
+            self.bindings.pop((message_id, key), None)
+        await self.save()
+        return True
+
+    async def remove_role(self, role_id):
+        """Drop every binding to a deleted role; returns how many were removed"""
+        stale = [k for k, r in self.bindings.items() if r == role_id]
+        for message_id, key in stale:
+            del self.bindings[(message_id, key)]
+            panel = self.panels[message_id]
+            panel["roles"].pop(key, None)
+            if not panel["roles"]:
+                del self.panels[message_id]
+        if stale:
+            await self.save()
+        return len(stale)
+
+
+class RoleEditBatcher:
+    """Coalesces a member's reaction role changes into one role edit
+
+    The first change for a (guild, user) opens a `delay`-second window;
+    later changes in the window overwrite earlier ones per role, so toggling
+    an emoji on and off cancels out. When the window closes,
+    `apply(guild_id, user_id, changes)` is awaited once with
+    changes = {role_id: True to add / False to remove}.
+    """
+
+    def __init__(self, apply, delay=1.0):
+        self.apply = apply
+        self.delay = delay
+        self._pending = {}  # (guild_id, user_id) -> {role_id: add?}
+        self._tasks = {}
+        self.stats = {"changes": 0, "edits": 0, "errors": 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pending(self, guild_id, user_id, role_id):
+        """The queued change for a member's role (True add, False remove), or None"""
+        return self._pending.get((guild_id, user_id), {}).get(role_id)
+
+    def queue(self, guild_id, user_id, role_id, add):
+        key = (guild_id, user_id)
+        self._pending.setdefault(key, {})[role_id] = add
+        self.stats["changes"] += 1
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key):
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self._tasks.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key):
+        changes = self._pending.pop(key, None)
+        if not changes:
+            return
+        self.stats["edits"] += 1
+        try:
+            await self.apply(key[0], key[1], changes)
+        except Exception as e:
+            self.stats["errors"] += 1
+            log.warning("Reaction role update for user %s failed: %s", key[1], e)
+
+    async def close(self):
+        """Apply everything still waiting for its window to close"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+        await asyncio.gather(*(self._flush(key) for key in list(self._pending)))
@@ -0,0 +1,114 @@
+"""
+Spam detection for the Discord bot
+Per-user fixed-size ring buffers of message timestamps, with idle users
+evicted by a timing wheel so memory tracks active users only
+"""
+import sys
+import time
+from array import array
+
+
+class _History:
+    """The last `limit` message timestamps of one user"""
+
+    __slots__ = ("stamps", "pos", "count", "tick")
+
+    def __init__(self, limit, tick):
+        self.stamps = array("d", bytes(8 * limit))
+        self.pos = 0
+        self.count = 0
+        self.tick = tick
+
+
+class SpamDetector:
+    """Flags users who send `limit` messages within `window` seconds
+
+    Recording a message is O(1): it overwrites the oldest slot of the user's
+    ring buffer, and the user is spamming when that buffer is full and its
+    oldest timestamp is still inside the window.
+
+    Users are filed in a timing wheel by the tick of their last message.
+    As the clock advances, the bucket that wraps around holds exactly the
+    users that have been quiet for longer than idle_timeout, and they are
+    dropped. Each user is filed and evicted at most once per tick, so
+    eviction is O(1) amortized per message.
+    """
+
+    def __init__(self, limit, window, idle_timeout=None, tick=1.0):
+        self.limit = max(1, int(limit))
+        self.window = float(window)
+        # an idle user's history has already aged out of the window, so
+        # forgetting them after that point loses nothing
+        self.idle_timeout = max(float(idle_timeout or window), tick)
+        self.tick = float(tick)
+        self._users = {}
+        self._slots = int(self.idle_timeout // self.tick) + 2
+        self._wheel = [set() for _ in range(self._slots)]
+        self._current_tick = None
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._users)
+
+    def record(self, user_id, now=None):
+        """Record a message from user_id and return True if they are spamming"""
+        now = time.time() if now is None else now
+        tick = int(now // self.tick)
+        self._advance(tick)
+
+        history = self._users.get(user_id)
+        if history is None:
+            history = _History(self.limit, tick)
+            self._users[user_id] = history
+            self._wheel[tick % self._slots].add(user_id)
+        elif history.tick != tick:
+            self._wheel[history.tick % self._slots].discard(user_id)
+            self._wheel[tick % self._slots].add(user_id)
+            history.tick = tick
+
+        history.stamps[history.pos] = now
+        history.pos = (history.pos + 1) % self.limit
+        if history.count < self.limit:
+            history.count += 1
+        # after writing, pos points at the oldest of the last `limit` stamps
+        return history.count == self.limit and now - history.stamps[history.pos] <= self.window
+
+    def reset(self, user_id):
+        """Forget a user's history, e.g. after acting on a spam verdict"""
+        history = self._users.pop(user_id, None)
+        if history is not None:
+            self._wheel[history.tick % self._slots].discard(user_id)
+
+    def _advance(self, tick):
+        if self._current_tick is None:
+            self._current_tick = tick
+            return
+        if tick <= self._current_tick:
+            return
+        # the bucket a tick maps to still holds users last seen one full
+        # revolution ago; they are idle, so evict them before reusing it
+        steps = min(tick - self._current_tick, self._slots)
+        for t in range(tick - steps + 1, tick + 1):
+            bucket = self._wheel[t % self._slots]
+            if bucket:
+                for user_id in bucket:
+                    del self._users[user_id]
+                self.evicted += len(bucket)
+                bucket.clear()
+        self._current_tick = tick
+
+    def expire(self, now=None):
+        """Advance the wheel without recording a message, e.g. from a periodic task"""
+        now = time.time() if now is None else now
+        self._advance(int(now // self.tick))
+
+    def memory_footprint(self):
+        """Approximate bytes held by tracked users, plus counters for reporting"""
+        per_user = sys.getsizeof(_History(self.limit, 0)) + sys.getsizeof(array("d", bytes(8 * self.limit)))
+        wheel = sum(sys.getsizeof(bucket) for bucket in self._wheel)
+        total = sys.getsizeof(self._users) + wheel + per_user * len(self._users)
+        return {
+            "tracked_users": len(self._users),
+            "evicted_users": self.evicted,
+            "approx_bytes": total,
+        }
@@ -0,0 +1,407 @@
+"""
+Strike storage for the Discord bot
+Pluggable backends behind the strike system: a journaled JSON file and a
+SQLite database with per-guild strike history
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from persistence import atomic_write_json, read_json, transaction
+
+log = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+class StrikeBackend:
+    """Interface every strike backend implements
+
+    All methods are coroutines so backends are free to do I/O, but none of
+    them may block the event loop.
+    """
+
+    async def start(self):
+        """Open or load the underlying storage"""
+
+    async def close(self):
+        """Persist anything pending and release resources"""
+
+    async def add(self, guild_id, user_id, reason=None, amount=1):
+        """Record strikes for a user and return their active strike count"""
+        raise NotImplementedError
+
+    async def get(self, guild_id, user_id):
+        """Return a user's active strike count"""
+        raise NotImplementedError
+
+    async def reset(self, guild_id, user_id):
+        """Clear a user's strikes"""
+        raise NotImplementedError
+
+    async def add_many(self, guild_id, amounts, reason=None):
+        """Record strikes for several users ({user_id: amount}) and return their active counts"""
+        return {user_id: await self.add(guild_id, user_id, reason=reason, amount=amount)
+                for user_id, amount in amounts.items()}
+
+
+class StrikeStore(StrikeBackend):
+    """Strike counts keyed by user ID, stored in strikes.json
+
+    This is the legacy flat format: counts are global rather than per guild,
+    and reasons and timestamps are not kept, so strikes never expire.
+
+    Reads and writes are served from memory so the event loop never waits on
+    disk. Every mutation is queued; a background task appends queued
+    mutations to the journal in batches (off the event loop) and rewrites
+    the snapshot once the journal grows past compact_every records.
+
+    On startup the snapshot is loaded and the journal replayed on top of it.
+    Journal records carry absolute counts, so replay is idempotent and a
+    torn final line from a crash is simply ignored.
+    """
+
+    def __init__(self, path, journal_path=None, flush_interval=1.0, max_batch=500, compact_every=5000):
+        self.path = path
+        self.journal_path = journal_path or f"{path}.journal"
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.compact_every = compact_every
+        self.counts = {}
+        self._pending = {}  # user_id -> latest count not yet journaled
+        self._journal_records = 0
+        self._wake = None
+        self._closing = False
+        self._task = None
+
+    # ---------------- RECOVERY ---------------- #
+    def load(self):
+        """Load the snapshot and replay the journal, then compact both into a fresh snapshot"""
+        data = read_json(self.path, default={})
+        self.counts = {str(k): int(v) for k, v in data.items()} if isinstance(data, dict) else {}
+        replayed = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self._apply(str(record["u"]), int(record["c"]))
+                        replayed += 1
+                    except (ValueError, KeyError, TypeError):
+                        # torn write at the tail of the journal
+                        continue
+        except OSError:
+            pass
+        if replayed or not os.path.exists(self.path):
+            self._compact(dict(self.counts))
+        return self.counts
+
+    def _apply(self, user_id, count):
+        if count > 0:
+            self.counts[user_id] = count
+        else:
+            self.counts.pop(user_id, None)
+
+    # ---------------- PUBLIC API ---------------- #
+    async def get(self, guild_id, user_id):
+        return self.counts.get(str(user_id), 0)
+
+    async def add(self, guild_id, user_id, reason=None, amount=1):
+        user_id = str(user_id)
+        count = self.counts.get(user_id, 0) + amount
+        self._set(user_id, count)
+        return count
+
+    async def reset(self, guild_id, user_id):
+        self._set(str(user_id), 0)
+
+    def _set(self, user_id, count):
+        self._apply(user_id, count)
+        self._pending[user_id] = count
+        if self._wake is not None and len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    # ---------------- BACKGROUND WRITER ---------------- #
+    async def start(self):
+        if self._task is None:
+            await asyncio.to_thread(self.load)
+            self._wake = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._writer(), name="strike-store-writer")
+
+    async def close(self):
+        """Stop the writer once it has persisted everything that is still pending"""
+        if self._task is None:
+            await self.flush(compact=True)
+            return
+        # let the writer finish its current batch rather than cancelling it
+        # mid-write, then do a final flush and compaction
+        self._closing = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    async def flush(self, compact=False):
+        """Journal pending mutations and compact if the journal has grown large"""
+        batch, self._pending = self._pending, {}
+        compact = compact or self._journal_records + len(batch) >= self.compact_every
+        # taken with the batch, so every count in the snapshot is in the journal
+        # once the batch is appended. A snapshot holding a newer count than the
+        # journal would be overwritten by the journal's older record if we
+        # crashed between writing the snapshot and truncating the journal.
+        snapshot = dict(self.counts) if compact else None
+        if batch:
+            try:
+                await asyncio.to_thread(self._append, batch)
+            except Exception:
+                # keep the batch for the next attempt unless it was superseded
+                for user_id, count in batch.items():
+                    self._pending.setdefault(user_id, count)
+                raise
+        if snapshot is not None:
+            await asyncio.to_thread(self._compact, snapshot)
+
+    async def _writer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            closing = self._closing
+            try:
+                await self.flush(compact=closing)
+            except Exception as e:
+                log.warning("Failed to persist strikes: %s", e)
+            if closing:
+                return
+
+    def _append(self, batch):
+        if not batch:
+            return
+        lines = "".join(json.dumps({"u": u, "c": c}) + "\n" for u, c in batch.items())
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_records += len(batch)
+
+    def _compact(self, snapshot):
+        atomic_write_json(self.path, snapshot)
+        # everything in the journal up to now is covered by the snapshot
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        self._journal_records = 0
+
+
+class SQLiteStrikeBackend(StrikeBackend):
+    """Per-guild strike history in a SQLite database
+
+    Each strike is a row with its guild, user, timestamp and reason, indexed
+    on (guild_id, user_id, created_at) so per-user counts stay fast at
+    millions of rows. The database runs in WAL mode on a dedicated worker
+    thread, so queries never block the event loop.
+
+    Strikes older than expiry_seconds stop counting towards a ban; rows
+    older than retention_seconds are purged from the history. A bounded LRU
+    keeps the active strike timestamps of recently seen users in memory.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS strikes (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            reason TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_strikes_guild_user_time
+            ON strikes (guild_id, user_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_strikes_time ON strikes (created_at);
+    """
+
+    def __init__(self, path, expiry_seconds=0, retention_seconds=0, cache_size=10000, purge_interval=3600):
+        self.path = path
+        self.expiry_seconds = expiry_seconds
+        self.retention_seconds = retention_seconds
+        self.cache_size = cache_size
+        self.purge_interval = purge_interval
+        self._cache = OrderedDict()  # (guild_id, user_id) -> sorted active strike timestamps
+        self._executor = None
+        self._conn = None
+        self._purge_task = None
+
+    # ---------------- LIFECYCLE ---------------- #
+    async def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="strike-db")
+            await self._run(self._open)
+            if self.retention_seconds:
+                self._purge_task = asyncio.create_task(self._purger(), name="strike-db-purge")
+
+    async def close(self):
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            self._purge_task = None
+        if self._executor is not None:
+            await self._run(self._conn.close)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._conn = None
+        self._cache.clear()
+
+    def _open(self):
+        # the connection is only ever touched from the single worker thread
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ---------------- PUBLIC API ---------------- #
+    async def add(self, guild_id, user_id, reason=None, amount=1):
+        key = (int(guild_id or 0), int(user_id))
+        now = time.time()
+        since = self._since(now)
+        cached = key in self._cache
+        timestamps = await self._run(self._insert, key, now, reason, amount, None if cached else since)
+        if timestamps is None:
+            timestamps = self._cache.get(key)
+            if timestamps is None:
+                # evicted while the insert was running
+                timestamps = await self._run(self._load, key, since)
+            else:
+                timestamps.extend([now] * amount)
+        self._remember(key, timestamps)
+        return self._active_count(timestamps, since)
+
+    async def get(self, guild_id, user_id):
+        key = (int(guild_id or 0), int(user_id))
+        since = self._since(time.time())
+        timestamps = self._cache.get(key)
+        if timestamps is None:
+            timestamps = await self._run(self._load, key, since)
+        self._remember(key, timestamps)
+        return self._active_count(timestamps, since)
+
+    async def reset(self, guild_id, user_id):
+        key = (int(guild_id or 0), int(user_id))
+        await self._run(self._delete, key)
+        self._cache.pop(key, None)
+
+    async def add_many(self, guild_id, amounts, reason=None):
+        """Record strikes for several users in one transaction and return their active counts"""
+        if not amounts:
+            return {}
+        guild_id = int(guild_id or 0)
+        now = time.time()
+        counts = await self._run(self._insert_many, guild_id, amounts, now, reason, self._since(now))
+        for user_id in amounts:
+            # reloaded from the table on the user's next strike
+            self._cache.pop((guild_id, int(user_id)), None)
+        return counts
+
+    async def history(self, guild_id, user_id, limit=25):
+        """Return the most recent (created_at, reason) rows for a user"""
+        key = (int(guild_id or 0), int(user_id))
+        return await self._run(self._history, key, limit)
+
+    # ---------------- CACHE ---------------- #
+    def _since(self, now):
+        return now - self.expiry_seconds if self.expiry_seconds else 0.0
+
+    def _remember(self, key, timestamps):
+        self._cache[key] = timestamps
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _active_count(timestamps, since):
+        # timestamps are appended in order, so expired ones sit at the front
+        expired = 0
+        while expired < len(timestamps) and timestamps[expired] < since:
+            expired += 1
+        if expired:
+            del timestamps[:expired]
+        return len(timestamps)
+
+    # ---------------- WORKER THREAD ---------------- #
+    def _insert(self, key, now, reason, amount, load_since):
+        with transaction(self._conn):
+            self._conn.executemany(
+                "INSERT INTO strikes (guild_id, user_id, created_at, reason) VALUES (?, ?, ?, ?)",
+                [(key[0], key[1], now, reason)] * amount,
+            )
+        if load_since is not None:
+            return self._load(key, load_since)
+        return None
+
+    def _insert_many(self, guild_id, amounts, now, reason, since):
+        with transaction(self._conn):
+            self._conn.executemany(
+                "INSERT INTO strikes (guild_id, user_id, created_at, reason) VALUES (?, ?, ?, ?)",
+                [(guild_id, int(user_id), now, reason) for user_id, amount in amounts.items() for _ in range(amount)],
+            )
+        counts = {}
+        users = [int(user_id) for user_id in amounts]
+        for i in range(0, len(users), 500):  # below SQLite's bound parameter limit
+            chunk = users[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT user_id, COUNT(*) FROM strikes WHERE guild_id = ? AND created_at >= ? "
+                f"AND user_id IN ({','.join('?' * len(chunk))}) GROUP BY user_id",
+                (guild_id, since, *chunk),
+            )
+            counts.update(rows)
+        return counts
+
+    def _load(self, key, since):
+        rows = self._conn.execute(
+            "SELECT created_at FROM strikes WHERE guild_id = ? AND user_id = ? AND created_at >= ? ORDER BY created_at",
+            (key[0], key[1], since),
+        )
+        return [row[0] for row in rows]
+
+    def _delete(self, key):
+        with transaction(self._conn):
+            self._conn.execute("DELETE FROM strikes WHERE guild_id = ? AND user_id = ?", key)
+
+    def _history(self, key, limit):
+        rows = self._conn.execute(
+            "SELECT created_at, reason FROM strikes WHERE guild_id = ? AND user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (key[0], key[1], limit),
+        )
+        return rows.fetchall()
+
+    def _purge(self, before):
+        with transaction(self._conn):
+            return self._conn.execute("DELETE FROM strikes WHERE created_at < ?", (before,)).rowcount
+
+    async def _purger(self):
+        while True:
+            try:
+                removed = await self._run(self._purge, time.time() - self.retention_seconds)
+                if removed:
+                    log.info("Purged %d expired strike records", removed)
+            except Exception as e:
+                log.warning("Failed to purge strike history: %s", e)
+            await asyncio.sleep(self.purge_interval)
+
+
+def create_strike_store(config):
+    """Build the strike backend selected by config.STRIKE_BACKEND"""
+    if config.STRIKE_BACKEND == "sqlite":
+        return SQLiteStrikeBackend(
+            config.STRIKE_DB_FILE,
+            expiry_seconds=config.STRIKE_EXPIRY_DAYS * DAY,
+            retention_seconds=config.STRIKE_RETENTION_DAYS * DAY,
+            cache_size=config.STRIKE_CACHE_SIZE,
+        )
+    return StrikeStore(config.STRIKE_FILE, flush_interval=config.STRIKE_FLUSH_INTERVAL)
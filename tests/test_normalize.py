@@ -0,0 +1,28 @@
+from matcher import BannedWordMatcher
+from normalize import fold
+
+
+def test_numbers_are_not_folded():
+    assert fold("455 1234") == "45 1234"  # runs still collapse, digits stay digits
+
+
+def test_digits_inside_words_are_folded():
+    assert fold("h3ll0 b4d") == "helo bad"
+
+
+def test_numeric_only_tokens_do_not_match():
+    matcher = BannedWordMatcher(["ass", "bad"], normalize=True)
+    for text in ("455", "call 455 now", "8 4 0", "order #455"):
+        assert matcher.search(text) is None, text
+
+
+def test_numbers_next_to_punctuation_do_not_match():
+    matcher = BannedWordMatcher(["ass", "bad"], normalize=True)
+    for text in ("hello,455", "costs $455", "call:455-840", "(455)", "room_1.455"):
+        assert matcher.search(text) is None, text
+
+
+def test_leetspeak_words_still_match():
+    matcher = BannedWordMatcher(["ass"], normalize=True)
+    for text in ("a55", "4ss", "what a 4s$", "a\u200b55", "hey,a55!"):
+        assert matcher.search(text) is not None, text
@@ -0,0 +1,27 @@
+from raid_detector import RAID_START, RaidDetector
+
+
+def test_one_author_repeating_a_message_is_not_a_raid():
+    detector = RaidDetector()
+    now = 1000.0
+    for i in range(5):
+        detector.observe(channel_id=1, author_id=100 + i, content_key=f"hello {i}", now=now)
+    for i in range(20):
+        assert detector.observe(channel_id=1, author_id=1, content_key="same text", now=now + i * 0.1) is None
+    assert not detector.active
+
+
+def test_one_author_flooding_a_channel_is_not_a_raid():
+    detector = RaidDetector()
+    now = 1000.0
+    for i in range(5):
+        detector.observe(channel_id=2, author_id=100 + i, now=now)
+    for i in range(100):
+        assert detector.observe(channel_id=1, author_id=1, content_key=f"message {i}", now=now + i * 0.1) is None
+
+
+def test_many_authors_posting_the_same_message_is_a_raid():
+    detector = RaidDetector()
+    results = [detector.observe(channel_id=1, author_id=i % 5, content_key="join now", now=1000.0 + i * 0.1)
+               for i in range(8)]
+    assert results[-1] == RAID_START